@@ -0,0 +1,361 @@
+'''Benchmarks for the rental system'''
+import argparse
+import json
+import platform
+import random
+import statistics
+import string
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from blockbuster_oop import DVD, RENTAL_PERIOD, Customer, Time, Video, VideoStore, format_date
+from directory import CustomerDirectory
+from sharding import ShardedRentalService
+
+
+def stress_rentals(tills: int = 16, titles: int = 20, copies: int = 2,
+                   customers: int = 500, rounds: int = 2000, late_every: int = 10) -> dict:
+    '''
+    Has a pool of tills rent and return copies from one store at the same time,
+    with the interpreter switching threads as often as it can.
+    Every copy handed out is checked against the copies already out, and every
+    fine issued is totalled, so double rentals and lost fine updates show up in
+    the double_rentals and lost_fines counts of the returned results
+    '''
+    store = VideoStore([Video(f'Title {title}', 1999, 100)
+                        for title in range(titles) for _ in range(copies)])
+    members = [Customer('Stress', 'Test', '01/01/1980') for _ in range(customers)]
+    on_time = Time.time_day_delta(RENTAL_PERIOD)
+    late = Time.time_day_delta(RENTAL_PERIOD + 1)
+
+    holders = {}
+    counts = {'rented': 0, 'refused': 0, 'double_rentals': 0, 'fines': 0}
+    counts_lock = threading.Lock()
+
+    def till(seed: int) -> None:
+        picker = random.Random(seed)
+        for turn in range(rounds):
+            customer = picker.choice(members)
+            try:
+                rental = store.rent_video(f'Title {picker.randrange(titles)}', customer)
+            except (RuntimeError, ValueError):
+                with counts_lock:
+                    counts['refused'] += 1
+                continue
+
+            video_id = rental.video.video_id
+            if holders.setdefault(video_id, seed) != seed:
+                with counts_lock:
+                    counts['double_rentals'] += 1
+
+            # the customer has the copy out, so let the other tills run meanwhile
+            time.sleep(0)
+            is_late = turn % late_every == 0
+            if holders.get(video_id) == seed:
+                del holders[video_id]
+            else:
+                with counts_lock:
+                    counts['double_rentals'] += 1
+            store.return_video(rental, late if is_late else on_time)
+            with counts_lock:
+                counts['rented'] += 1
+                if is_late:
+                    counts['fines'] += rental.fine
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(tills) as pool:
+            for future in [pool.submit(till, seed) for seed in range(tills)]:
+                future.result()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    elapsed = time.perf_counter() - start
+
+    fined = sum(member.outstanding_fine for member in members)
+    return {
+        'tills': tills,
+        'operations': tills * rounds,
+        'seconds': elapsed,
+        'operations_per_second': tills * rounds / elapsed,
+        'rented': counts['rented'],
+        'refused': counts['refused'],
+        'double_rentals': counts['double_rentals'],
+        'lost_fines': counts['fines'] - fined,
+        'copies_missing': titles * copies - sum(store.copies_available(f'Title {title}')
+                                                for title in range(titles)),
+    }
+
+
+def shard_scaling(worker_counts: list[int], stores: int = 64, titles: int = 50,
+                  customers: int = 1000, requests: int = 50000, batch: int = 5000) -> list[dict]:
+    '''
+    Runs the same rent and return traffic through a ShardedRentalService
+    with each number of workers in turn.
+    Returns the throughput for each, and its speed-up over the first
+    '''
+    members = {member.customer_id: member for member in
+               (Customer('Shard', 'Test', '01/01/1980') for _ in range(customers))}
+    member_ids = list(members)
+    on_time = Time.time_day_delta(RENTAL_PERIOD)
+    picker = random.Random(0)
+
+    results = []
+    for workers in worker_counts:
+        branches = [VideoStore([Video(f'Title {title}', 1999, 100) for title in range(titles)])
+                    for _ in range(stores)]
+        with ShardedRentalService(branches, members, workers) as service:
+            start = time.perf_counter()
+            done = 0
+            while done < requests:
+                rentals = [('rent', picker.choice(branches).store_id,
+                            f'Title {picker.randrange(titles)}', picker.choice(member_ids))
+                           for _ in range(batch // 2)]
+                replies = service.submit(rentals)
+                returns = [('return', request[1], reply[1], on_time)
+                           for request, reply in zip(rentals, replies) if reply[0] == 'rented']
+                service.submit(returns)
+                done += len(rentals) + len(returns)
+            elapsed = time.perf_counter() - start
+
+        results.append({'workers': workers, 'operations': done,
+                        'operations_per_second': done / elapsed})
+
+    for result in results:
+        result['speed_up'] = result['operations_per_second'] / results[0]['operations_per_second']
+    return results
+
+
+def synthetic_titles(count: int, seed: int = 0) -> list[str]:
+    '''Returns count distinct made-up titles'''
+    picker = random.Random(seed)
+    titles = set()
+    while len(titles) < count:
+        words = [''.join(picker.choices(string.ascii_lowercase, k=picker.randint(3, 8)))
+                 for _ in range(picker.randint(1, 4))]
+        titles.add(' '.join(words).title())
+    return sorted(titles)
+
+
+def synthetic_catalogue(titles: int, copies: int = 2, seed: int = 0) -> list[Video]:
+    '''Returns copies of each of a number of made-up titles, a mix of VHS and DVD'''
+    picker = random.Random(seed)
+    videos = []
+    for title in synthetic_titles(titles, seed):
+        year, runtime = picker.randint(1950, Time.current_year()), picker.randint(60, 300)
+        for copy in range(copies):
+            videos.append((DVD if copy % 2 else Video)(title, year, runtime))
+    return videos
+
+
+def synthetic_customers(count: int, seed: int = 0) -> list[Customer]:
+    '''Returns a number of customers aged between 18 and 80'''
+    picker = random.Random(seed)
+    today = Time.today_ordinal()
+    return [Customer('Bench', 'Customer', format_date(today - picker.randint(18 * 366, 80 * 365)))
+            for _ in range(count)]
+
+
+def _prepare(name: str, scale: int, seed: int) -> list:
+    '''
+    Builds the data for one hot path benchmark at a given scale.
+    Returns the calls to time, each taking no arguments
+    '''
+    picker = random.Random(seed)
+    titles = max(scale // 10, 1)
+    if name == 'video_construction':
+        names = synthetic_titles(titles, seed)
+        return [lambda title=picker.choice(names): Video(title, 1999, 120) for _ in range(scale)]
+
+    videos = synthetic_catalogue(titles, 2, seed)
+    names = sorted({video.title for video in videos})
+    customers = synthetic_customers(len(videos), seed)
+    if name == 'customer_age':
+        return [lambda customer=picker.choice(customers): customer.age for _ in range(scale)]
+    if name == 'directory_find':
+        members = [(customer.name, customer._date_of_birth) for customer in customers]
+        directory = CustomerDirectory()
+        for member_name, born in members:
+            directory.register(*member_name.split(' ', 1), born)
+        return [lambda member=picker.choice(members): directory.find(*member)
+                for _ in range(scale)]
+
+    store = VideoStore(videos)
+    if name == 'find_video_by_title':
+        return [lambda title=picker.choice(names): store.find_video_by_title(title)
+                for _ in range(scale)]
+    if name == 'search_prefix':
+        store.title_index.prefix('warm up')
+        return [lambda query=picker.choice(names)[:3]: store.search(query)
+                for _ in range(scale)]
+    if name == 'is_available':
+        return [lambda title=picker.choice(names): store.is_available(title)
+                for _ in range(scale)]
+    if name == 'rent_video':
+        return [lambda title=names[number % len(names)], customer=customers[number]:
+                store.rent_video(title, customer) for number in range(min(scale, len(videos)))]
+
+    rentals = [store.rent_video(names[number % len(names)], customers[number])
+               for number in range(min(scale, len(videos)))]
+    if name == 'return_video':
+        on_time = Time.time_day_delta(RENTAL_PERIOD)
+        return [lambda rental=rental: store.return_video(rental, on_time) for rental in rentals]
+    if name == 'fine_accrual':
+        late = Time.time_day_delta(RENTAL_PERIOD + 1)
+        return [lambda rental=rental: store.return_video(rental, late) for rental in rentals]
+    raise ValueError(f'Unknown benchmark {name!r}')
+
+
+HOT_PATHS = ('video_construction', 'find_video_by_title', 'search_prefix', 'is_available',
+             'rent_video', 'return_video', 'customer_age', 'directory_find', 'fine_accrual')
+
+
+def time_calls(calls: list) -> dict:
+    '''
+    Makes each call in turn, timing every one.
+    Returns the throughput and latency percentiles in microseconds
+    '''
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for call in calls:
+        before = clock()
+        call()
+        latencies.append(clock() - before)
+    elapsed = (clock() - start) / 1e9
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'operations': len(calls),
+        'seconds': elapsed,
+        'operations_per_second': len(calls) / elapsed if elapsed else 0.0,
+        'p50_us': percentiles[49] / 1000,
+        'p90_us': percentiles[89] / 1000,
+        'p99_us': percentiles[98] / 1000,
+    }
+
+
+def peak_memory(name: str, scale: int, seed: int) -> int:
+    '''Returns the peak bytes allocated while building and running one benchmark'''
+    tracemalloc.start()
+    try:
+        for call in _prepare(name, scale, seed):
+            call()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(scale: int = 10000, names: tuple[str, ...] = HOT_PATHS, seed: int = 0) -> dict:
+    '''
+    Times each hot path over synthetic data at a given scale.
+    Peak memory is measured in a second run, so tracing does not skew the timings.
+    Returns the results with the settings they were taken under
+    '''
+    results = {}
+    for name in names:
+        results[name] = time_calls(_prepare(name, scale, seed))
+        results[name]['peak_bytes'] = peak_memory(name, scale, seed)
+    return {
+        'scale': scale,
+        'seed': seed,
+        'python': platform.python_version(),
+        'benchmarks': results,
+    }
+
+
+def save_baseline(results: dict, path: str) -> None:
+    '''Writes suite results to a JSON file'''
+    with open(path, 'w', encoding='utf-8') as baseline:
+        json.dump(results, baseline, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> dict:
+    '''Reads suite results from a JSON file'''
+    with open(path, encoding='utf-8') as baseline:
+        return json.load(baseline)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[str]:
+    '''
+    Takes in two sets of suite results and the fraction a measure may worsen by.
+    Returns a line describing each regression: a fall in throughput or a rise
+    in p50 latency or peak memory beyond the threshold
+    '''
+    regressions = []
+    for name, before in baseline['benchmarks'].items():
+        after = current['benchmarks'].get(name)
+        if after is None:
+            continue
+        changes = (
+            ('operations_per_second',
+             before['operations_per_second'] / max(after['operations_per_second'], 1e-9)),
+            ('p50_us', after['p50_us'] / max(before['p50_us'], 1e-9)),
+            ('peak_bytes', after['peak_bytes'] / max(before['peak_bytes'], 1)),
+        )
+        for measure, ratio in changes:
+            if ratio > 1 + threshold:
+                regressions.append(f'{name} {measure}: {before[measure]:.2f} -> '
+                                   f'{after[measure]:.2f} ({(ratio - 1) * 100:.0f}% worse)')
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    '''Runs a benchmark from the command line and prints its results'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    stress = commands.add_parser('stress', help='concurrent rentals from many tills')
+    stress.add_argument('--tills', type=int, default=16)
+    stress.add_argument('--titles', type=int, default=20)
+    stress.add_argument('--copies', type=int, default=2)
+    stress.add_argument('--customers', type=int, default=500)
+    stress.add_argument('--rounds', type=int, default=2000)
+
+    shards = commands.add_parser('shards', help='throughput of sharded worker processes')
+    shards.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    shards.add_argument('--stores', type=int, default=64)
+    shards.add_argument('--requests', type=int, default=50000)
+
+    suite = commands.add_parser('suite', help='time the rental hot paths')
+    suite.add_argument('--scale', type=int, default=10000)
+    suite.add_argument('--only', nargs='+', choices=HOT_PATHS, default=HOT_PATHS)
+    suite.add_argument('--output', help='write the results as a JSON baseline')
+
+    check = commands.add_parser('compare', help='flag regressions against a baseline')
+    check.add_argument('baseline')
+    check.add_argument('current')
+    check.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == 'stress':
+        results = stress_rentals(args.tills, args.titles, args.copies,
+                                 args.customers, args.rounds)
+        for name, value in results.items():
+            print(f'{name}: {value}')
+    elif args.command == 'shards':
+        for result in shard_scaling(args.workers, args.stores, requests=args.requests):
+            print(', '.join(f'{name}: {value}' for name, value in result.items()))
+    elif args.command == 'suite':
+        results = run_suite(args.scale, tuple(args.only))
+        for name, result in results['benchmarks'].items():
+            print(f"{name}: {result['operations_per_second']:.0f} ops/s, "
+                  f"p50 {result['p50_us']:.2f}us, p99 {result['p99_us']:.2f}us, "
+                  f"peak {result['peak_bytes']} bytes")
+        if args.output:
+            save_baseline(results, args.output)
+    else:
+        regressions = compare(load_baseline(args.baseline), load_baseline(args.current),
+                              args.threshold)
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
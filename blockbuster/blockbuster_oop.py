@@ -1,35 +1,324 @@
 '''OOP implementation of a Blockbuster Video Rental Store'''
 import datetime
+import functools
 import string
+import threading
+import time
+import weakref
+
+from search import TitleIndex
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(date: str) -> int:
+    '''
+    Converts a date string in dd/mm/yyyy format into a day ordinal.
+    Results are cached, as returns arrive with only a handful of distinct dates
+    '''
+    day, month, year = date.split('/')
+    return datetime.date(int(year), int(month), int(day)).toordinal()
+
+
+@functools.lru_cache(maxsize=4096)
+def format_date(ordinal: int) -> str:
+    '''Converts a day ordinal into a date string in dd/mm/yyyy format'''
+    return datetime.date.fromordinal(ordinal).strftime('%d/%m/%Y')
+
+
+class SystemClock:
+    '''
+    Clock reading today's date from the system.
+    The date is cached and only read again once the day rolls over
+    '''
+    def __init__(self):
+        self._today = None
+        self._ordinal = 0
+        self._tomorrow_starts = 0.0
+
+    def today(self) -> datetime.date:
+        '''Returns today's date, read from the system clock at most once a day'''
+        if time.time() >= self._tomorrow_starts:
+            today = datetime.date.today()
+            tomorrow = today + datetime.timedelta(days=1)
+            self._tomorrow_starts = datetime.datetime.combine(tomorrow, datetime.time()).timestamp()
+            self._ordinal = today.toordinal()
+            self._today = today
+        return self._today
+
+    def today_ordinal(self) -> int:
+        '''Returns today's date as a day ordinal'''
+        self.today()
+        return self._ordinal
+
+
+class FrozenClock:
+    '''
+    Clock standing still on a given date until moved on with advance or set.
+    Used to replay traffic or run benchmarks over simulated days
+    '''
+    def __init__(self, today: datetime.date | str | int):
+        self.set(today)
+
+    def set(self, today: datetime.date | str | int) -> None:
+        '''Moves the clock to a date, a dd/mm/yyyy string or a day ordinal'''
+        if isinstance(today, str):
+            today = parse_date(today)
+        if isinstance(today, int):
+            today = datetime.date.fromordinal(today)
+        self._today = today
+        self._ordinal = today.toordinal()
+
+    def advance(self, days: int = 1) -> None:
+        '''Moves the clock on by a number of days'''
+        self.set(self._ordinal + days)
+
+    def today(self) -> datetime.date:
+        '''Returns the date the clock is stopped on'''
+        return self._today
+
+    def today_ordinal(self) -> int:
+        '''Returns the date the clock is stopped on as a day ordinal'''
+        return self._ordinal
 
 
 class Time:
-    '''class to implement static methods for calculating dates'''
-    @staticmethod
-    def current_year() -> int:
+    '''
+    class to implement static methods for calculating dates.
+    Dates are read from a clock, the system clock unless another
+    is installed with use_clock
+    '''
+    _clock = SystemClock()
+
+    @classmethod
+    def use_clock(cls, clock: SystemClock | FrozenClock) -> SystemClock | FrozenClock:
+        '''Installs the clock every date is read from, returning the clock it replaces'''
+        previous = cls._clock
+        cls._clock = clock
+        return previous
+
+    @classmethod
+    def clock(cls) -> SystemClock | FrozenClock:
+        '''Returns the clock dates are read from'''
+        return cls._clock
+
+    @classmethod
+    def today(cls) -> datetime.date:
+        '''Returns today's date'''
+        return cls._clock.today()
+
+    @classmethod
+    def today_ordinal(cls) -> int:
+        '''Returns the current date as a proleptic Gregorian ordinal'''
+        return cls._clock.today_ordinal()
+
+    @classmethod
+    def current_year(cls) -> int:
         '''Returns the current year in yyyy format'''
-        return datetime.date.today().year
+        return cls._clock.today().year
 
-    @staticmethod
-    def time_now() -> str:
+    @classmethod
+    def time_now(cls) -> str:
         '''Returns the current date in dd/mm/yyyy format'''
-        return datetime.date.today().strftime('%d/%m/%Y')
+        return format_date(cls._clock.today_ordinal())
+
+    @classmethod
+    def time_day_delta(cls, delta: int) -> str:
+        '''Returns the date a number of days from today in dd/mm/yyyy format'''
+        return format_date(cls._clock.today_ordinal() + delta)
+
+
+_CLOCK_CONSTANTS = {
+    'CURRENT_YEAR': Time.current_year,
+    'RENTAL_CHECKOUT_DATE': Time.time_now,
+    'ON_TIME_RETURN_DATE': lambda: Time.time_day_delta(14),
+    'LATE_RETURN_DATE': lambda: Time.time_day_delta(15),
+    'EARLIER_THAN_RETURN_DATE': lambda: Time.time_day_delta(-1),
+}
+
+
+def __getattr__(name: str) -> object:
+    '''
+    Works out the date constants from the clock each time they are read,
+    so a long-running process never sees the dates it was started on
+    '''
+    if name in _CLOCK_CONSTANTS:
+        return _CLOCK_CONSTANTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-    @staticmethod
-    def time_day_delta(delta: int) -> str:
-        '''Returns the date in two weeks in dd/mm/yyyy format'''
-        todays_date = datetime.date.today()
-        date_delta = datetime.timedelta(days=delta)
-        time = todays_date + date_delta
-
-        return time.strftime('%d/%m/%Y')
-
-CURRENT_YEAR = Time.current_year()
-RENTAL_CHECKOUT_DATE = Time.time_now()
-ON_TIME_RETURN_DATE = Time.time_day_delta(14)
-LATE_RETURN_DATE = Time.time_day_delta(15)
-EARLIER_THAN_RETURN_DATE = Time.time_day_delta(-1)
 MAX_FINE = 5000
+LATE_FINE = 1000
+NEW_RELEASE_LATE_FINE = 1500
+RENTAL_PERIOD = 14
+MAX_RENTALS = 3
+
+_ALPHANUMERICS = frozenset(string.ascii_letters + string.digits)
+
+
+class IdSequence:
+    '''
+    Hands out increasing integer ids.
+    An id can also be claimed explicitly, i.e. when restoring saved objects,
+    and later ids are then handed out past it
+    '''
+    def __init__(self):
+        self._next = 1
+        self._lock = threading.Lock()
+
+    def __call__(self, claimed: int | None = None) -> int:
+        with self._lock:
+            if claimed is None:
+                claimed = self._next
+            self._next = max(self._next, claimed + 1)
+            return claimed
+
+
+_VIDEO_IDS = IdSequence()
+_CUSTOMER_IDS = IdSequence()
+_STORE_IDS = IdSequence()
+
+
+def reserve_video_ids(highest: int) -> None:
+    '''
+    Makes every video created from now on get an id above highest,
+    i.e. after loading saved videos without building them through Video
+    '''
+    _VIDEO_IDS(highest)
+
+LOCK_STRIPES = 64
+_CUSTOMER_LOCKS = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def customer_lock(customer: 'Customer') -> threading.Lock:
+    '''
+    Returns the lock guarding a customer's fines.
+    Customers share a fixed set of locks by customer_id,
+    so tills serving different customers rarely wait on each other
+    '''
+    return _CUSTOMER_LOCKS[customer.customer_id % LOCK_STRIPES]
+
+
+def post_fine(customer: 'Customer', amount: int) -> None:
+    '''Adds a fine to a customer's outstanding balance under the customer's lock'''
+    with customer_lock(customer):
+        customer._outstanding_fine += amount
+
+
+def post_payment(customer: 'Customer', amount: int) -> int:
+    '''
+    Takes a payment in pence off a customer's outstanding balance
+    under the customer's lock, then tells the observers added to ACCOUNTS.
+    Returns the balance left
+    '''
+    with customer_lock(customer):
+        if amount > customer._outstanding_fine:
+            raise ValueError('Payment is more than the outstanding fine')
+        customer._outstanding_fine -= amount
+        balance = customer._outstanding_fine
+    if amount:
+        ACCOUNTS.paid(customer, amount)
+    return balance
+
+
+class CustomerAccounts:
+    '''
+    Object to track what every customer has out and whether they may rent.
+    Keeps the open rentals of each customer across every store, a count
+    of them including rentals being made, and the set of customers whose
+    fines block them from renting, so the checks at the till are O(1).
+    Observers added here are told about every payment, at any store
+    '''
+    def __init__(self):
+        self._open = {}
+        self._counts = {}
+        self.blocked = set()
+        self._observers = weakref.WeakSet()
+
+    def add_observer(self, observer: 'StoreObserver') -> None:
+        '''
+        Takes in a StoreObserver to be told about payments.
+        Held weakly, so an observer which is no longer used drops out by itself
+        '''
+        self._observers.add(observer)
+
+    def remove_observer(self, observer: 'StoreObserver') -> None:
+        '''Stops an observer from being told about payments'''
+        self._observers.discard(observer)
+
+    def paid(self, customer: 'Customer', amount: int) -> None:
+        '''Tells every observer about a payment in pence posted to a customer'''
+        for observer in list(self._observers):
+            observer.on_payment(customer, amount)
+
+    def clear(self) -> None:
+        '''Forgets every open rental, i.e. in a worker process given a share of the stores'''
+        self._open = {}
+        self._counts = {}
+
+    def released(self, customer: 'Customer', store_id: int, video_id: int) -> None:
+        '''Counts a copy returned in another process as no longer out'''
+        with customer_lock(customer):
+            self._open.get(customer.customer_id, {}).pop((store_id, video_id), None)
+            self._counts[customer.customer_id] = max(
+                self._counts.get(customer.customer_id, 0) - 1, 0)
+
+    def balance_changed(self, customer: 'Customer') -> None:
+        '''Brings the blocked set up to date with a customer's balance'''
+        if customer._balance >= MAX_FINE:
+            self.blocked.add(customer.customer_id)
+        else:
+            self.blocked.discard(customer.customer_id)
+
+    def is_blocked(self, customer: 'Customer') -> bool:
+        '''Returns True if a customer's fines stop them renting'''
+        return customer.customer_id in self.blocked
+
+    def active(self, customer: 'Customer') -> int:
+        '''Returns the number of videos a customer has out, or is renting now'''
+        return self._counts.get(customer.customer_id, 0)
+
+    def open_rentals(self, customer: 'Customer') -> list['Rental']:
+        '''Returns the rentals a customer has out, from any store'''
+        return list(self._open.get(customer.customer_id, {}).values())
+
+    def claim(self, customer: 'Customer') -> Exception | None:
+        '''
+        Counts a rental a customer is about to make.
+        Returns the exception stopping them renting instead, if any
+        '''
+        with customer_lock(customer):
+            if customer.customer_id in self.blocked:
+                return RuntimeError(f"You have an outstanding fine of {customer.outstanding_fine}")
+            count = self._counts.get(customer.customer_id, 0)
+            if count >= MAX_RENTALS:
+                return RuntimeError(f'You can only rent {MAX_RENTALS} videos at a time')
+            self._counts[customer.customer_id] = count + 1
+        return None
+
+    def unclaim(self, customer: 'Customer') -> None:
+        '''Gives back a claim for a rental which could not be made'''
+        with customer_lock(customer):
+            self._counts[customer.customer_id] -= 1
+
+    def opened(self, store: 'VideoStore', rental: 'Rental', claimed: bool = True) -> None:
+        '''
+        Adds a rental to its customer's open rentals.
+        Rentals restored from saved state have no claim, so are counted here
+        '''
+        customer = rental.customer
+        with customer_lock(customer):
+            self._open.setdefault(customer.customer_id, {})[
+                (store.store_id, rental.video.video_id)] = rental
+            if not claimed:
+                self._counts[customer.customer_id] = self._counts.get(customer.customer_id, 0) + 1
+
+    def closed(self, store: 'VideoStore', rental: 'Rental') -> None:
+        '''Removes a returned rental from its customer's open rentals'''
+        customer = rental.customer
+        with customer_lock(customer):
+            rentals = self._open.get(customer.customer_id, {})
+            if rentals.pop((store.store_id, rental.video.video_id), None) is not None:
+                self._counts[customer.customer_id] -= 1
 
 
 class Video:
@@ -37,40 +326,109 @@ class Video:
     Object to hold all information regarding a video:
     title, year of release, runtime, price
     '''
-    def __init__(self, title: str, year: int, runtime: int):
+    __slots__ = ('title', 'year', 'runtime', '_price', 'is_rewound', 'video_id')
+    media_format = 'VHS'
+
+    def __init__(self, title: str, year: int, runtime: int, video_id: int | None = None):
+        self.validate(title, year, runtime)
+        self._set_fields(title, year, runtime, _VIDEO_IDS(video_id))
+
+    def _set_fields(self, title: str, year: int, runtime: int, video_id: int,
+                    price: int | None = None) -> None:
+        '''Sets every slot of a new video, the one place the fields are listed'''
         self.title = title
         self.year = year
         self.runtime = runtime
-        self.price = self.rental_price()
+        self._price = price
         self.is_rewound = True
+        self.video_id = video_id
 
+    @classmethod
+    def _from_fields(cls, title: str, year: int, runtime: int, video_id: int,
+                     price: int | None = None) -> 'Video':
+        '''
+        Builds a video from fields already validated, without checking them
+        again or claiming its video_id
+        '''
+        video = cls.__new__(cls)
+        video._set_fields(title, year, runtime, video_id, price)
+        return video
+
+    @property
+    def price(self) -> int:
+        '''
+        Returns the list price in pence, worked out by rental_price on the day
+        it is read unless a price has been set
+        '''
+        if self._price is not None:
+            return self._price
+        return self.rental_price()
+
+    @price.setter
+    def price(self, price: int | None) -> None:
+        '''Sets a fixed list price in pence, or None to follow rental_price again'''
+        self._price = price
+
+    @staticmethod
+    def validate(title: str, year: int, runtime: int) -> None:
+        '''
+        Checks the title, year of release and runtime of a video.
+        Raises an exception describing the first problem found
+        '''
         if not isinstance(year, int):
             raise TypeError("Release year must be in integer")
-        if year < 1900 or year > CURRENT_YEAR:
-            raise ValueError(f"Video must be released between 1990 and {CURRENT_YEAR}")
+        current_year = Time.current_year()
+        if year < 1900 or year > current_year:
+            raise ValueError(f"Video must be released between 1990 and {current_year}")
         if not isinstance(runtime, int):
             raise TypeError("Video runtime must be a number")
         if runtime > 1440:
             raise ValueError("Maximum runtime limit (24 hours) exceeded")
         if runtime <= 5:
             raise ValueError("Video must be >5 min")
+        if not isinstance(title, str):
+            raise TypeError("Video title must be a string")
         if title == '':
             raise ValueError("Video must have a title")
         if len(title) > 1000:
             raise ValueError("Title characters exceeded 1000 character limit")
 
-        alphanumerics = list(string.ascii_letters + string.digits)
-        title_no_space = self.format_title_space()
-        for character in title_no_space:
-            if character in alphanumerics:
-                break
+        title_no_space = title.lstrip(' ')
+        if title_no_space and title_no_space[0] not in _ALPHANUMERICS:
             raise ValueError('Title must contain some alphanumerical characters')
 
+    @classmethod
+    def from_records(cls, records: list) -> 'BatchResult':
+        '''
+        Takes in a list of rows from a catalogue feed, either dictionaries with
+        title, year and runtime keys or (title, year, runtime) sequences.
+        Numeric strings, as read from a CSV file, are accepted for year and runtime.
+        Returns a BatchResult holding a video or an error for every row
+        '''
+        outcome = BatchResult(len(records))
+        for position, record in enumerate(records):
+            try:
+                if isinstance(record, dict):
+                    title, year, runtime = record['title'], record['year'], record['runtime']
+                else:
+                    title, year, runtime = record
+                if isinstance(year, str) and year.isdigit():
+                    year = int(year)
+                if isinstance(runtime, str) and runtime.isdigit():
+                    runtime = int(runtime)
+                cls.validate(title, year, runtime)
+            except (KeyError, TypeError, ValueError) as error:
+                outcome.errors[position] = error
+                continue
+
+            outcome.results[position] = cls._from_fields(title, year, runtime, _VIDEO_IDS())
+        return outcome
+
     def rental_price(self) -> int:
         '''Calculates rental price based on video year of release and runtime'''
         double_runtime = 240
 
-        if self.year == CURRENT_YEAR:
+        if self.year == Time.current_year():
             price = 1000
         else:
             price = 500
@@ -104,7 +462,7 @@ class Video:
         if self.is_rewound is True:
             self.is_rewound = False
         else:
-            raise AssertionError('Video has not been rewound') 
+            raise AssertionError('Video has not been rewound')
 
     def rewind(self) -> None:
         '''
@@ -114,7 +472,7 @@ class Video:
         if self.is_rewound is False:
             self.is_rewound = True
         else:
-            raise AssertionError('Video has already been rewound') 
+            raise AssertionError('Video has already been rewound')
 
 
 class Customer:
@@ -123,15 +481,22 @@ class Customer:
     name, date of birth, age, outstanding fines.
     If certain age and name requirements not met, exceptions raised
     '''
-    def __init__(self, firstname: str, surname: str, date_of_birth: str):
+    __slots__ = ('_name', '_date_of_birth', '_birth_date', '_age', '_age_on',
+                 '_balance', 'customer_id')
+
+    def __init__(self, firstname: str, surname: str, date_of_birth: str,
+                 customer_id: int | None = None):
         self._name = firstname + ' ' + surname
         self._date_of_birth = date_of_birth
-        self._age = self.age
+        day, month, year = date_of_birth.split('/')
+        self._birth_date = datetime.date(int(year), int(month), int(day))
+        self._age_on = None
+        self.customer_id = _CUSTOMER_IDS(customer_id)
         self._outstanding_fine = 0
 
-        if int(self._age) < 13:
+        if self.age_in_years < 13:
             raise ValueError('You must be 13 or above.')
-        if int(self._age) > 125:
+        if self.age_in_years > 125:
             raise ValueError('Maximum age (125 years old) exceeded')
 
         for character in (firstname + surname):
@@ -149,35 +514,57 @@ class Customer:
         Calculates the age of the customer based of date of birth and current date.
         Returns age as a string
         '''
-        date_of_birth = self._date_of_birth.split('/')
-        current_year = datetime.date.today().year
-        current_month = datetime.date.today().month
-        current_day = datetime.date.today().day
-        year_diff = current_year - int(date_of_birth[2])
-        month_diff = current_month - int(date_of_birth[1])
-        day_diff = current_day - int(date_of_birth[0])
+        return str(self.age_in_years)
+
+    @property
+    def age_in_years(self) -> int:
+        '''
+        Returns the age of the customer as an integer.
+        The age is worked out once per day and remembered until the day changes
+        '''
+        today = Time.today()
+        if self._age_on != today:
+            birth = self._birth_date
+            before_birthday = (today.month, today.day) < (birth.month, birth.day)
+            self._age = today.year - birth.year - before_birthday
+            self._age_on = today
+        return self._age
+
+    def is_at_least(self, years: int) -> bool:
+        '''Returns True if the customer is at least the given age i.e. 18'''
+        return self.age_in_years >= years
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __setstate__(self, state: dict) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        ACCOUNTS.balance_changed(self)
 
-        if day_diff < 0:
-            month_diff -= 1
-        if month_diff < 0:
-            year_diff -= 1
+    @property
+    def _outstanding_fine(self) -> int:
+        return self._balance
 
-        return str(year_diff)
+    @_outstanding_fine.setter
+    def _outstanding_fine(self, balance: int) -> None:
+        self._balance = balance
+        ACCOUNTS.balance_changed(self)
 
     @property
     def outstanding_fine(self) -> int:
         '''Getter to return outstanding fine'''
-        return self._outstanding_fine
+        return self._balance
 
     def pay_off_fine(self, payment: int) -> int:
         '''
-        Takes in an integer and adds it to _outstanding_fine
-        if argument passed in is not an in
-        raises a Type error
+        Takes in a whole number of pounds and takes it off the outstanding fine.
+        Returns the fine left in pence.
+        If argument passed in is not a positive integer raises a Type error
         '''
         if not isinstance(payment, int) or payment < 0:
             raise TypeError('Please pay a positive integer i.e. 5 or 10')
-        return self._outstanding_fine + payment*100
+        return post_payment(self, payment*100)
 
     @property
     def get_outstanding_fine(self) -> str:
@@ -185,28 +572,264 @@ class Customer:
         return f"£{self._outstanding_fine/100:.2f}"
 
 
+ACCOUNTS = CustomerAccounts()
+
+
+def late_fine(video: Video) -> int:
+    '''Returns the fine for returning a video late, higher for new releases'''
+    if video.year == Time.current_year():
+        return NEW_RELEASE_LATE_FINE
+    return LATE_FINE
+
+
+class StoreObserver:
+    '''
+    Base class for objects told about changes at a store.
+    Subclasses override the events they care about
+    '''
+    def on_stock(self, store: 'VideoStore', video: Video) -> None:
+        '''Called after a copy is added to a store with add_video'''
+
+    def on_rent(self, store: 'VideoStore', rental: 'Rental') -> None:
+        '''Called after a copy is rented'''
+
+    def on_return(self, store: 'VideoStore', rental: 'Rental', returned_on: int, fine: int) -> None:
+        '''Called after a copy is returned, with the fine issued for it'''
+
+    def on_fine(self, store: 'VideoStore', rental: 'Rental', fine: int, day: int) -> None:
+        '''Called after an overdue sweep run on a day ordinal fines a rental still on loan'''
+
+    def on_hold(self, store: 'VideoStore', video: Video) -> None:
+        '''Called after a copy is taken off the shelf to be held for a customer'''
+
+    def on_release(self, store: 'VideoStore', video: Video) -> None:
+        '''Called after a held copy is put back on the shelf'''
+
+    def on_payment(self, customer: 'Customer', amount: int) -> None:
+        '''Called after a customer pays towards their fines, once added to ACCOUNTS'''
+
+
+class BatchResult:
+    '''
+    Object to hold the outcome of a batch of rentals or returns.
+    results lines up with the batch, holding None where an item failed.
+    errors maps the position of each failed item to its exception
+    '''
+    def __init__(self, size: int):
+        self.results = [None] * size
+        self.errors = {}
+
+    @property
+    def succeeded(self) -> int:
+        '''Returns the number of items processed without error'''
+        return len(self.results) - len(self.errors)
+
+
+class Catalogue:
+    '''
+    Index of the videos held by a store.
+    Videos are keyed by title and by their stable video_id,
+    so lookups do not depend on the size of the catalogue
+    '''
+    def __init__(self, videos: list[Video]):
+        self._by_title = {}
+        self._by_id = {}
+        for video in videos:
+            self.add(video)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, title: str) -> bool:
+        return title in self._by_title
+
+    def add(self, video: Video) -> None:
+        '''
+        Adds a video to the index.
+        The first video added under a title is the one returned by title lookups.
+        Raises an exception if a copy with the same video_id is already held
+        '''
+        if video.video_id in self._by_id:
+            raise ValueError(f'Video {video.video_id} is already stocked at this store')
+        self._by_id[video.video_id] = video
+        self._by_title.setdefault(video.title, video)
+
+    def by_title(self, title: str) -> Video | None:
+        '''Returns the video held under the given title, or None'''
+        return self._by_title.get(title)
+
+    def by_id(self, video_id: int) -> Video | None:
+        '''Returns the video with the given video_id, or None'''
+        return self._by_id.get(video_id)
+
+
+class Inventory:
+    '''
+    Tracks the copies a store holds of each title and format.
+    Free copies are kept in a stack per (title, format) alongside a
+    free-copy counter per title, so renting, returning and checking
+    for a free copy never rebuild or scan the database
+    '''
+    def __init__(self, videos: list[Video]):
+        self._free = {}
+        self._copies = {}
+        self._formats = {}
+        self._free_by_title = {}
+        self._on_loan = set()
+        for video in videos:
+            self.add(video)
+
+    def add(self, video: Video) -> None:
+        '''Adds a copy of a video to the inventory as available'''
+        key = (video.title, video.media_format)
+        if key not in self._free:
+            self._free[key] = []
+            self._copies[key] = 0
+            self._formats.setdefault(video.title, []).append(video.media_format)
+        self._free[key].append(video)
+        self._copies[key] += 1
+        self._free_by_title[video.title] = self._free_by_title.get(video.title, 0) + 1
+
+    def copies(self, title: str, media_format: str | None = None) -> int:
+        '''Returns the number of copies held of a title, free or on loan'''
+        if media_format is not None:
+            return self._copies.get((title, media_format), 0)
+        return sum(self._copies[(title, fmt)] for fmt in self._formats.get(title, ()))
+
+    def available(self, title: str, media_format: str | None = None) -> int:
+        '''Returns the number of free copies of a title'''
+        if media_format is not None:
+            return len(self._free.get((title, media_format), ()))
+        return self._free_by_title.get(title, 0)
+
+    def take(self, title: str, media_format: str | None = None) -> Video | None:
+        '''
+        Removes a free copy of the title from the shelf and returns it.
+        If no format is given any free format is used.
+        Returns None if no copy is free
+        '''
+        if media_format is None:
+            formats = self._formats.get(title, ())
+        else:
+            formats = (media_format,)
+
+        for fmt in formats:
+            shelf = self._free.get((title, fmt))
+            if shelf:
+                video = shelf.pop()
+                self._free_by_title[title] -= 1
+                self._on_loan.add(video.video_id)
+                return video
+        return None
+
+    def take_copy(self, video: Video) -> bool:
+        '''
+        Removes a specific copy from the shelf.
+        Returns False if the copy is not on the shelf
+        '''
+        shelf = self._free.get((video.title, video.media_format), [])
+        if video not in shelf:
+            return False
+        shelf.remove(video)
+        self._free_by_title[video.title] -= 1
+        self._on_loan.add(video.video_id)
+        return True
+
+    def put(self, video: Video) -> None:
+        '''
+        Puts a copy on loan back on the shelf.
+        Raises an exception if the copy is not on loan from this inventory
+        '''
+        if video.video_id not in self._on_loan:
+            raise ValueError('Video is not on loan from this store')
+        self._on_loan.discard(video.video_id)
+        self._free[(video.title, video.media_format)].append(video)
+        self._free_by_title[video.title] += 1
+
+
 class VideoStore:
     '''
     Object to represent a video store.
     Holds methods to process videos into a database.
     Allow videos to be added, rented and returned.
+    Rentals are charged the price from the pricing engine given, i.e. a
+    pricing.PricingEngine, or each video's own price if there is none
     '''
-    def __init__(self, videos: list[Video]):
-        self._videos = videos
-        self._rent_status = self.rent_status_database()
-        
+    def __init__(self, videos: list[Video], store_id: int | None = None,
+                 pricing: object | None = None):
         if not isinstance(videos, list):
             raise TypeError('Please input a list of movies')
-        if len(self._videos) == 0:
+        if len(videos) == 0:
             raise ValueError('Video Store cannot contain 0 videos')
-        if len(self._videos) > 10:
-            raise ValueError('Video Store maximum capacity is 10 videos')
+
+        self.store_id = _STORE_IDS(store_id)
+        self.pricing = pricing
+        self._title_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._observers = []
+        self._videos = list(videos)
+        self._catalogue = Catalogue(videos)
+        self._inventory = Inventory(videos)
+        self._rent_status = self.rent_status_database()
+        self._open_rentals = {}
+        self._title_index = None
 
     @property
     def rent_status(self) -> dict:
         '''Getter function for rent_status'''
         return self._rent_status
 
+    @classmethod
+    def open(cls, backend: object, store_id: int, customers: dict) -> 'VideoStore':
+        '''
+        Takes in a storage backend, a store_id and a dictionary of customers by id.
+        Returns the store loaded from the backend, journalling its rentals there
+        '''
+        return backend.load_store(cls, store_id, customers)
+
+    def __getstate__(self) -> dict:
+        '''
+        Pickles the store without its locks, observers or search index,
+        so it can be handed to another process
+        '''
+        state = self.__dict__.copy()
+        del state['_title_locks']
+        state['_observers'] = []
+        state['_title_index'] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._title_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def _title_lock(self, title: str) -> threading.Lock:
+        '''
+        Returns the lock guarding the copies of a title at this store.
+        Titles share a fixed set of locks by hash, so tills renting
+        different titles rarely wait on each other
+        '''
+        return self._title_locks[hash(title) % LOCK_STRIPES]
+
+    def add_observer(self, observer: StoreObserver) -> None:
+        '''
+        Takes in a StoreObserver to be told about copies stocked,
+        rented and returned at this store
+        '''
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: StoreObserver) -> None:
+        '''Stops an observer from being told about rentals and returns'''
+        self._observers.remove(observer)
+
+    @property
+    def videos(self) -> list[Video]:
+        '''Returns every copy held by the store, on the shelf or on loan'''
+        return list(self._videos)
+
+    @property
+    def open_rentals(self) -> list:
+        '''Returns the Rental objects for every copy currently on loan'''
+        return list(self._open_rentals.values())
+
     @property
     def display_all_titles(self):
         '''
@@ -217,12 +840,66 @@ class VideoStore:
 
     def find_video_by_title(self, title: str) -> str:
         '''
-        Takes in a title string.
+        Takes in a title string, matched ignoring case and punctuation.
         Returns a title and year of release if video held in database
         '''
-        for video in self._videos:
-            if title == video.title:
-                return video.display_title
+        video = self._catalogue.by_title(title)
+        if video is None:
+            matches = self.title_index.lookup(title)
+            if not matches:
+                return None
+            video = self._catalogue.by_title(matches[0])
+        return video.display_title()
+
+    @property
+    def title_index(self) -> TitleIndex:
+        '''Returns the search index of titles held, built on first use'''
+        if self._title_index is None:
+            self._title_index = TitleIndex(self._rent_status)
+        return self._title_index
+
+    def search(self, query: str, limit: int = 10) -> list[str]:
+        '''
+        Takes in a search-as-you-type query string.
+        Returns up to limit titles and years of release,
+        falling back to fuzzy matches when no title starts with the query
+        '''
+        return [self._catalogue.by_title(title).display_title()
+                for title in self.title_index.search(query, limit)]
+
+    def find_video_by_id(self, video_id: int) -> Video | None:
+        '''
+        Takes in a video_id.
+        Returns the Video object if held in database, otherwise None
+        '''
+        return self._catalogue.by_id(video_id)
+
+    def add_video(self, video: Video) -> None:
+        '''
+        Takes in a Video object and stocks it as an available copy.
+        Several copies of a title, in any format, can be held at once,
+        but each copy must have its own video_id
+        '''
+        if not isinstance(video, Video):
+            raise TypeError('Please input a Video')
+        with self._title_lock(video.title):
+            self._catalogue.add(video)
+            self._videos.append(video)
+            self._inventory.add(video)
+            self._rent_status[video.title] = True
+            if self._title_index is not None:
+                self._title_index.add(video.title)
+        for observer in self._observers:
+            observer.on_stock(self, video)
+
+    def copies_available(self, title: str, media_format: str | None = None) -> int:
+        '''
+        Takes in a title string and an optional media format i.e. 'VHS' or 'DVD'.
+        Returns the number of copies free to rent
+        '''
+        if title not in self._rent_status:
+            raise ValueError('Title not in stock')
+        return self._inventory.available(title, media_format)
 
     def is_available(self, title: str) -> bool:
         '''
@@ -231,18 +908,14 @@ class VideoStore:
         Returns a boolean
         If title is not in the database, exception raised
         '''
-        for video in self._rent_status:
-            if title == video.title() and self._rent_status[title] is True:
-                return True
-            if title == video.title() and self._rent_status[title] is False:
-                return False
-
-        if title not in self._rent_status.keys():
+        if title not in self._rent_status:
             raise ValueError('Title not in stock')
+        return self._rent_status[title]
 
-    def rent_video(self, title: str, customer: object) -> object:
+    def rent_video(self, title: str, customer: object,
+                   media_format: str | None = None) -> object:
         '''
-        Takes in a video title string and Customer object.
+        Takes in a video title string, Customer object and optional media format.
         If video is available for rent,
         returns Rental object with information about video and customer.
         Otherwise raises and exception
@@ -250,22 +923,110 @@ class VideoStore:
         if not isinstance(customer, Customer):
             raise TypeError('Invalid Customer')
 
-        for video in self._videos:
-            if title == video.title:
-                video_object = video
-        if title not in self._rent_status.keys():
+        if title not in self._catalogue:
             raise TypeError('Title not in stock at store')
 
-        rented_video = Rental(video_object, customer)
+        error = ACCOUNTS.claim(customer)
+        if error is not None:
+            raise error
+
+        with self._title_lock(title):
+            video_object = self._inventory.take(title, media_format)
+            if video_object is not None:
+                self._rent_status[title] = self._inventory.available(title) > 0
+        if video_object is None:
+            ACCOUNTS.unclaim(customer)
+            raise ValueError('Title unavailable')
+
+        return self._lend(video_object, customer, Time.today_ordinal())
+
+    def price_of(self, video: Video, day: int | None = None) -> int:
+        '''Returns the price in pence of renting a copy at this store on a day, today by default'''
+        if self.pricing is not None:
+            return self.pricing.price(video, self, day)
+        return video.price
+
+    def _lend(self, video: Video, customer: Customer, rented_on: int) -> object:
+        '''Records a copy taken off the shelf as rented and returns the Rental'''
+        rented_video = Rental(video, customer, rented_on, self.price_of(video, rented_on))
+        self._open_rentals[video.video_id] = rented_video
+        ACCOUNTS.opened(self, rented_video)
+        for observer in self._observers:
+            observer.on_rent(self, rented_video)
+        return rented_video
+
+    def rent_many(self, requests: list[tuple[str, object]],
+                  media_format: str | None = None) -> BatchResult:
+        '''
+        Takes in a list of (title, Customer) pairs.
+        Each title is locked once, however many times it appears in the batch,
+        and each rental counts towards the customer's limit in the order given.
+        Returns a BatchResult holding a Rental or an error for every pair
+        '''
+        outcome = BatchResult(len(requests))
+        rented_on = Time.today_ordinal()
+
+        by_title = {}
+        for position, (title, customer) in enumerate(requests):
+            if not isinstance(customer, Customer):
+                outcome.errors[position] = TypeError('Invalid Customer')
+            elif title not in self._catalogue:
+                outcome.errors[position] = TypeError('Title not in stock at store')
+            else:
+                error = ACCOUNTS.claim(customer)
+                if error is not None:
+                    outcome.errors[position] = error
+                else:
+                    by_title.setdefault(title, []).append(position)
+
+        for title, positions in by_title.items():
+            with self._title_lock(title):
+                copies = []
+                for position in positions:
+                    video = self._inventory.take(title, media_format)
+                    if video is None:
+                        outcome.errors[position] = ValueError('Title unavailable')
+                    else:
+                        copies.append((position, video))
+                self._rent_status[title] = self._inventory.available(title) > 0
+
+            for position in positions:
+                if position in outcome.errors:
+                    ACCOUNTS.unclaim(requests[position][1])
+            for position, video in copies:
+                outcome.results[position] = self._lend(video, requests[position][1], rented_on)
+
+        return outcome
 
-        if customer.outstanding_fine < MAX_FINE:
-            for video in self._rent_status:
-                if title == video.title() and self.is_available(title):
-                    self._rent_status[title] = False
-                    return rented_video
-                if title == video.title() and not self.is_available(title):
-                    raise ValueError('Title unavailable')
-        raise RuntimeError(f"You have an outstanding fine of {customer.outstanding_fine}")
+
+    def return_many(self, returns: list[tuple[object, str]]) -> BatchResult:
+        '''
+        Takes in a list of (Rental, return date string) pairs.
+        Dates are compared as day ordinals and fines are totalled per customer
+        before being issued, so the batch is handled in a single pass.
+        Returns a BatchResult holding the fine charged or an error for every pair
+        '''
+        outcome = BatchResult(len(returns))
+        fines = {}
+
+        for position, (rented_video, return_date) in enumerate(returns):
+            if not isinstance(rented_video, Rental) or not isinstance(return_date, str):
+                outcome.errors[position] = TypeError('Check return date or rented video ')
+                continue
+            try:
+                fine = self._check_in(rented_video, self._returned_on(rented_video, return_date))
+            except (AssertionError, ValueError) as error:
+                outcome.errors[position] = error
+                continue
+
+            if fine:
+                fines[rented_video.customer] = fines.get(rented_video.customer, 0) + fine
+            outcome.results[position] = fine
+
+        for customer, total in fines.items():
+            post_fine(customer, total)
+
+        return outcome
 
     def rent_status_database(self) -> dict:
         '''
@@ -287,34 +1048,152 @@ class VideoStore:
         Issues a fine if video was returned late
         '''
         if isinstance(rented_video, Rental) and isinstance(return_date, str):
-            if rented_video.video.is_rewound is True:
-                self.rent_status[rented_video.video.title] = True
-                if self.check_date_one_bigger_than_two(rented_video.rented_date, return_date):
-                    raise ValueError('Return date cannot be before date of rental')
-
-                if self.check_date_one_bigger_than_two(return_date, rented_video.due_date):
-                    if rented_video.video.year == CURRENT_YEAR:
-                        rented_video.customer._outstanding_fine += 1500
-                    else:
-                        rented_video.customer._outstanding_fine += 1000
-            else:
-                raise AssertionError('Please rewind the video before returning')
+            fine = self._check_in(rented_video, self._returned_on(rented_video, return_date))
+            if fine:
+                post_fine(rented_video.customer, fine)
         else:
             raise TypeError('Check return date or rented video ')
 
+    def _returned_on(self, rented_video: object, return_date: str) -> int:
+        '''Returns the day ordinal a rental is checked back in on'''
+        return parse_date(return_date)
+
+    def _check_in(self, rented_video: object, returned_on: int) -> int:
+        '''
+        Puts a rented copy back on the shelf.
+        Returns the fine owed for the rental, which is 0 if returned on time
+        or if the fine was already issued by an overdue sweep
+        '''
+        if rented_video.video.is_rewound is not True:
+            raise AssertionError('Please rewind the video before returning')
+        if rented_video.rented_on > returned_on:
+            raise ValueError('Return date cannot be before date of rental')
+
+        with self._title_lock(rented_video.video.title):
+            self._inventory.put(rented_video.video)
+            self._rent_status[rented_video.video.title] = True
+            self._open_rentals.pop(rented_video.video.video_id, None)
+        ACCOUNTS.closed(self, rented_video)
+
+        fine = 0
+        if returned_on > rented_video.due_on:
+            with customer_lock(rented_video.customer):
+                if not rented_video.fine:
+                    fine = late_fine(rented_video.video)
+                    rented_video.fine = fine
+
+        for observer in self._observers:
+            observer.on_return(self, rented_video, returned_on, fine)
+        return fine
+
+    def hold(self, title: str, media_format: str | None = None) -> Video | None:
+        '''
+        Takes a free copy of the title off the shelf to keep for a customer.
+        Returns the copy, or None if no copy is free
+        '''
+        with self._title_lock(title):
+            video = self._inventory.take(title, media_format)
+            if video is None:
+                return None
+            self._rent_status[title] = self._inventory.available(title) > 0
+        for observer in self._observers:
+            observer.on_hold(self, video)
+        return video
+
+    def release(self, video: Video) -> None:
+        '''Puts a held copy back on the shelf'''
+        with self._title_lock(video.title):
+            self._inventory.put(video)
+            self._rent_status[video.title] = True
+        for observer in self._observers:
+            observer.on_release(self, video)
+
+    def hold_copy(self, video: Video) -> bool:
+        '''
+        Takes a specific copy off the shelf to keep, as hold does.
+        Returns False if the copy is not on the shelf
+        '''
+        with self._title_lock(video.title):
+            if not self._inventory.take_copy(video):
+                return False
+            self._rent_status[video.title] = self._inventory.available(video.title) > 0
+        for observer in self._observers:
+            observer.on_hold(self, video)
+        return True
+
+    def notify(self, event: str, *args) -> None:
+        '''
+        Calls the named observer hook, e.g. on_rent, on every observer
+        with this store and args. Used to report changes made without
+        observers, such as by restore_rental, as if made at this store
+        '''
+        for observer in list(self._observers):
+            getattr(observer, event)(self, *args)
+
+    def lend_held(self, video: Video, customer: Customer) -> object:
+        '''
+        Takes in a held copy and the customer it was held for.
+        Rents it to them and returns the Rental object
+        '''
+        if not isinstance(customer, Customer):
+            raise TypeError('Invalid Customer')
+        error = ACCOUNTS.claim(customer)
+        if error is not None:
+            raise error
+        return self._lend(video, customer, Time.today_ordinal())
+
+    def open_rental(self, video_id: int) -> object:
+        '''
+        Takes in the video_id of a copy on loan.
+        Returns its Rental object, or None if the copy is not on loan
+        '''
+        return self._open_rentals.get(video_id)
+
+    def restore_rental(self, video_id: int, customer: Customer,
+                       rented_on: int, fine: int = 0) -> object:
+        '''
+        Marks a specific copy as rented, without checks or observers.
+        Used to rebuild a store from saved state
+        '''
+        video = self._catalogue.by_id(video_id)
+        if video is None:
+            raise ValueError('Video is not on the shelf at this store')
+        with self._title_lock(video.title):
+            if not self._inventory.take_copy(video):
+                raise ValueError('Video is not on the shelf at this store')
+            self._rent_status[video.title] = self._inventory.available(video.title) > 0
+        rented_video = Rental(video, customer, rented_on)
+        rented_video.fine = fine
+        self._open_rentals[video_id] = rented_video
+        ACCOUNTS.opened(self, rented_video, claimed=False)
+        return rented_video
+
+    def restore_return(self, video_id: int, fine: int = 0) -> object:
+        '''
+        Puts a specific copy back on the shelf and issues the fine already
+        worked out for it, without checks or observers.
+        Used to rebuild a store from saved state
+        '''
+        rented_video = self._open_rentals.pop(video_id, None)
+        if rented_video is None:
+            raise ValueError('Video is not on loan from this store')
+        with self._title_lock(rented_video.video.title):
+            self._inventory.put(rented_video.video)
+            self._rent_status[rented_video.video.title] = True
+        ACCOUNTS.closed(self, rented_video)
+        if fine:
+            with customer_lock(rented_video.customer):
+                rented_video.fine += fine
+                rented_video.customer._outstanding_fine += fine
+        return rented_video
+
     def check_date_one_bigger_than_two(self, date_one: str, date_two: str) -> bool:
         '''
         Takes in two date arguments
         Returns True is first date argument is greater
         Returns False if not
         '''
-        date_one = date_one.split('/')
-        date_two = date_two.split('/')
-
-        date_one = datetime.date(int(date_one[2]), int(date_one[1]), int(date_one[0]))
-        date_two = datetime.date(int(date_two[2]), int(date_two[1]), int(date_two[0]))
-
-        if date_one > date_two:
+        if parse_date(date_one) > parse_date(date_two):
             return True
         return False
 
@@ -322,14 +1201,31 @@ class VideoStore:
 class Rental:
     '''
     Object to hold information regarding the Rented video:
-    due date, rented date, video and customer
+    due date, rented date, price charged, video and customer
     '''
-    def __init__(self, video: object, customer: object):
-        self.due_date = Time.time_day_delta(14)
-        self.rented_date = Time.time_now()
+    __slots__ = ('rented_on', 'due_on', 'fine', 'price', '_video', '_customer')
+
+    def __init__(self, video: object, customer: object, rented_on: int | None = None,
+                 price: int | None = None):
+        if rented_on is None:
+            rented_on = Time.today_ordinal()
+        self.rented_on = rented_on
+        self.due_on = rented_on + RENTAL_PERIOD
+        self.fine = 0
+        self.price = price if price is not None else video.price
         self._video = video
         self._customer = customer
 
+    @property
+    def rented_date(self) -> str:
+        '''returns the date of rental in dd/mm/yyyy format'''
+        return format_date(self.rented_on)
+
+    @property
+    def due_date(self) -> str:
+        '''returns the date the video is due back in dd/mm/yyyy format'''
+        return format_date(self.due_on)
+
     @property
     def video(self) -> str:
         '''returns the video object of the rented video'''
@@ -351,6 +1247,9 @@ class DVD(Video):
     Object which holds all information regarding DVDs
     Inherits from Video super class
     '''
+    __slots__ = ()
+    media_format = 'DVD'
+
     def rental_price(self) -> int:
         '''Returns a flat int value for dvd price'''
         return 1200
@@ -364,17 +1263,21 @@ class VendingMachine(VideoStore):
     Object which hold all information regarding Vending Machines
     Inherits from VideoStore super class
     '''
-    def __init__(self, videos):
-        super().__init__(videos)
+    def __init__(self, videos, store_id: int | None = None, pricing: object | None = None):
+        super().__init__(videos, store_id, pricing)
 
         if len(self._videos) == 0:
             raise ValueError('Video Store cannot contain 0 videos')
         if len(self._videos) > 5:
             raise ValueError('Vending Machine maximum capacity is 5 videos')
 
+    def add_video(self, video: Video) -> None:
+        if len(self._videos) >= 5:
+            raise ValueError('Vending Machine maximum capacity is 5 videos')
+        super().add_video(video)
 
-    def return_video(self, rented_video: object, return_date: str) -> None:
-        return super().return_video(rented_video, rented_video.due_date)
+    def _returned_on(self, rented_video: object, return_date: str) -> int:
+        return rented_video.due_on
 
 
 if __name__ == "__main__":
@@ -387,15 +1290,11 @@ if __name__ == "__main__":
     terminator = Video('The Terminator', 1985, 108)
     creed = Video('Creed', 2023, 160)
     movie_list = [matrix, terminator, creed]
-    
+
     store = VideoStore(movie_list)
     vendingmachine = VendingMachine(movie_list)
 
     rented_hassan = store.rent_video('The Matrix', hassan)
     rented_hassan.video.watch()
     rented_hassan.video.rewind()
-    store.return_video(rented_hassan, ON_TIME_RETURN_DATE)
-
-    
-  
-
+    store.return_video(rented_hassan, Time.time_day_delta(RENTAL_PERIOD))
@@ -0,0 +1,128 @@
+'''
+Directory of every member, indexed for lookups at the till.
+Customers are found by id, by normalized name, by date of birth, or by
+name and date of birth together, each a single dictionary lookup
+'''
+import csv
+import threading
+
+from blockbuster_oop import Customer, parse_date
+
+
+def normalize_name(name: str) -> str:
+    '''Returns a name folded to lower case with runs of spaces collapsed'''
+    return ' '.join(name.casefold().split())
+
+
+class CustomerDirectory:
+    '''
+    Object to hold the member base.
+    A customer is keyed on their normalized name and date of birth,
+    and adding a second customer with the same key is refused
+    '''
+    def __init__(self, customers: list[Customer] = ()):
+        self._by_id = {}
+        self._by_key = {}
+        self._by_name = {}
+        self._by_birth = {}
+        self._lock = threading.Lock()
+        for customer in customers:
+            self.add(customer)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, customer: Customer) -> bool:
+        return self._by_id.get(customer.customer_id) is customer
+
+    @staticmethod
+    def _key(name: str, date_of_birth: str) -> tuple[str, int]:
+        return normalize_name(name), parse_date(date_of_birth)
+
+    def add(self, customer: Customer) -> Customer:
+        '''
+        Takes in a Customer object and indexes it.
+        Raises ValueError if the customer, or one with the same name and
+        date of birth, is already in the directory
+        '''
+        if not isinstance(customer, Customer):
+            raise TypeError('Invalid Customer')
+        name, born = self._key(customer.name, customer._date_of_birth)
+        with self._lock:
+            existing = self._by_key.get((name, born))
+            if existing is not None:
+                raise ValueError(f'Customer already registered with id {existing}')
+            if customer.customer_id in self._by_id:
+                raise ValueError(f'Customer id {customer.customer_id} already registered')
+            self._by_id[customer.customer_id] = customer
+            self._by_key[(name, born)] = customer.customer_id
+            self._by_name.setdefault(name, []).append(customer.customer_id)
+            self._by_birth.setdefault(born, []).append(customer.customer_id)
+        return customer
+
+    def register(self, firstname: str, surname: str, date_of_birth: str) -> Customer:
+        '''
+        Returns the member with the given name and date of birth,
+        creating and adding them if they are not in the directory yet
+        '''
+        existing = self.find(f'{firstname} {surname}', date_of_birth)
+        if existing is not None:
+            return existing
+        try:
+            return self.add(Customer(firstname, surname, date_of_birth))
+        except ValueError:
+            return self.find(f'{firstname} {surname}', date_of_birth)
+
+    def remove(self, customer: Customer) -> None:
+        '''Removes a customer from every index'''
+        name, born = self._key(customer.name, customer._date_of_birth)
+        with self._lock:
+            if self._by_id.get(customer.customer_id) is not customer:
+                raise ValueError('Customer not in directory')
+            del self._by_id[customer.customer_id]
+            del self._by_key[(name, born)]
+            self._by_name[name].remove(customer.customer_id)
+            self._by_birth[born].remove(customer.customer_id)
+
+    def by_id(self, customer_id: int) -> Customer | None:
+        '''Returns the customer with the id, or None'''
+        return self._by_id.get(customer_id)
+
+    def find(self, name: str, date_of_birth: str) -> Customer | None:
+        '''Returns the customer with the full name and dd/mm/yyyy date of birth, or None'''
+        customer_id = self._by_key.get(self._key(name, date_of_birth))
+        return self._by_id.get(customer_id) if customer_id is not None else None
+
+    def by_name(self, name: str) -> list[Customer]:
+        '''Returns every customer with the full name, in any case or spacing'''
+        return [self._by_id[customer_id]
+                for customer_id in self._by_name.get(normalize_name(name), ())]
+
+    def born_on(self, date_of_birth: str) -> list[Customer]:
+        '''Returns every customer born on a dd/mm/yyyy date'''
+        return [self._by_id[customer_id]
+                for customer_id in self._by_birth.get(parse_date(date_of_birth), ())]
+
+    def load(self, path: str) -> dict:
+        '''
+        Streams members from a CSV file of firstname, surname, date_of_birth
+        and an optional customer_id, adding them one row at a time.
+        Returns counts of the members loaded, duplicates skipped and invalid rows
+        '''
+        counts = {'loaded': 0, 'duplicates': 0, 'invalid': 0}
+        with open(path, newline='', encoding='utf-8') as members:
+            for row in csv.reader(members):
+                if not row:
+                    continue
+                try:
+                    firstname, surname, date_of_birth = row[:3]
+                    customer_id = int(row[3]) if len(row) > 3 and row[3] else None
+                    if self._key(f'{firstname} {surname}', date_of_birth) in self._by_key:
+                        counts['duplicates'] += 1
+                        continue
+                    self.add(Customer(firstname, surname, date_of_birth, customer_id))
+                except ValueError:
+                    counts['invalid'] += 1
+                    continue
+                counts['loaded'] += 1
+        return counts
@@ -0,0 +1,236 @@
+'''
+Event-sourced ledger of everything that happens at a set of stores.
+Every stock, rent, return, fine and payment is appended as an immutable
+event, and views such as availability, customer balances and title
+popularity are kept up to date one event at a time.
+A view can always be rebuilt by replaying the ledger from the start
+'''
+import heapq
+import threading
+from typing import NamedTuple
+
+from blockbuster_oop import (ACCOUNTS, Customer, StoreObserver, Time, Video, VideoStore,
+                             post_payment)
+
+EVENT_KINDS = ('stock', 'rent', 'return', 'fine', 'payment', 'hold', 'release')
+
+
+class Event(NamedTuple):
+    '''
+    One entry in the ledger. Fields not used by a kind of event are None,
+    i.e. a payment has no store_id, video_id or title
+    '''
+    seq: int
+    kind: str
+    day: int | None = None
+    store_id: int | None = None
+    video_id: int | None = None
+    title: str | None = None
+    customer_id: int | None = None
+    amount: int = 0
+
+
+class LedgerView:
+    '''
+    Base class for state derived from the ledger.
+    Subclasses apply one event at a time and clear themselves on reset
+    '''
+    def apply(self, event: Event) -> None:
+        '''Updates the view with the next event in the ledger'''
+
+    def reset(self) -> None:
+        '''Clears the view back to its state before any event'''
+
+
+class AvailabilityView(LedgerView):
+    '''
+    View of the free copies of each title at each store.
+    A copy held for a reservation is not free, and renting it to the
+    customer it was held for does not take another copy off the shelf
+    '''
+    def __init__(self):
+        self._free = {}
+        self._held = set()
+
+    def reset(self) -> None:
+        self._free = {}
+        self._held = set()
+
+    def apply(self, event: Event) -> None:
+        key = (event.store_id, event.title)
+        if event.kind in ('stock', 'return'):
+            self._free[key] = self._free.get(key, 0) + 1
+        elif event.kind == 'hold':
+            self._held.add((event.store_id, event.video_id))
+            self._free[key] -= 1
+        elif event.kind == 'release':
+            self._held.discard((event.store_id, event.video_id))
+            self._free[key] += 1
+        elif event.kind == 'rent':
+            if (event.store_id, event.video_id) in self._held:
+                self._held.discard((event.store_id, event.video_id))
+            else:
+                self._free[key] -= 1
+
+    def copies(self, store_id: int, title: str) -> int:
+        '''Returns the number of free copies of a title at a store'''
+        return self._free.get((store_id, title), 0)
+
+    def is_available(self, store_id: int, title: str) -> bool:
+        '''Returns True if a store has a free copy of a title'''
+        return self.copies(store_id, title) > 0
+
+
+class BalanceView(LedgerView):
+    '''View of each customer's fines less their payments, in pence'''
+    def __init__(self):
+        self._balances = {}
+
+    def reset(self) -> None:
+        self._balances = {}
+
+    def apply(self, event: Event) -> None:
+        if event.kind == 'fine':
+            self._balances[event.customer_id] = self._balances.get(event.customer_id, 0) \
+                + event.amount
+        elif event.kind == 'payment':
+            self._balances[event.customer_id] = self._balances.get(event.customer_id, 0) \
+                - event.amount
+
+    def balance(self, customer_id: int) -> int:
+        '''Returns the balance the ledger holds for a customer'''
+        return self._balances.get(customer_id, 0)
+
+    def owing(self) -> dict[int, int]:
+        '''Returns every customer_id with a balance above zero, mapped to the balance'''
+        return {customer_id: balance for customer_id, balance in self._balances.items()
+                if balance > 0}
+
+
+class PopularityView(LedgerView):
+    '''View of how many times each title has been rented, across every store'''
+    def __init__(self):
+        self._rentals = {}
+
+    def reset(self) -> None:
+        self._rentals = {}
+
+    def apply(self, event: Event) -> None:
+        if event.kind == 'rent':
+            self._rentals[event.title] = self._rentals.get(event.title, 0) + 1
+
+    def rentals(self, title: str) -> int:
+        '''Returns the number of times a title has been rented'''
+        return self._rentals.get(title, 0)
+
+    def top(self, limit: int = 10) -> list[tuple[str, int]]:
+        '''Returns up to limit (title, rentals) pairs, most rented first'''
+        return heapq.nlargest(limit, self._rentals.items(), key=lambda item: (item[1], item[0]))
+
+
+class Ledger(StoreObserver):
+    '''
+    Object to hold the append-only list of events.
+    Attached to stores as an observer so their stock, rentals, returns and
+    fines are recorded as they happen, and to ACCOUNTS so every payment
+    posted to a customer is recorded too
+    '''
+    def __init__(self, views: list[LedgerView] = ()):
+        self._events = []
+        self._views = []
+        self._lock = threading.Lock()
+        for view in views:
+            self.add_view(view)
+        ACCOUNTS.add_observer(self)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self):
+        return iter(self._events[:])
+
+    def events(self, after: int = 0) -> list[Event]:
+        '''Returns the events with a sequence number above after'''
+        with self._lock:
+            return self._events[after:]
+
+    def append(self, kind: str, **fields) -> Event:
+        '''
+        Takes in an event kind and its fields.
+        Numbers the event, appends it and applies it to every view
+        '''
+        if kind not in EVENT_KINDS:
+            raise ValueError(f'Unknown event kind {kind!r}')
+        with self._lock:
+            event = Event(len(self._events) + 1, kind, **fields)
+            self._events.append(event)
+            for view in self._views:
+                view.apply(event)
+        return event
+
+    def add_view(self, view: LedgerView) -> None:
+        '''Brings a view up to date with the ledger and keeps it updated from then on'''
+        with self._lock:
+            view.reset()
+            for event in self._events:
+                view.apply(event)
+            self._views.append(view)
+
+    def rebuild(self, view: LedgerView) -> None:
+        '''Clears a view and replays every event into it'''
+        with self._lock:
+            view.reset()
+            for event in self._events:
+                view.apply(event)
+
+    def attach(self, store: VideoStore) -> None:
+        '''
+        Records the copies a store holds and the rentals it has open,
+        then follows the store's changes from then on
+        '''
+        store.add_observer(self)
+        for video in store.videos:
+            self.on_stock(store, video)
+        for rental in store.open_rentals:
+            self.on_rent(store, rental)
+
+    def record_payment(self, customer: Customer, amount: int) -> int:
+        '''
+        Takes a payment in pence off a customer's fines, which reaches the
+        ledger like any other payment. Returns the balance left
+        '''
+        if not isinstance(amount, int) or amount <= 0:
+            raise ValueError('Payment must be a positive number of pence')
+        return post_payment(customer, amount)
+
+    def on_stock(self, store: VideoStore, video: Video) -> None:
+        self.append('stock', store_id=store.store_id, video_id=video.video_id,
+                    title=video.title)
+
+    def on_hold(self, store: VideoStore, video: Video) -> None:
+        self.append('hold', store_id=store.store_id, video_id=video.video_id, title=video.title)
+
+    def on_release(self, store: VideoStore, video: Video) -> None:
+        self.append('release', store_id=store.store_id, video_id=video.video_id,
+                    title=video.title)
+
+    def on_rent(self, store: VideoStore, rental: object) -> None:
+        self.append('rent', day=rental.rented_on, store_id=store.store_id,
+                    video_id=rental.video.video_id, title=rental.video.title,
+                    customer_id=rental.customer.customer_id)
+
+    def on_return(self, store: VideoStore, rental: object, returned_on: int, fine: int) -> None:
+        self.append('return', day=returned_on, store_id=store.store_id,
+                    video_id=rental.video.video_id, title=rental.video.title,
+                    customer_id=rental.customer.customer_id)
+        if fine:
+            self.on_fine(store, rental, fine, returned_on)
+
+    def on_payment(self, customer: Customer, amount: int) -> None:
+        self.append('payment', day=Time.today_ordinal(), customer_id=customer.customer_id,
+                    amount=amount)
+
+    def on_fine(self, store: VideoStore, rental: object, fine: int, day: int) -> None:
+        self.append('fine', day=day, store_id=store.store_id, video_id=rental.video.video_id,
+                    title=rental.video.title, customer_id=rental.customer.customer_id,
+                    amount=fine)
@@ -0,0 +1,220 @@
+'''
+Metrics for the rental hot paths.
+instrument wraps Video.__init__, VideoStore.rent_video, VideoStore.return_video,
+VideoStore.check_date_one_bigger_than_two and Customer.age to count calls,
+errors and latencies, per store where there is one. uninstrument puts the
+original methods back, so nothing is paid while metrics are off.
+SamplingProfiler samples running threads to attribute time to the same entry points
+'''
+import bisect
+import functools
+import json
+import sys
+import threading
+import time
+
+from blockbuster_oop import Customer, Video, VideoStore
+
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                   1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+ENTRY_POINTS = {
+    'video_init': (Video, '__init__'),
+    'rent_video': (VideoStore, 'rent_video'),
+    'return_video': (VideoStore, 'return_video'),
+    'check_date': (VideoStore, 'check_date_one_bigger_than_two'),
+    'customer_age': (Customer, 'age'),
+}
+_STORE_OPERATIONS = ('rent_video', 'return_video', 'check_date')
+
+
+def _function(owner: type, attribute: str):
+    '''Returns the plain function behind a method or property'''
+    member = owner.__dict__[attribute]
+    return member.fget if isinstance(member, property) else member
+
+
+_ENTRY_CODES = {_function(*target).__code__: name for name, target in ENTRY_POINTS.items()}
+
+
+class OperationStats:
+    '''Object to hold the calls, errors and latency histogram of one operation'''
+    __slots__ = ('calls', 'errors', 'seconds', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float, failed: bool) -> None:
+        '''Records one call and how long it took'''
+        self.calls += 1
+        self.errors += failed
+        self.seconds += seconds
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+
+class Metrics:
+    '''
+    Object to collect OperationStats keyed by operation name and store_id,
+    which is None for operations not made at a store
+    '''
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, operation: str, store_id: int | None, seconds: float,
+                failed: bool = False) -> None:
+        '''Records one call of an operation'''
+        with self._lock:
+            stats = self._stats.get((operation, store_id))
+            if stats is None:
+                stats = self._stats[(operation, store_id)] = OperationStats()
+            stats.observe(seconds, failed)
+
+    def stats(self, operation: str, store_id: int | None = None) -> OperationStats | None:
+        '''Returns the stats for an operation, at a store if given'''
+        return self._stats.get((operation, store_id))
+
+    def totals(self, operation: str) -> dict:
+        '''Returns the calls, errors and seconds of an operation across every store'''
+        totals = {'calls': 0, 'errors': 0, 'seconds': 0.0}
+        for (name, _), stats in list(self._stats.items()):
+            if name == operation:
+                totals['calls'] += stats.calls
+                totals['errors'] += stats.errors
+                totals['seconds'] += stats.seconds
+        return totals
+
+    def reset(self) -> None:
+        '''Forgets everything recorded'''
+        with self._lock:
+            self._stats = {}
+
+    def to_dict(self) -> list[dict]:
+        '''Returns every operation's stats as a list of plain dictionaries'''
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: (item[0][0], item[0][1] or 0))
+            return [{'operation': operation, 'store': store_id, 'calls': stats.calls,
+                     'errors': stats.errors, 'seconds': stats.seconds,
+                     'buckets': dict(zip([*map(str, LATENCY_BUCKETS), '+Inf'], stats.buckets))}
+                    for (operation, store_id), stats in items]
+
+    def to_json(self) -> str:
+        '''Returns every operation's stats as JSON'''
+        return json.dumps(self.to_dict())
+
+    def to_prometheus(self) -> str:
+        '''Returns every operation's stats in the Prometheus text format'''
+        lines = ['# TYPE blockbuster_calls_total counter',
+                 '# TYPE blockbuster_errors_total counter',
+                 '# TYPE blockbuster_latency_seconds histogram']
+        for entry in self.to_dict():
+            labels = f'operation="{entry["operation"]}"'
+            if entry['store'] is not None:
+                labels += f',store="{entry["store"]}"'
+            lines.append(f'blockbuster_calls_total{{{labels}}} {entry["calls"]}')
+            lines.append(f'blockbuster_errors_total{{{labels}}} {entry["errors"]}')
+            cumulative = 0
+            for bound, count in entry['buckets'].items():
+                cumulative += count
+                lines.append(f'blockbuster_latency_seconds_bucket{{{labels},le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f'blockbuster_latency_seconds_sum{{{labels}}} {entry["seconds"]}')
+            lines.append(f'blockbuster_latency_seconds_count{{{labels}}} {entry["calls"]}')
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+_ORIGINALS = {}
+
+
+def _timed(operation: str, function, metrics: Metrics, per_store: bool):
+    '''Returns function wrapped to record every call into metrics'''
+    clock = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        start = clock()
+        failed = True
+        try:
+            result = function(self, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            metrics.observe(operation, self.store_id if per_store else None,
+                            clock() - start, failed)
+    return wrapper
+
+
+def instrument(metrics: Metrics = METRICS) -> Metrics:
+    '''Starts recording the entry points into metrics, returning it'''
+    uninstrument()
+    for operation, (owner, attribute) in ENTRY_POINTS.items():
+        member = owner.__dict__[attribute]
+        _ORIGINALS[operation] = member
+        wrapped = _timed(operation, _function(owner, attribute), metrics,
+                         operation in _STORE_OPERATIONS)
+        setattr(owner, attribute, property(wrapped, doc=member.__doc__)
+                if isinstance(member, property) else wrapped)
+    return metrics
+
+
+def uninstrument() -> None:
+    '''Puts the original entry points back'''
+    for operation, member in _ORIGINALS.items():
+        owner, attribute = ENTRY_POINTS[operation]
+        setattr(owner, attribute, member)
+    _ORIGINALS.clear()
+
+
+class SamplingProfiler:
+    '''
+    Object to sample the stack of every other thread at an interval.
+    Each sample is charged to the innermost entry point running in the thread,
+    so samples multiplied by the interval estimate the time spent in each
+    '''
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        '''Starts sampling in a background thread'''
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''Stops sampling'''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                while frame is not None:
+                    operation = _ENTRY_CODES.get(frame.f_code)
+                    if operation is not None:
+                        self.samples[operation] = self.samples.get(operation, 0) + 1
+                        break
+                    frame = frame.f_back
+
+    def report(self) -> dict[str, float]:
+        '''Returns the estimated seconds spent in each entry point, most first'''
+        return {operation: count * self.interval for operation, count
+                in sorted(self.samples.items(), key=lambda item: -item[1])}
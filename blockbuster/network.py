@@ -0,0 +1,96 @@
+'''Network of stores answering availability questions across every branch'''
+import math
+import threading
+
+from blockbuster_oop import StoreObserver, Video, VideoStore
+
+
+class StoreNetwork(StoreObserver):
+    '''
+    Object to federate many stores and vending machines.
+    Keeps an inverted index from each title to the stores with a free copy,
+    updated by every stock, rent and return at the member stores,
+    so network-wide lookups cost time in the number of matching stores
+    '''
+    def __init__(self, stores: list[VideoStore] = ()):
+        self._stores = {}
+        self._locations = {}
+        self._holders = {}
+        self._lock = threading.Lock()
+        for store in stores:
+            self.add_store(store)
+
+    def __len__(self) -> int:
+        return len(self._stores)
+
+    def add_store(self, store: VideoStore, location: tuple[float, float] | None = None) -> None:
+        '''
+        Takes in a store and an optional (x, y) location.
+        Indexes the titles the store has free and follows its changes from then on
+        '''
+        self._stores[store.store_id] = store
+        if location is not None:
+            self._locations[store.store_id] = location
+        store.add_observer(self)
+        self.refresh(store)
+
+    def remove_store(self, store: VideoStore) -> None:
+        '''Removes a store from the network and its index'''
+        store.remove_observer(self)
+        with self._lock:
+            for title in store.rent_status:
+                self._holders.get(title, set()).discard(store.store_id)
+        del self._stores[store.store_id]
+        self._locations.pop(store.store_id, None)
+
+    def refresh(self, store: VideoStore) -> None:
+        '''Re-indexes every title at a store, i.e. after restoring it from storage'''
+        for title in store.rent_status:
+            self._update(store, title)
+
+    def _update(self, store: VideoStore, title: str) -> None:
+        '''Brings the index entry for one title at one store up to date'''
+        with self._lock:
+            if store.is_available(title):
+                self._holders.setdefault(title, set()).add(store.store_id)
+            else:
+                self._holders.get(title, set()).discard(store.store_id)
+
+    def on_stock(self, store: VideoStore, video: Video) -> None:
+        self._update(store, video.title)
+
+    def on_rent(self, store: VideoStore, rental: object) -> None:
+        self._update(store, rental.video.title)
+
+    def on_return(self, store: VideoStore, rental: object, returned_on: int, fine: int) -> None:
+        self._update(store, rental.video.title)
+
+    def on_hold(self, store: VideoStore, video: Video) -> None:
+        self._update(store, video.title)
+
+    def on_release(self, store: VideoStore, video: Video) -> None:
+        self._update(store, video.title)
+
+    def is_available_anywhere(self, title: str) -> bool:
+        '''Returns True if any store in the network has a free copy of the title'''
+        return bool(self._holders.get(title))
+
+    def stores_with(self, title: str) -> list[VideoStore]:
+        '''Returns every store in the network with a free copy of the title'''
+        with self._lock:
+            store_ids = list(self._holders.get(title, ()))
+        return [self._stores[store_id] for store_id in store_ids]
+
+    def nearest(self, title: str, location: tuple[float, float],
+                limit: int = 5) -> list[VideoStore]:
+        '''
+        Takes in a title and an (x, y) location.
+        Returns up to limit stores with a free copy, closest first.
+        Stores added without a location come last
+        '''
+        def distance(store: VideoStore) -> float:
+            if store.store_id not in self._locations:
+                return math.inf
+            return math.dist(location, self._locations[store.store_id])
+
+        return sorted(self.stores_with(title), key=distance)[:limit]
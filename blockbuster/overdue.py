@@ -0,0 +1,94 @@
+'''Nightly overdue sweep assessing late fines across every open rental'''
+from array import array
+
+from blockbuster_oop import (LATE_FINE, MAX_FINE, NEW_RELEASE_LATE_FINE,
+                             Time, VideoStore, customer_lock)
+
+
+class OverdueReport:
+    '''
+    Object to hold the outcome of an overdue sweep.
+    days_overdue and fines line up with rentals.
+    totals maps each customer_id to the fines accrued by the sweep
+    '''
+    def __init__(self, rentals: list, days_overdue: array, fines: array, totals: dict):
+        self.rentals = rentals
+        self.days_overdue = days_overdue
+        self.fines = fines
+        self.totals = totals
+        self.customers = {}
+        self.warnings = []
+        self.blocked = []
+
+    @property
+    def total_fines(self) -> int:
+        '''Returns the sum of the fines accrued by the sweep'''
+        return sum(self.totals.values())
+
+
+def overdue_sweep(stores: list[VideoStore], today: int | None = None,
+                  apply: bool = True, warn_margin: int = NEW_RELEASE_LATE_FINE) -> OverdueReport:
+    '''
+    Takes in a list of stores and an optional day ordinal to sweep on.
+    Fines every open rental past its due date which has not been fined yet,
+    working out every rental's days overdue and fine in one pass.
+    When apply is True the fines are added to each customer once, in bulk,
+    skipping any rental fined by a return made while the sweep was running,
+    and each store's observers are told about the fines issued on its rentals.
+    Customers within warn_margin of MAX_FINE are listed in the report warnings
+    '''
+    if today is None:
+        today = Time.today_ordinal()
+    rates = (LATE_FINE, NEW_RELEASE_LATE_FINE)
+    current_year = Time.current_year()
+
+    rentals = []
+    days_overdue = array('l')
+    fines = array('l')
+    totals = {}
+    customers = {}
+    owed = {}
+    for store in stores:
+        for rental in store.open_rentals:
+            if rental.fine:
+                continue
+            customer = rental.customer
+            customers.setdefault(customer.customer_id, customer)
+            rentals.append(rental)
+            days = today - rental.due_on
+            if days > 0:
+                fine = rates[rental.video.year == current_year]
+                totals[customer.customer_id] = totals.get(customer.customer_id, 0) + fine
+                owed.setdefault(customer, []).append((store, rental, fine))
+            else:
+                days = fine = 0
+            days_overdue.append(days)
+            fines.append(fine)
+
+    report = OverdueReport(rentals, days_overdue, fines, totals)
+    report.customers = customers
+
+    for customer_id, total in totals.items():
+        customer = report.customers[customer_id]
+        balance = customer.outstanding_fine + total
+        if balance >= MAX_FINE:
+            report.blocked.append(customer)
+        elif balance >= MAX_FINE - warn_margin:
+            report.warnings.append(customer)
+
+    if apply:
+        for customer, customer_rentals in owed.items():
+            fined = []
+            with customer_lock(customer):
+                total = 0
+                for store, rental, fine in customer_rentals:
+                    if not rental.fine:
+                        rental.fine = fine
+                        total += fine
+                        fined.append((store, rental))
+                customer._outstanding_fine += total
+
+            for store, rental in fined:
+                store.notify('on_fine', rental, rental.fine, today)
+
+    return report
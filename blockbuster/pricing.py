@@ -0,0 +1,208 @@
+'''
+Rule-based pricing for rentals.
+A price is worked out by running a video through an ordered list of rules,
+each taking the price so far and returning a new one. Prices are memoized
+per video, store and day, and the memo is dropped whenever the rules change
+'''
+import datetime
+import threading
+from array import array
+
+from blockbuster_oop import DVD, Time, Video, VideoStore
+
+CACHED_DAYS = 7
+
+
+class PricingRule:
+    '''
+    Base class for a pricing rule.
+    Rules are treated as fixed once handed to a PricingEngine,
+    so change prices by swapping rules through the engine
+    '''
+    def apply(self, video: Video, store_id: int | None, day: int, price: int) -> int:
+        '''Takes in the price so far and returns the price after this rule'''
+        return price
+
+
+class BasePrice(PricingRule):
+    '''Starts every rental at a flat price'''
+    def __init__(self, price: int = 500):
+        self.price = price
+
+    def apply(self, video: Video, store_id: int | None, day: int, price: int) -> int:
+        return self.price
+
+
+class NewReleasePrice(PricingRule):
+    '''Charges a different price for videos released in the year of the rental'''
+    def __init__(self, price: int = 1000):
+        self.price = price
+
+    def apply(self, video: Video, store_id: int | None, day: int, price: int) -> int:
+        if video.year == datetime.date.fromordinal(day).year:
+            return self.price
+        return price
+
+
+class RuntimeTier(PricingRule):
+    '''Multiplies the price of videos running longer than a number of minutes'''
+    def __init__(self, over: int = 240, multiplier: int = 2):
+        self.over = over
+        self.multiplier = multiplier
+
+    def apply(self, video: Video, store_id: int | None, day: int, price: int) -> int:
+        if video.runtime > self.over:
+            return price * self.multiplier
+        return price
+
+
+class FormatPrice(PricingRule):
+    '''Sets a flat price per media format i.e. {'DVD': 1200}'''
+    def __init__(self, prices: dict[str, int]):
+        self.prices = dict(prices)
+
+    def apply(self, video: Video, store_id: int | None, day: int, price: int) -> int:
+        return self.prices.get(video.media_format, price)
+
+
+class Promotion(PricingRule):
+    '''
+    Takes a percentage off between two day ordinals, inclusive.
+    Limited to some titles or stores when they are given
+    '''
+    def __init__(self, percent_off: int, first_day: int, last_day: int,
+                 titles: list[str] | None = None, store_ids: list[int] | None = None):
+        if not 0 < percent_off <= 100:
+            raise ValueError('Promotion must take between 1 and 100 percent off')
+        self.percent_off = percent_off
+        self.first_day = first_day
+        self.last_day = last_day
+        self.titles = frozenset(titles) if titles is not None else None
+        self.store_ids = frozenset(store_ids) if store_ids is not None else None
+
+    def apply(self, video: Video, store_id: int | None, day: int, price: int) -> int:
+        if not self.first_day <= day <= self.last_day:
+            return price
+        if self.titles is not None and video.title not in self.titles:
+            return price
+        if self.store_ids is not None and store_id not in self.store_ids:
+            return price
+        return price * (100 - self.percent_off) // 100
+
+
+class StoreOverride(PricingRule):
+    '''Sets a flat price at one store, for every title or only those given'''
+    def __init__(self, store_id: int, price: int, titles: list[str] | None = None):
+        self.store_id = store_id
+        self.price = price
+        self.titles = frozenset(titles) if titles is not None else None
+
+    def apply(self, video: Video, store_id: int | None, day: int, price: int) -> int:
+        if store_id != self.store_id:
+            return price
+        if self.titles is not None and video.title not in self.titles:
+            return price
+        return self.price
+
+
+def default_rules() -> list[PricingRule]:
+    '''Returns the rules matching Video.rental_price and DVD.rental_price'''
+    return [BasePrice(500), NewReleasePrice(1000), RuntimeTier(240, 2),
+            FormatPrice({DVD.media_format: 1200})]
+
+
+class PricingEngine:
+    '''
+    Object to price rentals from an ordered list of rules.
+    Copies sharing a format, title, year and runtime share a price,
+    so each is priced once per store and day however many copies there are
+    '''
+    def __init__(self, rules: list[PricingRule] | None = None):
+        self._rules = list(rules) if rules is not None else default_rules()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        '''Pickles the rules only, so a store using the engine can be sent to another process'''
+        return {'_rules': self._rules}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state['_rules'])
+
+    @property
+    def rules(self) -> tuple[PricingRule, ...]:
+        '''Returns the rules in the order they are applied'''
+        return tuple(self._rules)
+
+    def set_rules(self, rules: list[PricingRule]) -> None:
+        '''Replaces every rule and forgets the prices worked out so far'''
+        with self._lock:
+            self._rules = list(rules)
+            self._cache = {}
+
+    def add_rule(self, rule: PricingRule) -> None:
+        '''Adds a rule after the others, i.e. a weekly promotion'''
+        self.set_rules(self._rules + [rule])
+
+    def remove_rule(self, rule: PricingRule) -> None:
+        '''Removes a rule, raising ValueError if the engine does not have it'''
+        rules = list(self._rules)
+        rules.remove(rule)
+        self.set_rules(rules)
+
+    def _prices_for(self, store_id: int | None, day: int) -> dict:
+        '''Returns the memo of prices for a store on a day, dropping the oldest days'''
+        with self._lock:
+            by_store = self._cache.get(day)
+            if by_store is None:
+                if len(self._cache) >= CACHED_DAYS:
+                    del self._cache[min(self._cache)]
+                by_store = self._cache[day] = {}
+            return by_store.setdefault(store_id, {})
+
+    def _compute(self, video: Video, store_id: int | None, day: int) -> int:
+        price = 0
+        for rule in self._rules:
+            price = rule.apply(video, store_id, day, price)
+        return price
+
+    def price(self, video: Video, store: VideoStore | None = None, day: int | None = None) -> int:
+        '''
+        Takes in a video, an optional store and an optional day ordinal.
+        Returns the rental price in pence, today by default
+        '''
+        if day is None:
+            day = Time.today_ordinal()
+        store_id = store.store_id if store is not None else None
+        prices = self._prices_for(store_id, day)
+        key = (video.media_format, video.title, video.year, video.runtime)
+        price = prices.get(key)
+        if price is None:
+            price = prices[key] = self._compute(video, store_id, day)
+        return price
+
+    def reprice(self, videos: list[Video], store: VideoStore | None = None,
+                day: int | None = None, apply: bool = False) -> array:
+        '''
+        Takes in a list of videos, an optional store and an optional day ordinal.
+        Returns an array of prices lining up with the videos, worked out in one
+        pass. When apply is True each video's list price is fixed to its price too.
+        Stores charge from their own engine, so apply only matters to stores without one
+        '''
+        if day is None:
+            day = Time.today_ordinal()
+        store_id = store.store_id if store is not None else None
+        prices = self._prices_for(store_id, day)
+
+        result = array('l')
+        for video in videos:
+            key = (video.media_format, video.title, video.year, video.runtime)
+            price = prices.get(key)
+            if price is None:
+                price = prices[key] = self._compute(video, store_id, day)
+            result.append(price)
+
+        if apply:
+            for video, price in zip(videos, result):
+                video.price = price
+        return result
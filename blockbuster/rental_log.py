@@ -0,0 +1,216 @@
+'''Columnar store of rental history held in parallel typed arrays'''
+from array import array
+
+from blockbuster_oop import DVD, Rental, StoreObserver, Video, VideoStore, format_date
+
+MEDIA_FORMATS = (Video.media_format, DVD.media_format)
+
+
+class RentalView:
+    '''
+    Read-only view of one row of a RentalLog.
+    Offers the same attributes as a Rental, with the video and customer
+    looked up from their ids only when asked for
+    '''
+    __slots__ = ('_log', '_index')
+
+    def __init__(self, log: 'RentalLog', index: int):
+        self._log = log
+        self._index = index
+
+    @property
+    def video_id(self) -> int:
+        '''returns the id of the rented video'''
+        return self._log.video_ids[self._index]
+
+    @property
+    def customer_id(self) -> int:
+        '''returns the id of the customer who rented the video'''
+        return self._log.customer_ids[self._index]
+
+    @property
+    def rented_on(self) -> int:
+        '''returns the day ordinal of the rental'''
+        return self._log.rented_on[self._index]
+
+    @property
+    def due_on(self) -> int:
+        '''returns the day ordinal the video is due back'''
+        return self._log.due_on[self._index]
+
+    @property
+    def store_id(self) -> int:
+        '''returns the id of the store the video was rented from, or 0 if not known'''
+        return self._log.store_ids[self._index]
+
+    @property
+    def price(self) -> int:
+        '''returns the price charged for the rental'''
+        return self._log.prices[self._index]
+
+    @property
+    def media_format(self) -> str:
+        '''returns the format of the rented copy, VHS or DVD'''
+        return MEDIA_FORMATS[self._log.formats[self._index]]
+
+    @property
+    def returned_on(self) -> int:
+        '''returns the day ordinal the video came back, or 0 if still out'''
+        return self._log.returned_on[self._index]
+
+    @property
+    def fine(self) -> int:
+        '''returns the fine issued for the rental'''
+        return self._log.fines[self._index]
+
+    @property
+    def rented_date(self) -> str:
+        '''returns the date of rental in dd/mm/yyyy format'''
+        return format_date(self.rented_on)
+
+    @property
+    def due_date(self) -> str:
+        '''returns the date the video is due back in dd/mm/yyyy format'''
+        return format_date(self.due_on)
+
+    @property
+    def video(self) -> object:
+        '''returns the video object of the rented video'''
+        return self._log.videos.get(self.video_id)
+
+    @property
+    def customer(self) -> object:
+        '''returns the customer object of the rented video'''
+        return self._log.customers.get(self.customer_id)
+
+    @property
+    def video_title(self) -> str:
+        '''returns the title of the rented video'''
+        return self.video.title
+
+
+class RentalLog:
+    '''
+    Object to hold rental history as parallel typed arrays:
+    video id, customer id, rented, due and returned day ordinals and fine,
+    plus the store, price, release year and media format of each rental.
+    A returned day of 0 marks a rental still out.
+    videos and customers map ids back to objects for the views handed out,
+    and store_kinds maps each store id to its class name.
+    returned_rows lists the rows in the order they were returned, so readers
+    can pick up returns made since they last looked
+    '''
+    def __init__(self, videos: dict | None = None, customers: dict | None = None):
+        self.videos = videos if videos is not None else {}
+        self.customers = customers if customers is not None else {}
+        self.store_kinds = {}
+        self.video_ids = array('q')
+        self.customer_ids = array('q')
+        self.rented_on = array('i')
+        self.due_on = array('i')
+        self.returned_on = array('i')
+        self.fines = array('i')
+        self.store_ids = array('i')
+        self.prices = array('i')
+        self.years = array('h')
+        self.formats = array('b')
+        self.returned_rows = array('q')
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    def __getitem__(self, index: int) -> RentalView:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Rental log index out of range')
+        return RentalView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield RentalView(self, index)
+
+    def _store_id(self, store: VideoStore | None) -> int:
+        if store is None:
+            return 0
+        self.store_kinds[store.store_id] = type(store).__name__
+        return store.store_id
+
+    def append(self, rental: Rental, returned_on: int = 0,
+               store: VideoStore | None = None) -> int:
+        '''
+        Takes in a Rental object, an optional return day ordinal
+        and the store it was rented from.
+        Adds it to the log and returns the index of its row
+        '''
+        index = len(self.video_ids)
+        self.video_ids.append(rental.video.video_id)
+        self.customer_ids.append(rental.customer.customer_id)
+        self.rented_on.append(rental.rented_on)
+        self.due_on.append(rental.due_on)
+        self.returned_on.append(returned_on)
+        self.fines.append(rental.fine)
+        self.store_ids.append(self._store_id(store))
+        self.prices.append(rental.price)
+        self.years.append(rental.video.year)
+        self.formats.append(MEDIA_FORMATS.index(rental.video.media_format))
+        if returned_on:
+            self.returned_rows.append(index)
+        return index
+
+    def extend(self, rentals: list[Rental], store: VideoStore | None = None) -> None:
+        '''Takes in a list of Rental objects still out and adds them all to the log'''
+        store_id = self._store_id(store)
+        self.video_ids.extend(rental.video.video_id for rental in rentals)
+        self.customer_ids.extend(rental.customer.customer_id for rental in rentals)
+        self.rented_on.extend(rental.rented_on for rental in rentals)
+        self.due_on.extend(rental.due_on for rental in rentals)
+        self.returned_on.extend(0 for _ in rentals)
+        self.fines.extend(rental.fine for rental in rentals)
+        self.store_ids.extend(store_id for _ in rentals)
+        self.prices.extend(rental.price for rental in rentals)
+        self.years.extend(rental.video.year for rental in rentals)
+        self.formats.extend(MEDIA_FORMATS.index(rental.video.media_format)
+                            for rental in rentals)
+
+    def record_return(self, index: int, returned_on: int, fine: int = 0) -> None:
+        '''Marks the rental at the given row as returned, with any fine issued'''
+        self.returned_on[index] = returned_on
+        self.fines[index] += fine
+        self.returned_rows.append(index)
+
+    def open_rows(self) -> list[int]:
+        '''Returns the row indexes of rentals still out'''
+        return [index for index, day in enumerate(self.returned_on) if day == 0]
+
+    def nbytes(self) -> int:
+        '''Returns the number of bytes held by the columns'''
+        columns = (self.video_ids, self.customer_ids, self.rented_on, self.due_on,
+                   self.returned_on, self.fines, self.store_ids, self.prices,
+                   self.years, self.formats, self.returned_rows)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+class RentalRecorder(StoreObserver):
+    '''
+    Observer writing every rental and return at the stores it is attached to
+    into a RentalLog, along with fines issued by overdue sweeps
+    '''
+    def __init__(self, log: RentalLog):
+        self.log = log
+        self._rows = {}
+
+    def on_rent(self, store: VideoStore, rental: Rental) -> None:
+        self.log.videos.setdefault(rental.video.video_id, rental.video)
+        self.log.customers.setdefault(rental.customer.customer_id, rental.customer)
+        self._rows[(store.store_id, rental.video.video_id)] = self.log.append(rental, store=store)
+
+    def on_return(self, store: VideoStore, rental: Rental, returned_on: int, fine: int) -> None:
+        index = self._rows.pop((store.store_id, rental.video.video_id), None)
+        if index is not None:
+            self.log.record_return(index, returned_on, fine)
+
+    def on_fine(self, store: VideoStore, rental: Rental, fine: int, day: int) -> None:
+        index = self._rows.get((store.store_id, rental.video.video_id))
+        if index is not None:
+            self.log.fines[index] += fine
@@ -0,0 +1,146 @@
+'''
+Reporting over rental history held in a RentalLog.
+Rows are folded into daily rollups as they arrive, so a monthly or yearly
+report adds up at most a year of daily totals instead of rescanning every rental
+'''
+import datetime
+import heapq
+
+from rental_log import MEDIA_FORMATS, RentalLog
+
+MEASURES = ('rentals', 'revenue', 'fines')
+
+
+def month_range(year: int, month: int) -> tuple[int, int]:
+    '''Returns the first and last day ordinals of a month'''
+    first = datetime.date(year, month, 1)
+    following = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return first.toordinal(), following.toordinal() - 1
+
+
+def year_range(year: int) -> tuple[int, int]:
+    '''Returns the first and last day ordinals of a year'''
+    return datetime.date(year, 1, 1).toordinal(), datetime.date(year, 12, 31).toordinal()
+
+
+class DailyRollup:
+    '''
+    Object to hold one day's totals.
+    rentals, revenue and fines map a (store_id, format code, release year) key
+    to the count or pence for that day. Rentals and revenue count on the day
+    rented and fines on the day returned. videos counts rentals per video_id
+    '''
+    __slots__ = ('rentals', 'revenue', 'fines', 'videos')
+
+    def __init__(self):
+        self.rentals = {}
+        self.revenue = {}
+        self.fines = {}
+        self.videos = {}
+
+
+class RentalReports:
+    '''
+    Object to answer group-by and aggregate queries over a RentalLog.
+    Dimensions are store, store_kind (VideoStore or VendingMachine),
+    format (VHS or DVD), year of release and release, which splits
+    new releases, rented in the year they came out, from the back catalogue
+    '''
+    def __init__(self, log: RentalLog):
+        self.log = log
+        self._days = {}
+        self._rows_rolled = 0
+        self._returns_rolled = 0
+        self._dimensions = {
+            'store': lambda key, _: key[0],
+            'store_kind': lambda key, _: self.log.store_kinds.get(key[0]),
+            'format': lambda key, _: MEDIA_FORMATS[key[1]],
+            'year': lambda key, _: key[2],
+            'release': lambda key, new_year: ('new_release' if key[2] == new_year
+                                              else 'back_catalogue'),
+        }
+
+    def _day(self, day: int) -> DailyRollup:
+        rollup = self._days.get(day)
+        if rollup is None:
+            rollup = self._days[day] = DailyRollup()
+        return rollup
+
+    def refresh(self) -> None:
+        '''Folds the rows and returns added to the log since the last refresh into the rollups'''
+        log = self.log
+        start, end = self._rows_rolled, len(log)
+        for day, store_id, media_format, year, price, video_id in zip(
+                log.rented_on[start:end], log.store_ids[start:end], log.formats[start:end],
+                log.years[start:end], log.prices[start:end], log.video_ids[start:end]):
+            rollup = self._day(day)
+            key = (store_id, media_format, year)
+            rollup.rentals[key] = rollup.rentals.get(key, 0) + 1
+            rollup.revenue[key] = rollup.revenue.get(key, 0) + price
+            rollup.videos[video_id] = rollup.videos.get(video_id, 0) + 1
+        self._rows_rolled = end
+
+        returned = log.returned_rows[self._returns_rolled:]
+        for index in returned:
+            fine = log.fines[index]
+            if fine:
+                rollup = self._day(log.returned_on[index])
+                key = (log.store_ids[index], log.formats[index], log.years[index])
+                rollup.fines[key] = rollup.fines.get(key, 0) + fine
+        self._returns_rolled += len(returned)
+
+    def _rollups(self, start: int, end: int) -> list[tuple[int, DailyRollup]]:
+        '''Returns the (day ordinal, rollup) pairs for the days given which have any'''
+        self.refresh()
+        if end - start + 1 > len(self._days):
+            return [(day, rollup) for day, rollup in self._days.items() if start <= day <= end]
+        return [(day, self._days[day]) for day in range(start, end + 1) if day in self._days]
+
+    def aggregate(self, measure: str, by: str, start: int, end: int,
+                  new_release_year: int | None = None) -> dict:
+        '''
+        Takes in a measure (rentals, revenue or fines), a dimension to group by
+        and the first and last day ordinals to report on.
+        By default a video counts as a new release on the days of the year it
+        came out; new_release_year picks one year to count for every day instead.
+        Returns a dictionary from each group to its total
+        '''
+        if measure not in MEASURES:
+            raise ValueError(f'Unknown measure {measure!r}')
+        if by not in self._dimensions:
+            raise ValueError(f'Unknown dimension {by!r}')
+
+        totals = {}
+        for day, rollup in self._rollups(start, end):
+            year = new_release_year or datetime.date.fromordinal(day).year
+            for key, value in getattr(rollup, measure).items():
+                totals[(key, year)] = totals.get((key, year), 0) + value
+
+        dimension = self._dimensions[by]
+        grouped = {}
+        for (key, year), value in totals.items():
+            group = dimension(key, year)
+            grouped[group] = grouped.get(group, 0) + value
+        return grouped
+
+    def top_titles(self, start: int, end: int, limit: int = 10) -> list[tuple[str, int]]:
+        '''Returns up to limit (title, rentals) pairs over the days given, most rented first'''
+        counts = {}
+        for _, rollup in self._rollups(start, end):
+            for video_id, rentals in rollup.videos.items():
+                counts[video_id] = counts.get(video_id, 0) + rentals
+
+        titles = {}
+        for video_id, rentals in counts.items():
+            video = self.log.videos.get(video_id)
+            title = video.title if video is not None else str(video_id)
+            titles[title] = titles.get(title, 0) + rentals
+        return heapq.nlargest(limit, titles.items(), key=lambda item: (item[1], item[0]))
+
+    def monthly(self, measure: str, by: str, year: int, month: int) -> dict:
+        '''Returns the aggregate for one calendar month'''
+        return self.aggregate(measure, by, *month_range(year, month))
+
+    def yearly(self, measure: str, by: str, year: int) -> dict:
+        '''Returns the aggregate for one calendar year'''
+        return self.aggregate(measure, by, *year_range(year))
@@ -0,0 +1,207 @@
+'''
+Reservations and waitlists for titles that are out.
+Each title keeps a priority queue of waiting customers, and a copy coming
+back is held for the first of them straight away. Holds run out after
+HOLD_DAYS, tracked on a timer wheel so expiry never scans every hold
+'''
+import heapq
+import itertools
+import threading
+
+from blockbuster_oop import DVD, Customer, StoreObserver, Time, Video, VideoStore
+
+HOLD_DAYS = 3
+FORMATS = (Video.media_format, DVD.media_format)
+
+WAITING = 'waiting'
+HELD = 'held'
+COLLECTED = 'collected'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+
+
+class Reservation:
+    '''
+    Object to hold one customer's place in the queue for a title.
+    priority is i.e. a loyalty tier, higher being served first.
+    Customers owing a fine when they reserve wait behind those who do not
+    '''
+    __slots__ = ('title', 'customer', 'media_format', 'priority', 'status',
+                 'video', 'expires_on', '_key')
+
+    def __init__(self, title: str, customer: Customer, media_format: str | None,
+                 priority: int, order: int):
+        self.title = title
+        self.customer = customer
+        self.media_format = media_format
+        self.priority = priority
+        self.status = WAITING
+        self.video = None
+        self.expires_on = None
+        self._key = (customer.outstanding_fine > 0, -priority, order)
+
+    def __lt__(self, other: 'Reservation') -> bool:
+        return self._key < other._key
+
+
+class TimerWheel:
+    '''
+    Ring of slots, one per day, holding the items due on that day.
+    Advancing the wheel only visits the slots for the days that have passed.
+    Items due further ahead than the ring is long wait in their slot
+    until a later turn reaches their day
+    '''
+    def __init__(self, slots: int = 64, today: int | None = None):
+        self._slots = [[] for _ in range(slots)]
+        self._now = today if today is not None else Time.today_ordinal()
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self._slots)
+
+    def schedule(self, day: int, item: object) -> None:
+        '''Adds an item due on a day ordinal'''
+        self._slots[max(day, self._now + 1) % len(self._slots)].append((day, item))
+
+    def advance(self, today: int) -> list:
+        '''Moves the wheel on to a day ordinal and returns the items now due'''
+        due = []
+        days = range(self._now + 1, today + 1)
+        if len(days) > len(self._slots):
+            days = range(today - len(self._slots) + 1, today + 1)
+        for day in days:
+            slot = self._slots[day % len(self._slots)]
+            if not slot:
+                continue
+            waiting = []
+            for entry in slot:
+                if entry[0] <= today:
+                    due.append(entry[1])
+                else:
+                    waiting.append(entry)
+            slot[:] = waiting
+        self._now = max(self._now, today)
+        return due
+
+
+class ReservationDesk(StoreObserver):
+    '''
+    Object to run the reservations at one store.
+    Attached to the store as an observer, so returns and new stock go to
+    the waiting customers before anyone else can rent them
+    '''
+    def __init__(self, store: VideoStore, hold_days: int = HOLD_DAYS):
+        self.store = store
+        self.hold_days = hold_days
+        self._queues = {}
+        self._order = itertools.count()
+        self._timers = TimerWheel()
+        self._lock = threading.RLock()
+        store.add_observer(self)
+
+    def reserve(self, title: str, customer: Customer, priority: int = 0,
+                media_format: str | None = None) -> Reservation:
+        '''
+        Takes in a title, a customer, an optional priority and media format.
+        Queues the customer for the title and holds a copy for them
+        if one is free and nobody is ahead of them
+        '''
+        if not isinstance(customer, Customer):
+            raise TypeError('Invalid Customer')
+        if title not in self.store.rent_status:
+            raise ValueError('Title not in stock')
+
+        reservation = Reservation(title, customer, media_format, priority, next(self._order))
+        with self._lock:
+            heapq.heappush(self._queues.setdefault((title, media_format), []), reservation)
+            self._allocate(title, media_format)
+        return reservation
+
+    def waiting(self, title: str) -> int:
+        '''Returns the number of customers waiting for a title, in any format'''
+        with self._lock:
+            return sum(1 for (queued_title, _), queue in self._queues.items()
+                       if queued_title == title
+                       for reservation in queue if reservation.status == WAITING)
+
+    def cancel(self, reservation: Reservation) -> None:
+        '''Gives up a place in the queue, or a held copy'''
+        with self._lock:
+            if reservation.status == HELD:
+                self._give_up(reservation, CANCELLED)
+            elif reservation.status == WAITING:
+                reservation.status = CANCELLED
+
+    def collect(self, reservation: Reservation) -> object:
+        '''Rents the held copy to the customer, returning the Rental object'''
+        with self._lock:
+            if reservation.status != HELD:
+                raise ValueError(f'Reservation is {reservation.status}, not held')
+            rental = self.store.lend_held(reservation.video, reservation.customer)
+            reservation.status = COLLECTED
+        return rental
+
+    def expire(self, today: int | None = None) -> list[Reservation]:
+        '''
+        Ends every hold which has run out by a day ordinal, today by default,
+        passing the copies on to the next customers waiting.
+        Returns the reservations expired
+        '''
+        if today is None:
+            today = Time.today_ordinal()
+        expired = []
+        with self._lock:
+            for reservation in self._timers.advance(today):
+                if reservation.status == HELD:
+                    self._give_up(reservation, EXPIRED)
+                    expired.append(reservation)
+        return expired
+
+    def _give_up(self, reservation: Reservation, status: str) -> None:
+        '''Puts a held copy back on the shelf and offers it to the next in line'''
+        video = reservation.video
+        reservation.status = status
+        reservation.video = None
+        self.store.release(video)
+        self._allocate(video.title, video.media_format)
+
+    def _next(self, title: str, media_format: str) -> list | None:
+        '''
+        Returns the queue whose first reservation should be served next
+        with a copy in the given format, from the queues for that format and
+        for any format. Reservations no longer waiting are dropped on the way
+        '''
+        best = best_head = None
+        for key in ((title, media_format), (title, None)):
+            queue = self._queues.get(key)
+            while queue and queue[0].status != WAITING:
+                heapq.heappop(queue)
+            if queue and (best_head is None or queue[0] < best_head):
+                best, best_head = queue, queue[0]
+        return best
+
+    def _allocate(self, title: str, media_format: str | None) -> None:
+        '''
+        Holds free copies of a title in a format, or in every format
+        if none is given, for the customers at the front of the queues
+        '''
+        for fmt in (media_format,) if media_format is not None else FORMATS:
+            while True:
+                queue = self._next(title, fmt)
+                if queue is None:
+                    break
+                video = self.store.hold(title, fmt)
+                if video is None:
+                    break
+                reservation = heapq.heappop(queue)
+                reservation.status = HELD
+                reservation.video = video
+                reservation.expires_on = Time.today_ordinal() + self.hold_days
+                self._timers.schedule(reservation.expires_on, reservation)
+
+    def on_stock(self, store: VideoStore, video: Video) -> None:
+        with self._lock:
+            self._allocate(video.title, video.media_format)
+
+    def on_return(self, store: VideoStore, rental: object, returned_on: int, fine: int) -> None:
+        with self._lock:
+            self._allocate(rental.video.title, rental.video.media_format)
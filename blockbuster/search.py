@@ -0,0 +1,134 @@
+'''Title search index supporting normalized, prefix and fuzzy lookups'''
+import bisect
+import difflib
+import heapq
+import re
+
+_WORDS = re.compile(r'[a-z0-9]+')
+
+
+def normalize_title(title: str) -> str:
+    '''Lower-cases a title and reduces it to its words separated by single spaces'''
+    return ' '.join(_WORDS.findall(title.lower()))
+
+
+def similarity(query: str, key: str) -> float:
+    '''
+    Returns how closely a normalized query matches a normalized title, from 0 to 1.
+    The query is compared against every run of the same number of words in the title
+    '''
+    words = key.split(' ')
+    width = len(query.split(' '))
+    best = 0.0
+    for start in range(max(len(words) - width + 1, 1)):
+        window = ' '.join(words[start:start + width])
+        best = max(best, difflib.SequenceMatcher(None, query, window).ratio())
+    return best
+
+
+def trigrams(text: str) -> set[str]:
+    '''Returns the set of three character sequences in a padded string'''
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    '''
+    Object to index titles for search.
+    Titles are indexed case-insensitively by their normalized form,
+    by every word-aligned suffix in a sorted prefix table for typeahead,
+    and by trigrams to shortlist titles for fuzzy matching of misspelt queries
+    '''
+    def __init__(self, titles: list[str] = ()):
+        self._titles = {}
+        self._prefixes = []
+        self._unsorted = []
+        self._trigrams = {}
+        for title in titles:
+            self.add(title)
+
+    def __len__(self) -> int:
+        return sum(len(titles) for titles in self._titles.values())
+
+    def add(self, title: str) -> None:
+        '''Adds a title to the index, ignoring titles already indexed'''
+        key = normalize_title(title)
+        titles = self._titles.setdefault(key, [])
+        if title in titles:
+            return
+        titles.append(title)
+        if len(titles) > 1:
+            return
+
+        words = key.split(' ')
+        for start in range(len(words)):
+            self._unsorted.append((' '.join(words[start:]), key))
+
+        for gram in trigrams(key):
+            self._trigrams.setdefault(gram, set()).add(key)
+
+    def lookup(self, title: str) -> list[str]:
+        '''Returns the titles matching the given title, ignoring case and punctuation'''
+        return list(self._titles.get(normalize_title(title), ()))
+
+    def prefix(self, text: str, limit: int = 10) -> list[str]:
+        '''
+        Returns up to limit titles containing a word starting with the text,
+        so 'ter' and 'the ter' both find 'The Terminator'
+        '''
+        query = normalize_title(text)
+        if not query:
+            return []
+        if self._unsorted:
+            self._prefixes.extend(self._unsorted)
+            self._prefixes.sort()
+            self._unsorted = []
+
+        matches = []
+        seen = set()
+        position = bisect.bisect_left(self._prefixes, (query,))
+        while position < len(self._prefixes) and len(matches) < limit:
+            suffix, key = self._prefixes[position]
+            if not suffix.startswith(query):
+                break
+            if key not in seen:
+                seen.add(key)
+                matches.extend(self._titles[key])
+            position += 1
+        return matches[:limit]
+
+    def fuzzy(self, text: str, limit: int = 10, threshold: float = 0.6) -> list[str]:
+        '''
+        Returns up to limit titles most similar to the text, best match first.
+        Titles sharing the most trigrams with the text are shortlisted,
+        then ranked by edit similarity against the words of each title
+        '''
+        query = normalize_title(text)
+        if not query:
+            return []
+
+        shared = {}
+        for gram in trigrams(query):
+            for key in self._trigrams.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        shortlist = heapq.nlargest(limit * 5, shared, key=shared.get)
+
+        scored = []
+        for key in shortlist:
+            score = similarity(query, key)
+            if score >= threshold:
+                scored.append((-score, key))
+        scored.sort()
+
+        matches = []
+        for _, key in scored[:limit]:
+            matches.extend(self._titles[key])
+        return matches[:limit]
+
+    def search(self, text: str, limit: int = 10) -> list[str]:
+        '''
+        Returns up to limit titles for a search-as-you-type query.
+        Titles with a word starting with the query are returned if there are any,
+        otherwise the query is treated as misspelt and fuzzy matches are returned
+        '''
+        return self.prefix(text, limit) or self.fuzzy(text, limit)
@@ -0,0 +1,265 @@
+'''
+asyncio service exposing stores over TCP.
+Requests and responses are JSON objects, one per line. A client may send
+many requests without waiting, and responses come back in the same order,
+each carrying the id of its request
+'''
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from blockbuster_oop import Customer, VideoStore
+from storage import SQLiteBackend
+
+
+class RentalService:
+    '''
+    Object to answer requests against a set of stores and their customers.
+    Each request names an op: rent, return, search, pay_fine or available
+    '''
+    def __init__(self, stores: list[VideoStore], customers: dict[int, Customer]):
+        self.stores = {store.store_id: store for store in stores}
+        self.customers = customers
+        self._ops = {
+            'rent': self.rent,
+            'return': self.return_video,
+            'search': self.search,
+            'pay_fine': self.pay_fine,
+            'available': self.available,
+        }
+
+    def handle(self, request: dict) -> dict:
+        '''
+        Takes in a request dictionary and returns the response dictionary.
+        Failures are answered with ok set to false and the error raised.
+        Any error is answered, so a request with fields of the wrong type
+        cannot drop the connection it came in on
+        '''
+        if not isinstance(request, dict):
+            return {'id': None, 'ok': False, 'error': 'TypeError',
+                    'message': 'Request must be a JSON object'}
+        response = {'id': request.get('id')}
+        try:
+            op = self._ops.get(request.get('op'))
+            if op is None:
+                raise ValueError(f"Unknown op {request.get('op')!r}")
+            response.update(op(request))
+            response['ok'] = True
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            response['ok'] = False
+            response['error'] = type(error).__name__
+            response['message'] = str(error)
+        return response
+
+    def _store(self, request: dict) -> VideoStore:
+        '''Returns the store named by a request, which may be left out if there is one store'''
+        if 'store' not in request and len(self.stores) == 1:
+            return next(iter(self.stores.values()))
+        return self.stores[request['store']]
+
+    def rent(self, request: dict) -> dict:
+        '''Rents a title to a customer'''
+        rental = self._store(request).rent_video(
+            request['title'], self.customers[request['customer']], request.get('format'))
+        return {'video': rental.video.video_id, 'due': rental.due_date}
+
+    def return_video(self, request: dict) -> dict:
+        '''Returns the copy with the given video id on the given date'''
+        store = self._store(request)
+        rental = store.open_rental(request['video'])
+        if rental is None:
+            raise ValueError('Video is not on loan from this store')
+        store.return_video(rental, request['date'])
+        return {'fine': rental.fine, 'outstanding': rental.customer.outstanding_fine}
+
+    def search(self, request: dict) -> dict:
+        '''Searches the titles held by a store'''
+        return {'titles': self._store(request).search(request['query'],
+                                                      request.get('limit', 10))}
+
+    def pay_fine(self, request: dict) -> dict:
+        '''Pays off part of a customer's fine, in pounds'''
+        customer = self.customers[request['customer']]
+        customer.pay_off_fine(request['amount'])
+        return {'outstanding': customer.outstanding_fine}
+
+    def available(self, request: dict) -> dict:
+        '''Reports whether a title has a free copy, and how many'''
+        store = self._store(request)
+        return {'available': store.is_available(request['title']),
+                'copies': store.copies_available(request['title'], request.get('format'))}
+
+
+async def handle_connection(service: RentalService, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+    '''
+    Answers every request line on a connection in order.
+    The client does not have to wait for a response before sending its next
+    request, and writing only waits when the client falls behind reading
+    '''
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                response = service.handle(json.loads(line))
+            except ValueError as error:
+                response = {'id': None, 'ok': False, 'error': type(error).__name__,
+                            'message': str(error)}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_server(service: RentalService, host: str = '127.0.0.1',
+                       port: int = 0) -> asyncio.base_events.Server:
+    '''Starts serving a RentalService, returning the asyncio server'''
+    return await asyncio.start_server(
+        lambda reader, writer: handle_connection(service, reader, writer), host, port)
+
+
+class RentalClient:
+    '''
+    Client for a rental server which can keep many requests in flight
+    on one connection, matching responses to requests by id.
+    Requests still waiting when the connection closes fail with ConnectionError
+    '''
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._waiting = {}
+        self._next_id = 0
+        self._closed = False
+        self._listener = asyncio.ensure_future(self._listen())
+
+    @classmethod
+    async def connect(cls, host: str, port: int) -> 'RentalClient':
+        '''Opens a connection to a rental server'''
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _listen(self) -> None:
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._waiting.pop(response.get('id'), None)
+                if future is None and self._waiting:
+                    # responses come back in order, so one the server could not
+                    # match to a request answers the oldest request still waiting
+                    future = self._waiting.pop(next(iter(self._waiting)))
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            self._closed = True
+            waiting, self._waiting = self._waiting, {}
+            for future in waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Connection to rental server closed'))
+
+    async def request(self, op: str, **fields) -> dict:
+        '''Sends a request and waits for its response'''
+        if self._closed:
+            raise ConnectionError('Connection to rental server closed')
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[self._next_id] = future
+        self._writer.write(json.dumps({'id': self._next_id, 'op': op, **fields}).encode() + b'\n')
+        return await future
+
+    async def close(self) -> None:
+        '''Closes the connection'''
+        self._writer.close()
+        self._listener.cancel()
+
+
+async def load_test(host: str, port: int, requests: list[dict],
+                    connections: int = 8, pipeline: int = 16) -> dict:
+    '''
+    Sends the requests to a rental server spread over several connections,
+    each keeping up to pipeline requests in flight.
+    Returns the throughput and latency percentiles in milliseconds
+    '''
+    latencies = []
+    clients = [await RentalClient.connect(host, port) for _ in range(connections)]
+
+    async def worker(client: RentalClient, share: list[dict]) -> None:
+        slots = asyncio.Semaphore(pipeline)
+
+        async def timed(request: dict) -> None:
+            async with slots:
+                fields = {key: value for key, value in request.items() if key != 'op'}
+                start = time.perf_counter()
+                await client.request(request['op'], **fields)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(timed(request) for request in share))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(client, requests[number::connections])
+                           for number, client in enumerate(clients)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentiles[49],
+        'p90_ms': percentiles[89],
+        'p99_ms': percentiles[98],
+        'max_ms': max(latencies, default=0.0),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    '''Serves stores from a storage backend, or load tests a running server'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='serve stores from a SQLite backend')
+    serve.add_argument('db')
+    serve.add_argument('stores', type=int, nargs='+')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+
+    load = commands.add_parser('load', help='send search and availability requests')
+    load.add_argument('title')
+    load.add_argument('--host', default='127.0.0.1')
+    load.add_argument('--port', type=int, default=8765)
+    load.add_argument('--requests', type=int, default=10000)
+    load.add_argument('--connections', type=int, default=8)
+    load.add_argument('--pipeline', type=int, default=16)
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        asyncio.run(serve_forever(args.db, args.stores, args.host, args.port))
+    else:
+        requests = [{'op': 'available', 'title': args.title} if number % 2
+                    else {'op': 'search', 'query': args.title[:3]}
+                    for number in range(args.requests)]
+        results = asyncio.run(load_test(args.host, args.port, requests,
+                                        args.connections, args.pipeline))
+        for name, value in results.items():
+            print(f'{name}: {value}')
+
+
+async def serve_forever(db: str, store_ids: list[int], host: str, port: int) -> None:
+    '''Loads stores from a SQLite backend and serves them until cancelled'''
+    backend = SQLiteBackend(db)
+    customers = backend.load_customers()
+    stores = [backend.open_store(store_id, customers) for store_id in store_ids]
+    server = await start_server(RentalService(stores, customers), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+'''
+Rental processing sharded across a pool of worker processes.
+Stores are partitioned between workers by store_id, so independent stores
+are served in parallel instead of sharing one interpreter
+'''
+import multiprocessing
+import os
+from multiprocessing.connection import Connection
+
+from blockbuster_oop import ACCOUNTS, Customer, VideoStore, post_fine
+
+
+def _error(error: Exception) -> tuple:
+    return ('error', type(error).__name__, str(error))
+
+
+def _serve_shard(connection: Connection,
+                 stores: list[VideoStore]) -> None:
+    '''
+    Runs in a worker process, applying batches of requests to the stores it owns.
+    A batch is a list of ('rent', store_id, title, customer, media_format) and
+    ('return', store_id, video_id, return_date) tuples. The reply lines up with it,
+    holding ('rented', video_id, due_on) or ('returned', customer_id, fine)
+    or ('error', exception name, message) for each request.
+    The worker only counts the rentals open at its own stores, as the parent
+    holds each customer's count across every store
+    '''
+    owned = {store.store_id: store for store in stores}
+    ACCOUNTS.clear()
+    for store in stores:
+        for rental in store.open_rentals:
+            ACCOUNTS.opened(store, rental, claimed=False)
+    while True:
+        batch = connection.recv()
+        if batch is None:
+            break
+        if batch == 'stores':
+            connection.send(list(owned.values()))
+            continue
+
+        replies = []
+        for request in batch:
+            try:
+                store = owned[request[1]]
+                if request[0] == 'rent':
+                    rental = store.rent_video(request[2], request[3], request[4])
+                    replies.append(('rented', rental.video.video_id, rental.due_on))
+                else:
+                    rental = store.open_rental(request[2])
+                    if rental is None:
+                        raise ValueError('Video is not on loan from this store')
+                    store.return_video(rental, request[3])
+                    replies.append(('returned', rental.customer.customer_id, rental.fine))
+            except (AssertionError, KeyError, RuntimeError, TypeError, ValueError) as error:
+                replies.append(_error(error))
+        connection.send(replies)
+    connection.close()
+
+
+class ShardedRentalService:
+    '''
+    Object to run stores in a pool of worker processes.
+    Requests are routed to the worker owning their store, and fines
+    worked out by the workers are merged into the parent's customers,
+    so a customer renting at several branches has one balance.
+    Rentals are claimed against the rental limit in the parent before they
+    are sent, so the limit holds across every worker
+    '''
+    def __init__(self, stores: list[VideoStore], customers: dict[int, Customer],
+                 workers: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.customers = customers
+        self._connections = []
+        self._processes = []
+
+        shards = [[] for _ in range(self.workers)]
+        for store in stores:
+            shards[self.shard_of(store.store_id)].append(store)
+
+        context = multiprocessing.get_context()
+        for shard in shards:
+            parent_end, worker_end = context.Pipe()
+            process = context.Process(target=_serve_shard, args=(worker_end, shard), daemon=True)
+            process.start()
+            worker_end.close()
+            self._connections.append(parent_end)
+            self._processes.append(process)
+
+    def __enter__(self) -> 'ShardedRentalService':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def shard_of(self, store_id: int) -> int:
+        '''Returns the number of the worker owning a store'''
+        return store_id % self.workers
+
+    def submit(self, requests: list[tuple]) -> list[tuple]:
+        '''
+        Takes in a list of ('rent', store_id, title, customer_id) or
+        ('rent', store_id, title, customer_id, media_format) and
+        ('return', store_id, video_id, return_date) requests.
+        Claims each rent against the customer's limit, sends each worker its
+        share in one message, then merges the fines issued into the customers
+        and gives back the claims of rents refused and copies returned.
+        Returns the replies in request order
+        '''
+        replies = [None] * len(requests)
+        batches = [[] for _ in range(self.workers)]
+        positions = [[] for _ in range(self.workers)]
+        for position, request in enumerate(requests):
+            shard = self.shard_of(request[1])
+            if request[0] == 'rent':
+                customer = self.customers.get(request[3])
+                if customer is None:
+                    replies[position] = _error(KeyError(f'Unknown customer {request[3]}'))
+                    continue
+                error = ACCOUNTS.claim(customer)
+                if error is not None:
+                    replies[position] = _error(error)
+                    continue
+                media_format = request[4] if len(request) > 4 else None
+                request = ('rent', request[1], request[2], customer, media_format)
+            batches[shard].append(request)
+            positions[shard].append(position)
+
+        for connection, batch in zip(self._connections, batches):
+            if batch:
+                connection.send(batch)
+
+        fines = {}
+        for connection, batch, shard_positions in zip(self._connections, batches, positions):
+            if not batch:
+                continue
+            for position, reply in zip(shard_positions, connection.recv()):
+                replies[position] = reply
+                request = requests[position]
+                if request[0] == 'rent' and reply[0] == 'error':
+                    ACCOUNTS.unclaim(self.customers[request[3]])
+                elif reply[0] == 'returned':
+                    customer = self.customers.get(reply[1])
+                    if customer is not None:
+                        ACCOUNTS.released(customer, request[1], request[2])
+                    if reply[2]:
+                        fines[reply[1]] = fines.get(reply[1], 0) + reply[2]
+
+        for customer_id, total in fines.items():
+            post_fine(self.customers[customer_id], total)
+        return replies
+
+    def stores(self) -> list[VideoStore]:
+        '''Returns copies of every store as they stand in the workers'''
+        collected = []
+        for connection in self._connections:
+            connection.send('stores')
+        for connection in self._connections:
+            collected.extend(connection.recv())
+        return collected
+
+    def close(self) -> None:
+        '''Stops the worker processes'''
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
@@ -0,0 +1,199 @@
+'''
+Read-only catalogue snapshots shared between worker processes.
+A snapshot file holds the catalogue in columns: video ids, years, runtimes,
+fixed prices and formats in typed arrays, and the titles in one string heap.
+Workers open it with mmap, so every process on a host reads the same pages
+from the OS page cache, and Video objects are only built for the rows used
+'''
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from blockbuster_oop import DVD, Video, VideoStore, reserve_video_ids
+from rental_log import MEDIA_FORMATS
+
+SNAPSHOT_MAGIC = b'BBCS'
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct('<4sHxxQQq')
+COLUMNS = (('video_ids', 'q'), ('years', 'h'), ('runtimes', 'h'),
+           ('prices', 'i'), ('formats', 'B'), ('title_offsets', 'Q'))
+_CLASSES = {Video.media_format: Video, DVD.media_format: DVD}
+_ALIGN = 8
+
+
+def _layout(count: int) -> tuple[dict, int]:
+    '''
+    Returns the (offset, length) of each column for a snapshot of count
+    videos, each column starting on an 8 byte boundary, and the heap offset
+    '''
+    columns = {}
+    offset = HEADER.size
+    for name, code in COLUMNS:
+        length = count + 1 if name == 'title_offsets' else count
+        columns[name] = (offset, length)
+        offset += -(-length * array(code).itemsize // _ALIGN) * _ALIGN
+    return columns, offset
+
+
+def write_snapshot(path: str, videos: list[Video]) -> int:
+    '''
+    Writes the videos to a snapshot file, replacing any snapshot
+    already at the path in one step so open readers are not disturbed.
+    Returns the number of bytes written
+    '''
+    titles = bytearray()
+    columns = {name: array(code) for name, code in COLUMNS}
+    columns['title_offsets'].append(0)
+    for video in videos:
+        columns['video_ids'].append(video.video_id)
+        columns['years'].append(video.year)
+        columns['runtimes'].append(video.runtime)
+        columns['prices'].append(video._price if video._price is not None else -1)
+        columns['formats'].append(MEDIA_FORMATS.index(video.media_format))
+        titles += video.title.encode('utf-8')
+        columns['title_offsets'].append(len(titles))
+
+    max_id = max(columns['video_ids'], default=0)
+    layout, heap_offset = _layout(len(videos))
+    parts = [HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(videos), len(titles), max_id)]
+    written = HEADER.size
+    for name, _ in COLUMNS:
+        column = columns[name]
+        if sys.byteorder != 'little':
+            column.byteswap()
+        offset = layout[name][0]
+        parts.append(bytes(offset - written))
+        parts.append(column.tobytes())
+        written = offset + len(parts[-1])
+    parts.append(bytes(heap_offset - written))
+    parts.append(bytes(titles))
+
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as snapshot:
+        for part in parts:
+            snapshot.write(part)
+    os.replace(temporary, path)
+    return heap_offset + len(titles)
+
+
+class CatalogueSnapshot:
+    '''
+    Object to read a snapshot file as a sequence of videos.
+    Indexing builds a Video or DVD for the row the first time it is asked
+    for and returns the same object after that. Pickling a snapshot only
+    sends its path, so a worker handed one maps the file itself
+    '''
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as snapshot:
+            self._map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count, heap_size, max_id = HEADER.unpack_from(self._map)
+        except struct.error:
+            self._map.close()
+            raise ValueError('File is too short to be a catalogue snapshot') from None
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self._map.close()
+            raise ValueError('File is not a catalogue snapshot this version can read')
+
+        layout, heap_offset = _layout(count)
+        if len(self._map) != heap_offset + heap_size:
+            self._map.close()
+            raise ValueError('Catalogue snapshot is truncated')
+        view = memoryview(self._map)
+        self._views = [view]
+        columns = {}
+        for name, code in COLUMNS:
+            offset, length = layout[name]
+            column = view[offset:offset + length * array(code).itemsize]
+            self._views.append(column)
+            if sys.byteorder != 'little':
+                column = array(code, column)
+                column.byteswap()
+            else:
+                column = column.cast(code)
+                self._views.append(column)
+            columns[name] = column
+        self._video_ids = columns['video_ids']
+        self._years = columns['years']
+        self._runtimes = columns['runtimes']
+        self._prices = columns['prices']
+        self._formats = columns['formats']
+        self._title_offsets = columns['title_offsets']
+        self._heap = view[heap_offset:]
+        self._views.append(self._heap)
+        self._count = count
+        self._videos = [None] * count
+        self._by_id = None
+        self._lock = threading.Lock()
+        reserve_video_ids(max_id)
+
+    def __reduce__(self) -> tuple:
+        return (type(self), (self.path,))
+
+    def __enter__(self) -> 'CatalogueSnapshot':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Video:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('Snapshot index out of range')
+        video = self._videos[index]
+        if video is None:
+            with self._lock:
+                video = self._videos[index]
+                if video is None:
+                    video = self._videos[index] = self._materialize(index)
+        return video
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    @property
+    def materialized(self) -> int:
+        '''Returns the number of rows built into Video objects so far'''
+        return self._count - self._videos.count(None)
+
+    def _materialize(self, index: int) -> Video:
+        '''Builds the video for a row, without validating it again'''
+        cls = _CLASSES[MEDIA_FORMATS[self._formats[index]]]
+        price = self._prices[index]
+        return cls._from_fields(self.title(index), self._years[index], self._runtimes[index],
+                                self._video_ids[index], price if price >= 0 else None)
+
+    def title(self, index: int) -> str:
+        '''Returns the title of a row without building its video'''
+        return str(self._heap[self._title_offsets[index]:self._title_offsets[index + 1]],
+                   'utf-8')
+
+    def by_id(self, video_id: int) -> Video | None:
+        '''Returns the video with the video_id, or None'''
+        if self._by_id is None:
+            self._by_id = {video_id: index for index, video_id in enumerate(self._video_ids)}
+        index = self._by_id.get(video_id)
+        return self[index] if index is not None else None
+
+    def videos(self) -> list[Video]:
+        '''Returns every video in the snapshot, building those not built yet'''
+        return list(self)
+
+    def store(self, store_id: int | None = None) -> VideoStore:
+        '''Returns a store stocked with every video in the snapshot'''
+        return VideoStore(self.videos(), store_id)
+
+    def close(self) -> None:
+        '''Unmaps the file. Videos already built stay usable'''
+        for view in reversed(self._views):
+            view.release()
+        self._map.close()
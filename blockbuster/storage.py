@@ -0,0 +1,358 @@
+'''
+Persistent storage for stores, customers and rentals.
+State is checkpointed into SQLite tables and every rental and return since
+the last checkpoint is written to an append-only journal, so a process can
+start by loading the checkpoint and replaying the tail of the journal
+'''
+import json
+import os
+import sqlite3
+import threading
+
+from blockbuster_oop import (ACCOUNTS, DVD, Customer, StoreObserver, Time, VendingMachine,
+                             Video, VideoStore)
+
+FORMATS = {Video.media_format: Video, DVD.media_format: DVD}
+STORE_KINDS = {VideoStore.__name__: VideoStore, VendingMachine.__name__: VendingMachine}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stores (
+    store_id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS videos (
+    video_id INTEGER PRIMARY KEY,
+    store_id INTEGER NOT NULL REFERENCES stores (store_id),
+    title TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    runtime INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    is_rewound INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS videos_by_store ON videos (store_id);
+CREATE INDEX IF NOT EXISTS videos_by_title ON videos (title);
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id INTEGER PRIMARY KEY,
+    firstname TEXT NOT NULL,
+    surname TEXT NOT NULL,
+    date_of_birth TEXT NOT NULL,
+    outstanding_fine INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rentals (
+    rental_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    store_id INTEGER NOT NULL REFERENCES stores (store_id),
+    video_id INTEGER NOT NULL REFERENCES videos (video_id),
+    customer_id INTEGER NOT NULL REFERENCES customers (customer_id),
+    rented_on INTEGER NOT NULL,
+    due_on INTEGER NOT NULL,
+    returned_on INTEGER,
+    fine INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS open_rentals ON rentals (store_id, returned_on);
+CREATE INDEX IF NOT EXISTS rentals_by_video ON rentals (video_id, returned_on);
+CREATE INDEX IF NOT EXISTS rentals_by_customer ON rentals (customer_id);
+CREATE TABLE IF NOT EXISTS fines (
+    fine_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL REFERENCES customers (customer_id),
+    video_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    posted_on INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fines_by_customer ON fines (customer_id);
+CREATE TABLE IF NOT EXISTS payments (
+    payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL REFERENCES customers (customer_id),
+    amount INTEGER NOT NULL,
+    paid_on INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS payments_by_customer ON payments (customer_id);
+'''
+
+
+class Journal(StoreObserver):
+    '''
+    Append-only log of stock, rent, return, fine and payment events,
+    one JSON object per line. Attached to a store as an observer, and to
+    ACCOUNTS for payments, so every event is written as it happens.
+    customers holds the ids of the customers kept in this journal's backend,
+    i.e. saved, loaded or renting at an attached store, and only their
+    payments are journalled, as ACCOUNTS reports payments made anywhere.
+    Holds are not journalled, as reservations are not saved either: a copy
+    held when the process stops is back on the shelf once the store is loaded
+    '''
+    def __init__(self, path: str, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self.seq = 0
+        self.customers = set()
+        for event in self.read():
+            self.seq = event['seq']
+            if event.get('customer') is not None:
+                self.customers.add(event['customer'])
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def read(self, after: int = 0) -> list[dict]:
+        '''Returns the events in the journal with a sequence number above after'''
+        if not os.path.exists(self.path):
+            return []
+        events = []
+        with open(self.path, encoding='utf-8') as journal:
+            for line in journal:
+                if not line.endswith('\n'):
+                    break
+                event = json.loads(line)
+                if event['seq'] > after:
+                    events.append(event)
+        return events
+
+    def write(self, event: dict) -> None:
+        '''Numbers an event and appends it to the journal'''
+        with self._lock:
+            self.seq += 1
+            event['seq'] = self.seq
+            self._file.write(json.dumps(event, separators=(',', ':')) + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def truncate(self) -> None:
+        '''Empties the journal once its events are safely checkpointed'''
+        self._file.truncate(0)
+        self._file.flush()
+
+    def close(self) -> None:
+        '''Closes the journal file'''
+        self._file.close()
+
+    def on_stock(self, store: VideoStore, video: Video) -> None:
+        '''Journals a copy added to a store'''
+        self.write({'event': 'stock', 'store': store.store_id, 'video': video.video_id,
+                    'title': video.title, 'year': video.year, 'runtime': video.runtime,
+                    'format': video.media_format})
+
+    def on_rent(self, store: VideoStore, rental: object) -> None:
+        '''Journals a rental at a store'''
+        self.customers.add(rental.customer.customer_id)
+        self.write({'event': 'rent', 'store': store.store_id,
+                    'video': rental.video.video_id, 'customer': rental.customer.customer_id,
+                    'day': rental.rented_on, 'due': rental.due_on})
+
+    def on_return(self, store: VideoStore, rental: object, returned_on: int, fine: int) -> None:
+        '''Journals a return at a store'''
+        self.write({'event': 'return', 'store': store.store_id,
+                    'video': rental.video.video_id, 'customer': rental.customer.customer_id,
+                    'day': returned_on, 'fine': fine})
+
+    def on_fine(self, store: VideoStore, rental: object, fine: int, day: int) -> None:
+        '''Journals a fine issued by an overdue sweep on a copy still on loan'''
+        self.write({'event': 'fine', 'store': store.store_id,
+                    'video': rental.video.video_id, 'customer': rental.customer.customer_id,
+                    'day': day, 'fine': fine})
+
+    def on_payment(self, customer: Customer, amount: int) -> None:
+        '''Journals a payment towards the fines of a customer kept in this journal's backend'''
+        if customer.customer_id not in self.customers:
+            return
+        self.write({'event': 'payment', 'store': None, 'customer': customer.customer_id,
+                    'day': Time.today_ordinal(), 'amount': amount})
+
+
+class SQLiteBackend:
+    '''
+    Storage backend keeping a checkpoint of every store, video, customer,
+    rental, fine and payment in indexed SQLite tables, plus a journal of the
+    events since the checkpoint
+    '''
+    def __init__(self, path: str, journal_path: str | None = None, fsync: bool = False):
+        self._db = sqlite3.connect(path)
+        self._db.executescript(SCHEMA)
+        self.journal = Journal(journal_path or path + '.journal', fsync)
+        self.journal.seq = max(self.journal.seq, self.checkpoint_seq)
+        ACCOUNTS.add_observer(self.journal)
+        self._tail = None
+
+    def close(self) -> None:
+        '''Closes the database and journal'''
+        ACCOUNTS.remove_observer(self.journal)
+        self.journal.close()
+        self._db.close()
+
+    @property
+    def checkpoint_seq(self) -> int:
+        '''Returns the journal sequence number the tables are up to date with'''
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'journal_seq'").fetchone()
+        return row[0] if row else 0
+
+    def attach(self, store: VideoStore) -> None:
+        '''Journals every rental and return at the store from now on'''
+        store.add_observer(self.journal)
+
+    def save_customers(self, customers: list[Customer]) -> None:
+        '''Writes customers and their outstanding fines to the customers table'''
+        rows = []
+        for customer in customers:
+            firstname, surname = customer.name.split(' ', 1)
+            rows.append((customer.customer_id, firstname, surname,
+                         customer._date_of_birth, customer.outstanding_fine))
+            self.journal.customers.add(customer.customer_id)
+        self._db.executemany('INSERT OR REPLACE INTO customers VALUES (?, ?, ?, ?, ?)', rows)
+
+    def save_store(self, store: VideoStore) -> None:
+        '''Writes a store and every copy it holds to the stores and videos tables'''
+        self._db.execute('INSERT OR REPLACE INTO stores VALUES (?, ?)',
+                         (store.store_id, type(store).__name__))
+        self._db.executemany(
+            'INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(video.video_id, store.store_id, video.title, video.year, video.runtime,
+              video.media_format, int(video.is_rewound)) for video in store.videos])
+
+    def checkpoint(self, stores: list[VideoStore], customers: list[Customer]) -> None:
+        '''
+        Writes the stores and customers, including any customer with a copy
+        on loan from the stores, to the tables. Moves the journalled rentals,
+        returns, fines and payments into their tables, bringing the balance of
+        any other customer up to date, and writes the fines already issued on
+        copies still on loan, then empties the journal. All in one transaction
+        '''
+        everyone = {customer.customer_id: customer for customer in customers}
+        for store in stores:
+            for rental in store.open_rentals:
+                everyone.setdefault(rental.customer.customer_id, rental.customer)
+
+        events = self.journal.read(self.checkpoint_seq)
+        with self._db:
+            for store in stores:
+                self.save_store(store)
+            self.save_customers(everyone.values())
+            for event in events:
+                self._apply(event, everyone)
+            for store in stores:
+                self._db.executemany(
+                    'UPDATE rentals SET fine = ? WHERE video_id = ? AND returned_on IS NULL',
+                    [(rental.fine, rental.video.video_id) for rental in store.open_rentals])
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('journal_seq', ?)",
+                             (self.journal.seq,))
+        self.journal.truncate()
+        self._tail = None
+
+    def _journal_tail(self) -> dict[int | None, list[dict]]:
+        '''
+        Returns the events journalled since the checkpoint, grouped by store_id.
+        The journal is only read again once it has been written to, so
+        loading the customers and then each store reads it once
+        '''
+        if self._tail is None or self._tail[0] != self.journal.seq:
+            tail = {}
+            for event in self.journal.read(self.checkpoint_seq):
+                tail.setdefault(event['store'], []).append(event)
+            self._tail = (self.journal.seq, tail)
+        return self._tail[1]
+
+    def _apply(self, event: dict, saved: dict[int, Customer]) -> None:
+        '''
+        Writes a journalled event into the rentals, fines and payments tables.
+        Balances of customers not in saved, which are written whole, are moved
+        on by the fines and payments in the event
+        '''
+        if event['event'] == 'stock':
+            return
+        if event['event'] == 'payment':
+            self._db.execute(
+                'INSERT INTO payments (customer_id, amount, paid_on) VALUES (?, ?, ?)',
+                (event['customer'], event['amount'], event['day']))
+            if event['customer'] not in saved:
+                self._db.execute('UPDATE customers SET outstanding_fine = outstanding_fine - ?'
+                                 ' WHERE customer_id = ?', (event['amount'], event['customer']))
+            return
+        if event['event'] == 'rent':
+            self._db.execute(
+                'INSERT INTO rentals (store_id, video_id, customer_id, rented_on, due_on)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (event['store'], event['video'], event['customer'], event['day'], event['due']))
+            return
+
+        if event['event'] == 'fine':
+            self._db.execute(
+                'UPDATE rentals SET fine = fine + ? WHERE video_id = ? AND returned_on IS NULL',
+                (event['fine'], event['video']))
+        else:
+            self._db.execute(
+                'UPDATE rentals SET returned_on = ?, fine = fine + ?'
+                ' WHERE video_id = ? AND returned_on IS NULL',
+                (event['day'], event['fine'], event['video']))
+        if event['fine']:
+            self._db.execute(
+                'INSERT INTO fines (customer_id, video_id, amount, posted_on) VALUES (?, ?, ?, ?)',
+                (event['customer'], event['video'], event['fine'], event['day']))
+            if event['customer'] not in saved:
+                self._db.execute('UPDATE customers SET outstanding_fine = outstanding_fine + ?'
+                                 ' WHERE customer_id = ?', (event['fine'], event['customer']))
+
+    def load_customers(self) -> dict[int, Customer]:
+        '''Returns every customer in the checkpoint, keyed by customer_id'''
+        customers = {}
+        for customer_id, firstname, surname, date_of_birth, fine in self._db.execute(
+                'SELECT * FROM customers'):
+            customer = Customer(firstname, surname, date_of_birth, customer_id)
+            customer._outstanding_fine = fine
+            customers[customer_id] = customer
+        self.journal.customers.update(customers)
+
+        for events in self._journal_tail().values():
+            for event in events:
+                if event.get('customer') not in customers:
+                    continue
+                if event['event'] in ('return', 'fine'):
+                    customers[event['customer']]._outstanding_fine += event['fine']
+                elif event['event'] == 'payment':
+                    customers[event['customer']]._outstanding_fine -= event['amount']
+        return customers
+
+    def open_store(self, store_id: int, customers: dict[int, Customer]) -> VideoStore:
+        '''Loads a store as the kind of store it was saved as'''
+        row = self._db.execute('SELECT kind FROM stores WHERE store_id = ?', (store_id,)).fetchone()
+        if row is None:
+            raise ValueError(f'Store {store_id} not found')
+        return self.load_store(STORE_KINDS[row[0]], store_id, customers)
+
+    def load_store(self, cls: type, store_id: int, customers: dict[int, Customer]) -> VideoStore:
+        '''
+        Takes in a store class, a store_id and the customers loaded from this backend.
+        Builds the store from the checkpoint, replays the journal tail for it
+        and attaches the journal so later rentals and returns are recorded
+        '''
+        videos = []
+        for video_id, title, year, runtime, media_format, is_rewound in self._db.execute(
+                'SELECT video_id, title, year, runtime, format, is_rewound'
+                ' FROM videos WHERE store_id = ? ORDER BY video_id', (store_id,)):
+            video = FORMATS[media_format](title, year, runtime, video_id)
+            video.is_rewound = bool(is_rewound)
+            videos.append(video)
+        if not videos:
+            raise ValueError(f'Store {store_id} not found')
+        store = cls(videos, store_id)
+
+        for video_id, customer_id, rented_on, fine in self._db.execute(
+                'SELECT video_id, customer_id, rented_on, fine FROM rentals'
+                ' WHERE store_id = ? AND returned_on IS NULL', (store_id,)):
+            store.restore_rental(video_id, customers[customer_id], rented_on, fine)
+
+        for event in self._journal_tail().get(store_id, ()):
+            if event['event'] == 'stock':
+                store.add_video(FORMATS[event['format']](event['title'], event['year'],
+                                                         event['runtime'], event['video']))
+            elif event['event'] == 'rent':
+                store.restore_rental(event['video'], customers[event['customer']], event['day'])
+            elif event['event'] == 'fine':
+                store.open_rental(event['video']).fine += event['fine']
+            else:
+                rental = store.restore_return(event['video'])
+                rental.fine += event['fine']
+
+        self.attach(store)
+        return store
@@ -0,0 +1,283 @@
+'''
+Offline running for vending machines.
+A machine logs every copy stocked and every rent, return and fine it makes,
+and when it can reach its parent store it sends the operations the parent
+has not seen as a compact binary delta. The parent remembers the last
+operation applied from each machine, so a delta sent twice is only applied once
+'''
+import json
+import os
+import struct
+import threading
+
+from blockbuster_oop import (DVD, Customer, StoreObserver, Time, VendingMachine, Video,
+                             VideoStore, customer_lock)
+from rental_log import MEDIA_FORMATS
+
+DELTA_VERSION = 2
+HEADER = struct.Struct('<BqQI')
+RECORD = struct.Struct('<Bqqii')
+STOCK = struct.Struct('<hhBH')
+OPERATIONS = ('rent', 'return', 'fine', 'stock')
+_CLASSES = {Video.media_format: Video, DVD.media_format: DVD}
+
+
+def encode_delta(machine_id: int, first_seq: int, operations: list[tuple]) -> bytes:
+    '''
+    Packs operations numbered from first_seq into bytes.
+    Each operation is a (kind, video_id, customer_id, day, amount) tuple
+    and takes RECORD.size bytes, after a HEADER.size byte header.
+    A stock operation carries a sixth item, the (title, year, runtime,
+    media_format) of the copy, packed after its record as a STOCK.size
+    byte header and the UTF-8 title
+    '''
+    parts = [HEADER.pack(DELTA_VERSION, machine_id, first_seq, len(operations))]
+    for kind, video_id, customer_id, day, amount, *details in operations:
+        parts.append(RECORD.pack(OPERATIONS.index(kind), video_id, customer_id, day, amount))
+        if kind == 'stock':
+            title, year, runtime, media_format = details[0]
+            encoded = title.encode('utf-8')
+            parts.append(STOCK.pack(year, runtime, MEDIA_FORMATS.index(media_format),
+                                    len(encoded)))
+            parts.append(encoded)
+    return b''.join(parts)
+
+
+def decode_delta(delta: bytes) -> tuple[int, int, list[tuple]]:
+    '''Unpacks a delta into the machine id, the first sequence number and the operations'''
+    try:
+        version, machine_id, first_seq, count = HEADER.unpack_from(delta)
+    except struct.error:
+        raise ValueError('Delta is truncated') from None
+    if version != DELTA_VERSION:
+        raise ValueError(f'Unsupported delta version {version}')
+    operations = []
+    offset = HEADER.size
+    try:
+        for _ in range(count):
+            kind, video_id, customer_id, day, amount = RECORD.unpack_from(delta, offset)
+            offset += RECORD.size
+            if OPERATIONS[kind] != 'stock':
+                operations.append((OPERATIONS[kind], video_id, customer_id, day, amount))
+                continue
+            year, runtime, media_format, length = STOCK.unpack_from(delta, offset)
+            offset += STOCK.size
+            title = str(delta[offset:offset + length], 'utf-8')
+            offset += length
+            operations.append(('stock', video_id, customer_id, day, amount,
+                               (title, year, runtime, MEDIA_FORMATS[media_format])))
+    except struct.error:
+        raise ValueError('Delta is truncated') from None
+    if offset != len(delta):
+        raise ValueError('Delta is truncated')
+    return machine_id, first_seq, operations
+
+
+class KioskLog(StoreObserver):
+    '''
+    Object to keep a vending machine's operations until its parent has them.
+    Attached to the machine as an observer. Operations are numbered from 1,
+    and dropped once the parent acknowledges them. Holds are not logged, as
+    they stay local to the machine until the copy is rented
+    '''
+    def __init__(self, machine: VendingMachine):
+        self.machine = machine
+        self.seq = 0
+        self.acknowledged = 0
+        self._operations = []
+        self._lock = threading.Lock()
+        machine.add_observer(self)
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def _log(self, kind: str, video_id: int, customer_id: int, day: int, amount: int,
+             *details) -> None:
+        with self._lock:
+            self.seq += 1
+            self._operations.append((kind, video_id, customer_id, day, amount, *details))
+
+    def delta(self) -> bytes:
+        '''Returns the operations the parent has not acknowledged, as bytes'''
+        with self._lock:
+            return encode_delta(self.machine.store_id, self.seq - len(self._operations) + 1,
+                                self._operations)
+
+    def acknowledge(self, seq: int) -> None:
+        '''Drops the operations up to and including seq, which the parent has applied'''
+        with self._lock:
+            if seq <= self.acknowledged:
+                return
+            del self._operations[:seq - self.acknowledged]
+            self.acknowledged = seq
+
+    def on_stock(self, store: VideoStore, video: Video) -> None:
+        self._log('stock', video.video_id, 0, Time.today_ordinal(), 0,
+                  (video.title, video.year, video.runtime, video.media_format))
+
+    def on_rent(self, store: VideoStore, rental: object) -> None:
+        self._log('rent', rental.video.video_id, rental.customer.customer_id,
+                  rental.rented_on, 0)
+
+    def on_return(self, store: VideoStore, rental: object, returned_on: int, fine: int) -> None:
+        self._log('return', rental.video.video_id, rental.customer.customer_id,
+                  returned_on, fine)
+
+    def on_fine(self, store: VideoStore, rental: object, fine: int, day: int) -> None:
+        self._log('fine', rental.video.video_id, rental.customer.customer_id, day, fine)
+
+
+class ParentSync:
+    '''
+    Object to merge vending machine deltas into their parent store.
+    The parent lists a copy of every video stocked in its machines, held
+    off its shelf so the parent never lends a copy that is in a machine.
+    vector maps each machine's store_id to the last operation applied from it.
+    An operation that cannot be applied, such as a rental by a customer the
+    parent does not know, is skipped and kept in quarantined for someone to
+    sort out by hand, so the rest of the machine's operations still merge.
+    vector, the kiosk copies and quarantined are saved to path, if given,
+    after every merge so a restarted parent carries on where it left off.
+    Merged operations are passed on to the parent's observers, as if they
+    had been made at the parent.
+    If the parent lent a kiosk copy anyway, e.g. before its holds were put
+    back after a restart, the machine wins, as it holds the copy, and the
+    parent's rental is moved to another free copy of the title. Each move is
+    recorded in conflicts. With no free copy the parent's rental is kept and
+    the machine's rental is quarantined
+    '''
+    def __init__(self, parent: VideoStore, customers: dict[int, Customer],
+                 path: str | None = None):
+        self.parent = parent
+        self.customers = customers
+        self.path = path
+        self.vector = {}
+        self.conflicts = []
+        self.quarantined = []
+        self._kiosk_copies = set()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, encoding='utf-8') as saved:
+                state = json.load(saved)
+            self.vector = {int(machine_id): seq for machine_id, seq in state['vector'].items()}
+            self.quarantined = state['quarantined']
+            for video_id in state['copies']:
+                video = parent.find_video_by_id(video_id)
+                if video is not None:
+                    self._list_copy(video)
+
+    def _save(self) -> None:
+        '''Writes the sync state to path, replacing the last one in one step'''
+        if self.path is None:
+            return
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as saved:
+            json.dump({'vector': self.vector, 'copies': sorted(self._kiosk_copies),
+                       'quarantined': self.quarantined}, saved)
+        os.replace(temporary, self.path)
+
+    def _list_copy(self, video: Video) -> None:
+        '''Lists a machine's copy at the parent store and holds it off the shelf'''
+        copy = self.parent.find_video_by_id(video.video_id)
+        if copy is None:
+            copy = type(video)(video.title, video.year, video.runtime, video.video_id)
+            self.parent.add_video(copy)
+        self._kiosk_copies.add(video.video_id)
+        self.parent.hold_copy(copy)
+
+    def register(self, machine: VendingMachine) -> None:
+        '''Lists the copies stocked in a machine at the parent store'''
+        with self._lock:
+            for video in machine.videos:
+                self._list_copy(video)
+            self.vector.setdefault(machine.store_id, 0)
+            self._save()
+
+    def merge(self, delta: bytes) -> int:
+        '''
+        Applies the operations in a delta the parent has not seen yet.
+        Returns the sequence number to acknowledge to the machine
+        '''
+        machine_id, first_seq, operations = decode_delta(delta)
+        with self._lock:
+            applied = self.vector.get(machine_id, 0)
+            try:
+                for seq, operation in enumerate(operations, first_seq):
+                    if seq <= applied:
+                        continue
+                    if seq != applied + 1:
+                        raise ValueError(f'Delta starts at {seq}, expected {applied + 1}')
+                    try:
+                        self._apply(machine_id, *operation)
+                    except ValueError as error:
+                        self.quarantined.append({'machine': machine_id, 'seq': seq,
+                                                 'operation': operation, 'error': str(error)})
+                    applied = self.vector[machine_id] = seq
+            finally:
+                self._save()
+        return applied
+
+    def _open_rental(self, video_id: int, customer_id: int) -> object:
+        '''
+        Returns the parent's rental of a kiosk copy, or None if it is not on loan.
+        Raises an exception if it is on loan to someone else at the parent
+        '''
+        rental = self.parent.open_rental(video_id)
+        if rental is not None and rental.customer.customer_id != customer_id:
+            raise ValueError('Copy is on loan to another customer at the parent')
+        return rental
+
+    def _apply(self, machine_id: int, kind: str, video_id: int, customer_id: int,
+               day: int, amount: int, details: tuple | None = None) -> None:
+        if kind == 'stock':
+            title, year, runtime, media_format = details
+            self._list_copy(_CLASSES[media_format](title, year, runtime, video_id))
+        elif kind == 'rent':
+            customer = self.customers.get(customer_id)
+            if customer is None:
+                raise ValueError(f'Unknown customer {customer_id}')
+            clash = self.parent.open_rental(video_id)
+            if clash is not None:
+                self._move(machine_id, clash, day)
+            else:
+                self.parent.release(self.parent.find_video_by_id(video_id))
+            self.parent.notify('on_rent', self.parent.restore_rental(video_id, customer, day))
+        elif kind == 'return':
+            rental = self._open_rental(video_id, customer_id)
+            if rental is not None:
+                self.parent.restore_return(video_id, amount)
+                self.parent.notify('on_return', rental, day, amount)
+                self.parent.hold_copy(rental.video)
+        else:
+            rental = self._open_rental(video_id, customer_id)
+            if rental is not None:
+                with customer_lock(rental.customer):
+                    rental.fine += amount
+                    rental.customer._outstanding_fine += amount
+                self.parent.notify('on_fine', rental, amount, day)
+
+    def _move(self, machine_id: int, clash: object, day: int) -> None:
+        '''
+        Re-lends the parent's clashing rental from another free copy of the title.
+        Raises an exception, keeping the rental, if no other copy is free
+        '''
+        video = clash.video
+        for candidate in self.parent.videos:
+            if (candidate.title != video.title or candidate.media_format != video.media_format
+                    or candidate.video_id in self._kiosk_copies):
+                continue
+            try:
+                moved = self.parent.restore_rental(candidate.video_id, clash.customer,
+                                                   clash.rented_on, clash.fine)
+            except ValueError:
+                continue
+            self.parent.restore_return(video.video_id)
+            self.parent.notify('on_return', clash, day, 0)
+            self.parent.notify('on_rent', moved)
+            self.conflicts.append({'machine': machine_id, 'video': video.video_id,
+                                   'title': video.title,
+                                   'customer': clash.customer.customer_id,
+                                   'moved_to': candidate.video_id})
+            return
+        raise ValueError(f'Copy is on loan at the parent and no other copy of '
+                         f'{video.title} is free to move the rental to')
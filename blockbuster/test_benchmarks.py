@@ -0,0 +1,62 @@
+# pylint: skip-file
+
+from benchmarks import HOT_PATHS, compare, load_baseline, run_suite, save_baseline
+from benchmarks import shard_scaling, stress_rentals, synthetic_catalogue
+from blockbuster_oop import Inventory
+
+
+def test_stress_rentals_no_double_rentals_or_lost_fines():
+    results = stress_rentals(tills=8, titles=3, copies=1, customers=50, rounds=300)
+    assert results['rented'] > 0
+    assert results['double_rentals'] == 0
+    assert results['lost_fines'] == 0
+    assert results['copies_missing'] == 0
+
+
+def test_stress_rentals_catches_double_rentals(monkeypatch):
+    def take(self, title, media_format=None):
+        return self._free[(title, 'VHS')][0]
+
+    monkeypatch.setattr(Inventory, 'take', take)
+    monkeypatch.setattr(Inventory, 'put', lambda self, video: None)
+    results = stress_rentals(tills=4, titles=1, copies=1, customers=50, rounds=300)
+    assert results['double_rentals'] > 0
+
+
+def test_shard_scaling_reports_each_worker_count():
+    results = shard_scaling([1, 2], stores=4, titles=5, customers=20, requests=200, batch=50)
+    assert [result['workers'] for result in results] == [1, 2]
+    assert results[0]['speed_up'] == 1.0
+    assert all(result['operations'] >= 200 for result in results)
+
+
+def test_synthetic_catalogue_is_repeatable():
+    first = [(video.title, video.media_format) for video in synthetic_catalogue(20, 2, seed=3)]
+    second = [(video.title, video.media_format) for video in synthetic_catalogue(20, 2, seed=3)]
+    assert first == second
+    assert len(set(title for title, _ in first)) == 20
+
+
+def test_run_suite_times_every_hot_path(tmp_path):
+    results = run_suite(scale=200)
+    assert set(results['benchmarks']) == set(HOT_PATHS)
+    for result in results['benchmarks'].values():
+        assert result['operations'] > 0
+        assert result['p50_us'] <= result['p99_us']
+        assert result['peak_bytes'] > 0
+
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(results, path)
+    assert load_baseline(path) == results
+    assert compare(results, results) == []
+
+
+def test_compare_flags_regressions():
+    baseline = {'benchmarks': {'rent_video': {'operations_per_second': 1000.0, 'p50_us': 2.0,
+                                              'peak_bytes': 1000}}}
+    current = {'benchmarks': {'rent_video': {'operations_per_second': 800.0, 'p50_us': 2.1,
+                                             'peak_bytes': 1000}}}
+    regressions = compare(baseline, current, threshold=0.1)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('rent_video operations_per_second')
+    assert compare(baseline, current, threshold=0.3) == []
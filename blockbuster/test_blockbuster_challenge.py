@@ -45,3 +45,31 @@ def test_video_extra_long_previous_year():
 def test_video_has_title():
     with pytest.raises(Exception):
         Video(None, 2010, 90)
+
+
+
+def test_video_title_leading_spaces_allowed():
+    assert Video('   Heat', 1995, 170).title == '   Heat'
+
+
+def test_video_from_records():
+    outcome = Video.from_records([
+        {'title': 'The Matrix', 'year': 1999, 'runtime': 150},
+        ('The Terminator', '1985', '108'),
+        {'title': '!', 'year': 1999, 'runtime': 150},
+        {'title': 'Heat', 'year': 1995},
+        ('Heat', 1899, 170),
+    ])
+    assert outcome.results[0].display_title() == 'The Matrix (1999)'
+    assert outcome.results[1].runtime == 108
+    assert outcome.results[1].display_price() == '£5.00'
+    assert isinstance(outcome.errors[2], ValueError)
+    assert isinstance(outcome.errors[3], KeyError)
+    assert isinstance(outcome.errors[4], ValueError)
+    assert outcome.succeeded == 2
+
+
+def test_dvd_from_records():
+    outcome = DVD.from_records([('The Matrix', 1999, 150)])
+    assert isinstance(outcome.results[0], DVD)
+    assert outcome.results[0].price == 1200
@@ -1,6 +1,8 @@
 # pylint: skip-file
 
 from blockbuster_oop import Video, Customer, VideoStore, Rental, Time, VendingMachine, DVD
+from blockbuster_oop import FrozenClock, SystemClock
+from blockbuster_oop import parse_date, format_date
 import datetime
 import pytest
 
@@ -12,6 +14,14 @@ LATE_RETURN_DATE = Time.time_day_delta(15)
 EARLIER_THAN_RETURN_DATE = Time.time_day_delta(-1)
 
 
+@pytest.fixture
+def frozen_clock():
+    clock = FrozenClock(Time.today())
+    previous = Time.use_clock(clock)
+    yield clock
+    Time.use_clock(previous)
+
+
 def test_video_year_release_after_1900_and_before_now():
     with pytest.raises(ValueError):
         Video('The Dreyfus Affair', 1899, 13)
@@ -102,16 +112,47 @@ def test_videostore_empty():
         VideoStore([])
         
 
-def test_videostore_full():
-    with pytest.raises(ValueError):
-        VideoStore([Video('The Dreyfus Affair', 1950, 13) for i in range(11)])
+def test_videostore_no_capacity_limit():
+    store = VideoStore([Video(f'The Dreyfus Affair {i}', 1950, 13) for i in range(1000)])
+    assert store.is_available('The Dreyfus Affair 999') == True
+
+
+def test_videostore_find_video_by_id():
+    matrix = Video('The Matrix', 1999, 150)
+    terminator = Video('The Terminator', 1985, 108)
+    store = VideoStore([matrix, terminator])
+    assert store.find_video_by_id(terminator.video_id) is terminator
+    assert store.find_video_by_id(-1) is None
+
+
+def test_video_ids_are_unique():
+    matrix = Video('The Matrix', 1999, 150)
+    copy = Video('The Matrix', 1999, 150)
+    assert matrix.video_id != copy.video_id
 
 
 def test_videostore_title_search():
     matrix = Video('The Matrix', 1999, 150)
     terminator = Video('The Terminator', 1985, 108)
     store = VideoStore([matrix, terminator])
-    assert store.find_video_by_title('The Matrix') == matrix.display_title
+    assert store.find_video_by_title('The Matrix') == matrix.display_title()
+
+
+def test_videostore_title_search_ignores_case():
+    matrix = Video('The Matrix', 1999, 150)
+    store = VideoStore([matrix])
+    assert store.find_video_by_title('the matrix') == 'The Matrix (1999)'
+    assert store.find_video_by_title('Creed') is None
+
+
+def test_videostore_search():
+    store = VideoStore([Video('The Matrix', 1999, 150), Video('The Terminator', 1985, 108)])
+    assert store.search('ter') == ['The Terminator (1985)']
+    assert store.search('the') == ['The Matrix (1999)', 'The Terminator (1985)']
+    assert store.search('Matirx') == ['The Matrix (1999)']
+    store.add_video(Video('Terminator 2', 1991, 137))
+    assert store.search('ter') == ['The Terminator (1985)', 'Terminator 2 (1991)']
+    assert store.search('ter', limit=1) == ['The Terminator (1985)']
 
 
 def test_videostore_is_available_available():
@@ -121,6 +162,12 @@ def test_videostore_is_available_available():
     assert store.is_available('The Matrix') == True
 
 
+def test_videostore_is_available_unknown_title():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    with pytest.raises(ValueError):
+        store.is_available('Creed')
+
+
 def test_videostore_is_available_unavailable():
     matrix = Video('The Matrix', 1999, 150)
     terminator = Video('The Terminator', 1985, 108)
@@ -284,4 +331,272 @@ def test_VendingMachine_max_capacity():
 
 def test_VendingMachine_non_list_argument():
     with pytest.raises(TypeError):
-        VendingMachine('')
\ No newline at end of file
+        VendingMachine('')
+
+def test_videostore_multiple_copies_of_title():
+    copies = [Video('The Matrix', 1999, 150) for i in range(3)]
+    store = VideoStore(copies)
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    assert store.copies_available('The Matrix') == 3
+    store.rent_video('The Matrix', hassan)
+    store.rent_video('The Matrix', hassan)
+    assert store.copies_available('The Matrix') == 1
+    assert store.is_available('The Matrix') == True
+    store.rent_video('The Matrix', hassan)
+    assert store.is_available('The Matrix') == False
+    with pytest.raises(ValueError):
+        store.rent_video('The Matrix', Customer('John', 'Smith', '24/01/1980'))
+
+
+def test_videostore_copies_tracked_per_format():
+    vhs = Video('The Matrix', 1999, 150)
+    dvd = DVD('The Matrix', 1999, 150)
+    store = VideoStore([vhs, dvd])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = store.rent_video('The Matrix', hassan, 'DVD')
+    assert rental.video is dvd
+    assert store.copies_available('The Matrix', 'DVD') == 0
+    assert store.copies_available('The Matrix', 'VHS') == 1
+    with pytest.raises(ValueError):
+        store.rent_video('The Matrix', hassan, 'DVD')
+
+
+def test_videostore_return_video_restores_copy():
+    copies = [Video('The Matrix', 1999, 150) for i in range(2)]
+    store = VideoStore(copies)
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    first = store.rent_video('The Matrix', hassan)
+    second = store.rent_video('The Matrix', hassan)
+    store.return_video(first, ON_TIME_RETURN_DATE)
+    assert store.copies_available('The Matrix') == 1
+    store.return_video(second, ON_TIME_RETURN_DATE)
+    assert store.copies_available('The Matrix') == 2
+
+
+def test_videostore_return_video_twice():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = store.rent_video('The Matrix', hassan)
+    store.return_video(rental, ON_TIME_RETURN_DATE)
+    with pytest.raises(ValueError):
+        store.return_video(rental, ON_TIME_RETURN_DATE)
+
+
+def test_videostore_add_video():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    store.add_video(Video('The Matrix', 1999, 150))
+    store.add_video(Video('Creed', 2015, 133))
+    assert store.copies_available('The Matrix') == 2
+    assert store.is_available('Creed') == True
+
+
+def test_videostore_refuses_duplicate_video_ids():
+    matrix = Video('The Matrix', 1999, 150)
+    with pytest.raises(ValueError):
+        VideoStore([matrix, matrix, matrix])
+    store = VideoStore([matrix])
+    with pytest.raises(ValueError):
+        store.add_video(matrix)
+    with pytest.raises(ValueError):
+        store.add_video(Video('Creed', 2015, 133, matrix.video_id))
+    assert store.copies_available('The Matrix') == 1
+    assert store.videos == [matrix]
+    assert 'Creed' not in store.rent_status
+
+
+def test_VendingMachine_add_video_over_capacity():
+    machine = VendingMachine([Video('The Matrix', 1999, 150) for i in range(5)])
+    with pytest.raises(ValueError):
+        machine.add_video(Video('Creed', 2015, 133))
+
+
+def test_videostore_rent_many():
+    store = VideoStore([Video('The Matrix', 1999, 150), Video('The Matrix', 1999, 150),
+                        Video('The Terminator', 1985, 108)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    john = Customer('John', 'Smith', '24/01/1980')
+    outcome = store.rent_many([('The Matrix', hassan), ('The Matrix', john),
+                               ('The Matrix', john), ('Creed', hassan),
+                               ('The Terminator', [])])
+    assert isinstance(outcome.results[0], Rental)
+    assert outcome.results[1].customer is john
+    assert isinstance(outcome.errors[2], ValueError)
+    assert isinstance(outcome.errors[3], TypeError)
+    assert isinstance(outcome.errors[4], TypeError)
+    assert outcome.succeeded == 2
+    assert store.is_available('The Matrix') == False
+    assert store.is_available('The Terminator') == True
+
+
+def test_videostore_rent_many_blocks_fined_customer():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    hassan._outstanding_fine = 5000
+    outcome = store.rent_many([('The Matrix', hassan)])
+    assert isinstance(outcome.errors[0], RuntimeError)
+    assert store.is_available('The Matrix') == True
+
+
+def test_videostore_return_many():
+    store = VideoStore([Video('The Matrix', 1999, 150), Video('The Terminator', 1985, 108),
+                        Video('Creed', 2015, 133)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rentals = store.rent_many([('The Matrix', hassan), ('The Terminator', hassan),
+                               ('Creed', hassan)]).results
+    rentals[2].video.watch()
+    outcome = store.return_many([(rentals[0], ON_TIME_RETURN_DATE),
+                                 (rentals[1], LATE_RETURN_DATE),
+                                 (rentals[2], ON_TIME_RETURN_DATE),
+                                 (rentals[0], ON_TIME_RETURN_DATE),
+                                 ([], ON_TIME_RETURN_DATE)])
+    assert outcome.results[:2] == [0, 1000]
+    assert isinstance(outcome.errors[2], AssertionError)
+    assert isinstance(outcome.errors[3], ValueError)
+    assert isinstance(outcome.errors[4], TypeError)
+    assert hassan._outstanding_fine == 1000
+    assert store.is_available('The Matrix') == True
+    assert store.is_available('Creed') == False
+
+
+def test_videostore_return_many_earlier_than_issued():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = store.rent_video('The Matrix', hassan)
+    outcome = store.return_many([(rental, EARLIER_THAN_RETURN_DATE)])
+    assert isinstance(outcome.errors[0], ValueError)
+    assert store.is_available('The Matrix') == False
+
+
+def test_rental_dates_stored_as_ordinals():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = store.rent_video('The Matrix', hassan)
+    assert rental.rented_on == datetime.date.today().toordinal()
+    assert rental.due_on == rental.rented_on + 14
+    assert rental.rented_date == RENTAL_CHECKOUT_DATE
+    assert rental.due_date == ON_TIME_RETURN_DATE
+
+
+def test_parse_date_round_trip():
+    assert parse_date('09/03/1999') == datetime.date(1999, 3, 9).toordinal()
+    assert format_date(parse_date('09/03/1999')) == '09/03/1999'
+
+
+def test_videostore_return_video_invalid_date_string():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = store.rent_video('The Matrix', hassan)
+    with pytest.raises(ValueError):
+        store.return_video(rental, 'tomorrow')
+
+
+def test_VendingMachine_return_video_uses_due_date():
+    machine = VendingMachine([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = machine.rent_video('The Matrix', hassan)
+    machine.return_video(rental, LATE_RETURN_DATE)
+    assert hassan._outstanding_fine == 0
+    assert machine.is_available('The Matrix') == True
+
+
+def test_customer_age_refreshed_when_day_changes(frozen_clock):
+    john = Customer('John', 'Smith', '24/01/1980')
+    frozen_clock.set(datetime.date(2023, 1, 23))
+    assert john.age == '42'
+    frozen_clock.advance()
+    assert john.age == '43'
+
+
+def test_customer_is_at_least():
+    teenager = Customer('Zoom', 'Smith', Time.time_day_delta(-365 * 16))
+    adult = Customer('John', 'Smith', '24/01/1980')
+    assert not teenager.is_at_least(18)
+    assert adult.is_at_least(18)
+
+
+def test_customer_invalid_date_of_birth():
+    with pytest.raises(ValueError):
+        Customer('John', 'Smith', '31/02/1980')
+
+
+def test_system_clock_caches_today():
+    clock = SystemClock()
+    assert clock.today() == datetime.date.today()
+    assert clock.today_ordinal() == datetime.date.today().toordinal()
+
+
+def test_frozen_clock_drives_dates(frozen_clock):
+    frozen_clock.set('31/12/2023')
+    assert Time.time_now() == '31/12/2023'
+    store = VideoStore([Video('Creed', 2023, 133)])
+    assert store.videos[0].price == 1000
+    rental = store.rent_video('Creed', Customer('Hassan', 'Kashif', '09/03/1999'))
+    assert rental.rented_date == '31/12/2023'
+    with pytest.raises(ValueError):
+        Video('Creed III', 2024, 116)
+
+    frozen_clock.advance()
+    assert Time.current_year() == 2024
+    assert Video('Creed III', 2024, 116).price == 1000
+    assert Video('Creed', 2023, 133).price == 500
+    assert store.videos[0].price == 500
+    assert rental.price == 1000
+    store.return_video(rental, Time.time_day_delta(14))
+    assert rental.fine == 1000
+
+
+def test_clock_constants_follow_clock(frozen_clock):
+    import blockbuster_oop
+    frozen_clock.set('01/06/2020')
+    assert blockbuster_oop.CURRENT_YEAR == 2020
+    assert blockbuster_oop.ON_TIME_RETURN_DATE == '15/06/2020'
+    with pytest.raises(AttributeError):
+        blockbuster_oop.NEXT_YEAR
+
+
+def test_customer_rental_limit_across_stores():
+    from blockbuster_oop import ACCOUNTS
+    high_street = VideoStore([Video('The Matrix', 1999, 150), Video('Creed', 2015, 133)])
+    station = VendingMachine([Video('The Matrix', 1999, 150), Video('Creed', 2015, 133)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    first = high_street.rent_video('The Matrix', hassan)
+    high_street.rent_video('Creed', hassan)
+    station.rent_video('The Matrix', hassan)
+    assert ACCOUNTS.active(hassan) == 3
+    with pytest.raises(RuntimeError):
+        station.rent_video('Creed', hassan)
+    assert station.is_available('Creed') == True
+
+    high_street.return_video(first, ON_TIME_RETURN_DATE)
+    assert ACCOUNTS.active(hassan) == 2
+    assert len(ACCOUNTS.open_rentals(hassan)) == 2
+    station.rent_video('Creed', hassan)
+
+
+def test_rent_many_counts_towards_limit():
+    store = VideoStore([Video('The Matrix', 1999, 150) for _ in range(4)] +
+                       [Video('Creed', 2015, 133)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    outcome = store.rent_many([('Heat', hassan)] + [('The Matrix', hassan)] * 4)
+    assert isinstance(outcome.errors[0], TypeError)
+    assert outcome.succeeded == 3
+    assert isinstance(outcome.errors[4], RuntimeError)
+    assert store.copies_available('The Matrix') == 1
+
+
+def test_pay_off_fine_unblocks_customer():
+    from blockbuster_oop import ACCOUNTS
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    hassan._outstanding_fine = 5000
+    assert ACCOUNTS.is_blocked(hassan)
+    with pytest.raises(RuntimeError):
+        store.rent_video('The Matrix', hassan)
+    assert hassan.pay_off_fine(5) == 4500
+    assert hassan.outstanding_fine == 4500
+    assert not ACCOUNTS.is_blocked(hassan)
+    store.rent_video('The Matrix', hassan)
+    with pytest.raises(ValueError):
+        hassan.pay_off_fine(50)
+    with pytest.raises(TypeError):
+        hassan.pay_off_fine(-5)
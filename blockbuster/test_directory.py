@@ -0,0 +1,63 @@
+# pylint: skip-file
+
+from blockbuster_oop import Customer
+from directory import CustomerDirectory, normalize_name
+import pytest
+
+
+@pytest.fixture
+def directory():
+    return CustomerDirectory([Customer('Hassan', 'Kashif', '09/03/1999'),
+                              Customer('John', 'Smith', '24/01/1980'),
+                              Customer('Jane', 'Smith', '24/01/1980')])
+
+
+def test_normalize_name():
+    assert normalize_name('  John   SMITH ') == 'john smith'
+
+
+def test_directory_lookups(directory):
+    john = directory.find('john  smith', '24/01/1980')
+    assert john.name == 'John Smith'
+    assert directory.by_id(john.customer_id) is john
+    assert john in directory
+    assert [customer.name for customer in directory.born_on('24/01/1980')] == \
+        ['John Smith', 'Jane Smith']
+    assert directory.by_name('HASSAN KASHIF')[0].name == 'Hassan Kashif'
+    assert directory.find('John Smith', '25/01/1980') is None
+
+
+def test_directory_refuses_duplicates(directory):
+    with pytest.raises(ValueError):
+        directory.add(Customer('JOHN', 'Smith', '24/01/1980'))
+    assert len(directory) == 3
+    john = directory.register('John', 'Smith', '24/01/1980')
+    assert directory.register('John', 'Smith', '24/01/1980') is john
+    assert len(directory) == 3
+
+
+def test_directory_remove(directory):
+    john = directory.find('John Smith', '24/01/1980')
+    directory.remove(john)
+    assert directory.find('John Smith', '24/01/1980') is None
+    assert john not in directory
+    directory.add(john)
+    with pytest.raises(ValueError):
+        directory.remove(Customer('Bob', 'Jones', '01/01/1970'))
+
+
+def test_directory_streams_members_from_file(tmp_path):
+    path = tmp_path / 'members.csv'
+    with open(path, 'w') as members:
+        for number in range(20000):
+            members.write(f'Member,{chr(65 + number % 26)}{"x" * (number // 26 % 30)},'
+                          f'{number % 28 + 1:02d}/{number % 12 + 1:02d}/{1940 + number % 60}\n')
+        members.write('Member,Axx,not a date\n')
+    directory = CustomerDirectory()
+    counts = directory.load(str(path))
+    assert counts['loaded'] + counts['duplicates'] == 20000
+    assert counts['duplicates'] > 0
+    assert counts['invalid'] == 1
+    assert len(directory) == counts['loaded']
+    assert directory.find('member  A', '01/01/1940').name == 'Member A'
+    assert directory.find('member axx', '01/01/1940') is None
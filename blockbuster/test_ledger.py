@@ -0,0 +1,92 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, Time
+from ledger import AvailabilityView, BalanceView, Ledger, PopularityView
+from overdue import overdue_sweep
+import pytest
+
+
+ON_TIME_RETURN_DATE = Time.time_day_delta(14)
+LATE_RETURN_DATE = Time.time_day_delta(15)
+
+
+@pytest.fixture
+def store():
+    return VideoStore([Video('The Matrix', 1999, 150), Video('The Matrix', 1999, 150),
+                       Video('Creed', 2015, 133)])
+
+
+@pytest.fixture
+def customer():
+    return Customer('Hassan', 'Kashif', '09/03/1999')
+
+
+def test_ledger_records_stock_on_attach(store):
+    ledger = Ledger()
+    ledger.attach(store)
+    assert [event.kind for event in ledger] == ['stock'] * 3
+    assert [event.seq for event in ledger] == [1, 2, 3]
+
+
+def test_ledger_views_follow_events(store, customer):
+    availability, balances, popularity = AvailabilityView(), BalanceView(), PopularityView()
+    ledger = Ledger([availability, balances, popularity])
+    ledger.attach(store)
+    assert availability.copies(store.store_id, 'The Matrix') == 2
+
+    first = store.rent_video('The Matrix', customer)
+    store.rent_video('The Matrix', customer)
+    store.rent_video('Creed', customer)
+    assert not availability.is_available(store.store_id, 'The Matrix')
+    assert popularity.top(1) == [('The Matrix', 2)]
+
+    store.return_video(first, LATE_RETURN_DATE)
+    assert availability.copies(store.store_id, 'The Matrix') == 1
+    assert balances.balance(customer.customer_id) == 1000
+    assert [event.kind for event in ledger.events(6)] == ['return', 'fine']
+
+    assert ledger.record_payment(customer, 400) == 600
+    assert balances.owing() == {customer.customer_id: 600}
+    customer.pay_off_fine(1)
+    assert balances.balance(customer.customer_id) == customer.outstanding_fine == 500
+    with pytest.raises(ValueError):
+        ledger.record_payment(customer, 1000)
+    assert balances.balance(customer.customer_id) == 500
+
+
+def test_ledger_rebuilds_views_by_replay(store, customer):
+    ledger = Ledger()
+    ledger.attach(store)
+    store.return_video(store.rent_video('Creed', customer), LATE_RETURN_DATE)
+
+    availability, balances = AvailabilityView(), BalanceView()
+    ledger.add_view(availability)
+    ledger.add_view(balances)
+    assert availability.copies(store.store_id, 'Creed') == 1
+    assert balances.balance(customer.customer_id) == 1000
+
+    balances.reset()
+    assert balances.balance(customer.customer_id) == 0
+    ledger.rebuild(balances)
+    assert balances.balance(customer.customer_id) == 1000
+
+
+def test_ledger_records_overdue_sweep_fines(store, customer):
+    balances = BalanceView()
+    ledger = Ledger([balances])
+    ledger.attach(store)
+    rental = store.rent_video('Creed', customer)
+    overdue_sweep([store], today=rental.due_on + 1)
+    assert balances.balance(customer.customer_id) == 1000
+    assert ledger.events(len(ledger) - 1)[0].day == rental.due_on + 1
+    store.return_video(rental, LATE_RETURN_DATE)
+    assert balances.balance(customer.customer_id) == 1000
+
+
+def test_ledger_rejects_bad_events(customer):
+    ledger = Ledger()
+    with pytest.raises(ValueError):
+        ledger.append('refund', customer_id=customer.customer_id, amount=100)
+    with pytest.raises(ValueError):
+        ledger.record_payment(customer, -100)
+    assert len(ledger) == 0
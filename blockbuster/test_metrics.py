@@ -0,0 +1,67 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, Time
+from metrics import Metrics, SamplingProfiler, instrument, uninstrument
+import json
+import pytest
+
+
+@pytest.fixture
+def metrics():
+    metrics = instrument(Metrics())
+    yield metrics
+    uninstrument()
+
+
+def test_counts_calls_and_errors_per_store(metrics):
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = store.rent_video('The Matrix', hassan)
+    with pytest.raises(TypeError):
+        store.rent_video('Creed', hassan)
+    store.return_video(rental, Time.time_day_delta(1))
+    hassan.age
+
+    rents = metrics.stats('rent_video', store.store_id)
+    assert (rents.calls, rents.errors) == (2, 1)
+    assert sum(rents.buckets) == 2
+    assert metrics.stats('return_video', store.store_id).calls == 1
+    assert metrics.stats('video_init').calls == 1
+    assert metrics.stats('customer_age').calls == 1
+    assert metrics.totals('rent_video')['calls'] == 2
+
+
+def test_uninstrument_restores_entry_points():
+    init, rent, age = Video.__init__, VideoStore.rent_video, Customer.__dict__['age']
+    metrics = instrument(Metrics())
+    assert Video.__init__ is not init
+    uninstrument()
+    assert (Video.__init__, VideoStore.rent_video, Customer.__dict__['age']) == (init, rent, age)
+    Video('Creed', 2015, 133)
+    assert metrics.stats('video_init') is None
+
+
+def test_exports(metrics):
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    store.check_date_one_bigger_than_two('02/01/2020', '01/01/2020')
+
+    text = metrics.to_prometheus()
+    labels = f'operation="check_date",store="{store.store_id}"'
+    assert f'blockbuster_calls_total{{{labels}}} 1' in text
+    assert f'blockbuster_latency_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert 'blockbuster_calls_total{operation="video_init"} 1' in text
+
+    entries = json.loads(metrics.to_json())
+    assert {entry['operation'] for entry in entries} == {'check_date', 'video_init'}
+
+
+def test_sampling_profiler_attributes_time():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    customer = Customer('Hassan', 'Kashif', '09/03/1999')
+    with SamplingProfiler(interval=0.0005) as profiler:
+        for _ in range(20000):
+            store.return_video(store.rent_video('The Matrix', customer), Time.time_day_delta(1))
+    report = profiler.report()
+    assert report
+    assert set(report) <= {'video_init', 'rent_video', 'return_video', 'check_date',
+                           'customer_age'}
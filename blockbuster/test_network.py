@@ -0,0 +1,62 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, VendingMachine, Time
+from network import StoreNetwork
+import pytest
+
+
+ON_TIME_RETURN_DATE = Time.time_day_delta(14)
+
+
+@pytest.fixture
+def branches():
+    high_street = VideoStore([Video('The Matrix', 1999, 150), Video('Creed', 2015, 133)])
+    station = VendingMachine([Video('The Matrix', 1999, 150)])
+    retail_park = VideoStore([Video('The Terminator', 1985, 108)])
+    return high_street, station, retail_park
+
+
+def test_network_stores_with(branches):
+    high_street, station, retail_park = branches
+    network = StoreNetwork(branches)
+    assert set(network.stores_with('The Matrix')) == {high_street, station}
+    assert network.stores_with('Heat') == []
+    assert len(network) == 3
+
+
+def test_network_follows_rent_and_return(branches):
+    high_street, station, retail_park = branches
+    network = StoreNetwork(branches)
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = station.rent_video('The Matrix', hassan)
+    assert network.stores_with('The Matrix') == [high_street]
+    high_street.rent_video('The Matrix', hassan)
+    assert not network.is_available_anywhere('The Matrix')
+    station.return_video(rental, ON_TIME_RETURN_DATE)
+    assert network.stores_with('The Matrix') == [station]
+
+
+def test_network_follows_stock(branches):
+    high_street, station, retail_park = branches
+    network = StoreNetwork(branches)
+    retail_park.add_video(Video('Creed', 2015, 133))
+    assert set(network.stores_with('Creed')) == {high_street, retail_park}
+
+
+def test_network_nearest(branches):
+    high_street, station, retail_park = branches
+    network = StoreNetwork()
+    network.add_store(high_street, (0, 0))
+    network.add_store(station, (5, 5))
+    network.add_store(retail_park)
+    assert network.nearest('The Matrix', (4, 4)) == [station, high_street]
+    assert network.nearest('The Matrix', (4, 4), limit=1) == [station]
+
+
+def test_network_remove_store(branches):
+    high_street, station, retail_park = branches
+    network = StoreNetwork(branches)
+    network.remove_store(station)
+    assert network.stores_with('The Matrix') == [high_street]
+    station.rent_video('The Matrix', Customer('Hassan', 'Kashif', '09/03/1999'))
+    assert network.stores_with('The Matrix') == [high_street]
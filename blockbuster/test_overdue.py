@@ -0,0 +1,61 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, Time, MAX_FINE
+from overdue import overdue_sweep
+import pytest
+
+
+LATE_RETURN_DATE = Time.time_day_delta(15)
+
+
+@pytest.fixture
+def stores():
+    first = VideoStore([Video('The Matrix', 1999, 150), Video('The Terminator', 1985, 108)])
+    second = VideoStore([Video('Creed', 2015, 133)])
+    return first, second
+
+
+def test_overdue_sweep_nothing_overdue(stores):
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    stores[0].rent_video('The Matrix', hassan)
+    report = overdue_sweep(stores)
+    assert report.total_fines == 0
+    assert list(report.days_overdue) == [0]
+    assert hassan.outstanding_fine == 0
+
+
+def test_overdue_sweep_fines_across_stores(stores):
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    john = Customer('John', 'Smith', '24/01/1980')
+    stores[0].rent_video('The Matrix', hassan)
+    stores[1].rent_video('Creed', hassan)
+    stores[0].rent_video('The Terminator', john)
+    report = overdue_sweep(stores, today=Time.today_ordinal() + 16)
+    assert list(report.days_overdue) == [2, 2, 2]
+    assert report.totals == {hassan.customer_id: 2000, john.customer_id: 1000}
+    assert hassan.outstanding_fine == 2000
+    assert john.outstanding_fine == 1000
+
+
+def test_overdue_sweep_is_not_repeated_on_return(stores):
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = stores[0].rent_video('The Matrix', hassan)
+    overdue_sweep(stores, today=Time.today_ordinal() + 16)
+    second = overdue_sweep(stores, today=Time.today_ordinal() + 17)
+    assert second.total_fines == 0
+    stores[0].return_video(rental, LATE_RETURN_DATE)
+    assert hassan.outstanding_fine == 1000
+
+
+def test_overdue_sweep_without_apply_warns(stores):
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    john = Customer('John', 'Smith', '24/01/1980')
+    hassan._outstanding_fine = MAX_FINE - 1000
+    john._outstanding_fine = MAX_FINE - 2500
+    stores[0].rent_video('The Matrix', hassan)
+    stores[1].rent_video('Creed', john)
+    report = overdue_sweep(stores, today=Time.today_ordinal() + 15, apply=False)
+    assert report.blocked == [hassan]
+    assert report.warnings == [john]
+    assert hassan.outstanding_fine == MAX_FINE - 1000
+    assert report.rentals[0].fine == 0
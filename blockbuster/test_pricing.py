@@ -0,0 +1,95 @@
+# pylint: skip-file
+
+from blockbuster_oop import DVD, Video, VideoStore, Customer, Time
+from rental_log import RentalLog, RentalRecorder
+from pricing import (PricingEngine, PricingRule, Promotion, StoreOverride, NewReleasePrice)
+import datetime
+import pickle
+import pytest
+
+
+TODAY = Time.today_ordinal()
+
+
+@pytest.fixture
+def videos():
+    return [Video('The Matrix', 1999, 150), Video('The Matrix', 1999, 150),
+            DVD('The Matrix', 1999, 150), Video('Lord of the Rings', 2001, 250),
+            Video('Creed', Time.current_year(), 133)]
+
+
+def test_default_rules_match_rental_price(videos):
+    engine = PricingEngine()
+    assert list(engine.reprice(videos)) == [video.rental_price() for video in videos]
+
+
+def test_new_release_follows_pricing_day():
+    creed = Video('Creed', 2015, 133)
+    engine = PricingEngine()
+    assert engine.price(creed, day=datetime.date(2015, 6, 1).toordinal()) == 1000
+    assert engine.price(creed, day=datetime.date(2016, 1, 1).toordinal()) == 500
+
+
+def test_promotion_and_store_override(videos):
+    store = VideoStore(videos[:1])
+    engine = PricingEngine()
+    engine.add_rule(Promotion(50, TODAY, TODAY + 6, titles=['The Matrix']))
+    assert engine.price(videos[0]) == 250
+    assert engine.price(videos[2]) == 600
+    assert engine.price(videos[0], day=TODAY + 7) == 500
+    assert engine.price(videos[3]) == 1000
+
+    engine.add_rule(StoreOverride(store.store_id, 99))
+    assert engine.price(videos[0], store) == 99
+    assert engine.price(videos[0]) == 250
+
+
+def test_changing_rules_drops_memoized_prices(videos):
+    class Counting(PricingRule):
+        calls = 0
+
+        def apply(self, video, store_id, day, price):
+            Counting.calls += 1
+            return price
+
+    counting = Counting()
+    new_release = NewReleasePrice()
+    engine = PricingEngine([new_release, counting])
+    engine.reprice(videos)
+    engine.reprice(videos)
+    assert Counting.calls == 4
+
+    engine.remove_rule(counting)
+    assert engine.rules == (new_release,)
+    engine.add_rule(counting)
+    engine.reprice(videos)
+    assert Counting.calls == 8
+
+
+def test_reprice_applies_prices(videos):
+    engine = PricingEngine()
+    engine.add_rule(Promotion(10, TODAY, TODAY))
+    prices = engine.reprice(videos, apply=True)
+    assert [video.price for video in videos] == list(prices)
+    assert videos[0].price == 450
+
+
+def test_promotion_must_take_something_off():
+    with pytest.raises(ValueError):
+        Promotion(0, TODAY, TODAY)
+
+
+def test_stores_charge_from_their_engine_at_rent_time(videos):
+    engine = PricingEngine()
+    branch = VideoStore(videos, pricing=engine)
+    engine.add_rule(StoreOverride(branch.store_id, 300))
+    other = VideoStore([Video('The Matrix', 1999, 150)])
+    log = RentalLog()
+    branch.add_observer(RentalRecorder(log))
+
+    rental = branch.rent_video('The Matrix', Customer('Hassan', 'Kashif', '09/03/1999'))
+    assert rental.price == 300
+    assert rental.video.price == 500
+    assert other.rent_video('The Matrix', Customer('John', 'Smith', '24/01/1980')).price == 500
+    assert list(log.prices) == [300]
+    assert pickle.loads(pickle.dumps(branch)).price_of(videos[0]) == 300
@@ -0,0 +1,58 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, Rental, DVD, Time
+from rental_log import RentalLog
+import pytest
+
+
+@pytest.fixture
+def rentals():
+    matrix = Video('The Matrix', 1999, 150)
+    terminator = Video('The Terminator', 1985, 108)
+    store = VideoStore([matrix, terminator])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    return [store.rent_video('The Matrix', hassan), store.rent_video('The Terminator', hassan)]
+
+
+def test_slots_classes_have_no_instance_dict():
+    video = Video('The Matrix', 1999, 150)
+    dvd = DVD('The Matrix', 1999, 150)
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    rental = Rental(video, hassan)
+    for obj in (video, dvd, hassan, rental):
+        assert not hasattr(obj, '__dict__')
+
+
+def test_rental_log_view_matches_rental(rentals):
+    first = rentals[0]
+    log = RentalLog({first.video.video_id: first.video},
+                    {first.customer.customer_id: first.customer})
+    index = log.append(first)
+    view = log[index]
+    assert view.video is first.video
+    assert view.customer is first.customer
+    assert view.video_title == 'The Matrix'
+    assert view.rented_date == first.rented_date
+    assert view.due_date == first.due_date
+    assert view.returned_on == 0
+
+
+def test_rental_log_extend_and_return(rentals):
+    log = RentalLog()
+    log.extend(rentals)
+    assert len(log) == 2
+    log.record_return(1, Time.today_ordinal() + 15, 1000)
+    assert log.open_rows() == [0]
+    assert log[-1].fine == 1000
+    assert [view.video_id for view in log] == [rental.video.video_id for rental in rentals]
+
+
+def test_rental_log_index_out_of_range():
+    with pytest.raises(IndexError):
+        RentalLog()[0]
+
+
+def test_rental_log_is_compact(rentals):
+    log = RentalLog()
+    log.extend(rentals * 500)
+    assert log.nbytes() <= 48 * 1000
@@ -0,0 +1,91 @@
+# pylint: skip-file
+
+from blockbuster_oop import DVD, Video, Customer, VideoStore, VendingMachine, Time, FrozenClock
+from rental_log import RentalLog, RentalRecorder
+from reports import RentalReports, month_range, year_range
+import pytest
+
+
+LATE_RETURN_DATE = Time.time_day_delta(15)
+TODAY = Time.today_ordinal()
+
+
+@pytest.fixture
+def history():
+    store = VideoStore([Video('The Matrix', 1999, 150), DVD('The Matrix', 1999, 150),
+                        Video('Creed', 2015, 133)])
+    machine = VendingMachine([Video('The Matrix', 1999, 150)])
+    log = RentalLog()
+    recorder = RentalRecorder(log)
+    store.add_observer(recorder)
+    machine.add_observer(recorder)
+
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    late = store.rent_video('The Matrix', hassan, 'VHS')
+    store.rent_video('The Matrix', hassan, 'DVD')
+    store.rent_video('Creed', hassan)
+    machine.rent_video('The Matrix', Customer('John', 'Smith', '24/01/1980'))
+    store.return_video(late, LATE_RETURN_DATE)
+    return store, machine, log
+
+
+def test_month_and_year_ranges():
+    first, last = month_range(2024, 2)
+    assert last - first == 28
+    assert month_range(2024, 12)[1] == year_range(2024)[1]
+
+
+def test_reports_revenue_by_dimension(history):
+    store, machine, log = history
+    reports = RentalReports(log)
+    assert reports.aggregate('revenue', 'store', TODAY, TODAY) == \
+        {store.store_id: 500 + 1200 + 500, machine.store_id: 500}
+    assert reports.aggregate('revenue', 'store_kind', TODAY, TODAY) == \
+        {'VideoStore': 2200, 'VendingMachine': 500}
+    assert reports.aggregate('rentals', 'format', TODAY, TODAY) == {'VHS': 3, 'DVD': 1}
+    assert reports.aggregate('rentals', 'release', TODAY, TODAY, new_release_year=2015) == \
+        {'new_release': 1, 'back_catalogue': 3}
+
+
+def test_reports_fines_on_return_day(history):
+    store, machine, log = history
+    reports = RentalReports(log)
+    assert reports.aggregate('fines', 'format', TODAY, TODAY) == {}
+    assert reports.aggregate('fines', 'release', TODAY + 15, TODAY + 15) == \
+        {'back_catalogue': 1000}
+
+
+def test_reports_refresh_picks_up_new_rows(history):
+    store, machine, log = history
+    reports = RentalReports(log)
+    assert reports.top_titles(TODAY, TODAY, 1) == [('The Matrix', 3)]
+    machine.return_video(machine.open_rentals[0], LATE_RETURN_DATE)
+    machine.rent_video('The Matrix', Customer('Bob', 'Smith', '01/01/1980'))
+    assert reports.top_titles(TODAY, TODAY) == [('The Matrix', 4), ('Creed', 1)]
+    year, month = Time.today().year, Time.today().month
+    assert reports.monthly('rentals', 'store_kind', year, month)['VendingMachine'] == 2
+    assert sum(reports.yearly('rentals', 'year', year).values()) == 5
+
+
+def test_reports_reject_unknown_queries(history):
+    reports = RentalReports(history[2])
+    with pytest.raises(ValueError):
+        reports.aggregate('profit', 'store', TODAY, TODAY)
+    with pytest.raises(ValueError):
+        reports.aggregate('rentals', 'customer', TODAY, TODAY)
+
+
+def test_reports_new_releases_by_year_rented():
+    previous = Time.use_clock(FrozenClock('01/06/2023'))
+    try:
+        store = VideoStore([Video('Creed III', 2023, 116), Video('The Matrix', 1999, 150)])
+        log = RentalLog()
+        store.add_observer(RentalRecorder(log))
+        store.rent_video('Creed III', Customer('Hassan', 'Kashif', '09/03/1999'))
+        store.rent_video('The Matrix', Customer('John', 'Smith', '24/01/1980'))
+        Time.clock().set('01/06/2024')
+        reports = RentalReports(log)
+        assert reports.yearly('rentals', 'release', 2023) == \
+            {'new_release': 1, 'back_catalogue': 1}
+    finally:
+        Time.use_clock(previous)
@@ -0,0 +1,125 @@
+# pylint: skip-file
+
+from blockbuster_oop import DVD, Video, Customer, VideoStore, Time, FrozenClock
+from ledger import AvailabilityView, Ledger
+from network import StoreNetwork
+from reservations import ReservationDesk, TimerWheel
+import pytest
+
+
+@pytest.fixture
+def clock():
+    clock = FrozenClock(Time.today())
+    previous = Time.use_clock(clock)
+    yield clock
+    Time.use_clock(previous)
+
+
+@pytest.fixture
+def store():
+    return VideoStore([Video('The Matrix', 1999, 150), DVD('The Matrix', 1999, 150)])
+
+
+@pytest.fixture
+def customers():
+    return [Customer('Hassan', 'Kashif', '09/03/1999'), Customer('John', 'Smith', '24/01/1980'),
+            Customer('Jane', 'Smith', '24/01/1985')]
+
+
+def test_reservation_held_when_copy_free(store, customers):
+    desk = ReservationDesk(store)
+    reservation = desk.reserve('The Matrix', customers[0], media_format='DVD')
+    assert reservation.status == 'held'
+    assert reservation.video.media_format == 'DVD'
+    assert store.copies_available('The Matrix') == 1
+    rental = desk.collect(reservation)
+    assert rental.customer is customers[0]
+    assert reservation.status == 'collected'
+
+
+def test_returned_copy_goes_to_highest_priority(store, customers, clock):
+    desk = ReservationDesk(store)
+    first = store.rent_video('The Matrix', customers[0])
+    store.rent_video('The Matrix', customers[0])
+    regular = desk.reserve('The Matrix', customers[1])
+    gold = desk.reserve('The Matrix', customers[2], priority=2)
+    assert desk.waiting('The Matrix') == 2
+
+    store.return_video(first, Time.time_now())
+    assert gold.status == 'held'
+    assert regular.status == 'waiting'
+    assert store.is_available('The Matrix') == False
+    with pytest.raises(ValueError):
+        desk.collect(regular)
+
+
+def test_customers_with_fines_wait_behind(store, customers, clock):
+    desk = ReservationDesk(store)
+    rentals = [store.rent_video('The Matrix', customers[0]) for _ in range(2)]
+    customers[1]._outstanding_fine = 100
+    owing = desk.reserve('The Matrix', customers[1], priority=5)
+    clear = desk.reserve('The Matrix', customers[2])
+    store.return_video(rentals[0], Time.time_now())
+    assert clear.status == 'held'
+    assert owing.status == 'waiting'
+
+
+def test_holds_expire_to_next_customer(store, customers, clock):
+    desk = ReservationDesk(store, hold_days=2)
+    rentals = [store.rent_video('The Matrix', customers[0]) for _ in range(2)]
+    first = desk.reserve('The Matrix', customers[1])
+    second = desk.reserve('The Matrix', customers[2])
+    store.return_video(rentals[0], Time.time_now())
+    assert first.status == 'held'
+
+    clock.advance(1)
+    assert desk.expire() == []
+    clock.advance(1)
+    assert desk.expire() == [first]
+    assert first.status == 'expired'
+    assert second.status == 'held'
+    assert second.video is rentals[0].video
+
+
+def test_cancel_passes_hold_on(store, customers):
+    desk = ReservationDesk(store)
+    network = StoreNetwork([store])
+    held = [desk.reserve('The Matrix', customer) for customer in customers[:2]]
+    waiting = desk.reserve('The Matrix', customers[2])
+    assert not network.is_available_anywhere('The Matrix')
+    desk.cancel(held[0])
+    assert held[0].status == 'cancelled'
+    assert waiting.status == 'held'
+    desk.cancel(waiting)
+    assert network.is_available_anywhere('The Matrix')
+
+
+def test_reserve_unknown_title(store, customers):
+    desk = ReservationDesk(store)
+    with pytest.raises(ValueError):
+        desk.reserve('Heat', customers[0])
+    with pytest.raises(TypeError):
+        desk.reserve('The Matrix', 'Hassan')
+
+
+def test_timer_wheel_long_timers_wait_for_their_day():
+    wheel = TimerWheel(slots=4, today=100)
+    wheel.schedule(102, 'soon')
+    wheel.schedule(106, 'later')
+    assert wheel.advance(102) == ['soon']
+    assert wheel.advance(105) == []
+    assert len(wheel) == 1
+    assert wheel.advance(120) == ['later']
+
+
+def test_ledger_availability_follows_holds(store, customers):
+    availability = AvailabilityView()
+    Ledger([availability]).attach(store)
+    desk = ReservationDesk(store)
+    held = desk.reserve('The Matrix', customers[0], media_format='DVD')
+    cancelled = desk.reserve('The Matrix', customers[1])
+    assert availability.copies(store.store_id, 'The Matrix') == 0
+    desk.cancel(cancelled)
+    assert availability.copies(store.store_id, 'The Matrix') == 1
+    desk.collect(held)
+    assert availability.copies(store.store_id, 'The Matrix') == store.copies_available('The Matrix')
@@ -0,0 +1,40 @@
+# pylint: skip-file
+
+from search import TitleIndex, normalize_title
+
+
+def test_normalize_title():
+    assert normalize_title("  Zack Snyder's  Justice-League ") == 'zack snyder s justice league'
+
+
+def test_title_index_lookup():
+    index = TitleIndex(['The Matrix', 'THE MATRIX'])
+    assert index.lookup('the matrix!') == ['The Matrix', 'THE MATRIX']
+    assert index.lookup('Matrix') == []
+
+
+def test_title_index_prefix_matches_any_word():
+    index = TitleIndex(['The Terminator', 'Terminal Velocity', 'The Matrix'])
+    assert index.prefix('ter') == ['Terminal Velocity', 'The Terminator']
+    assert index.prefix('the ter') == ['The Terminator']
+    assert index.prefix('') == []
+
+
+def test_title_index_fuzzy():
+    index = TitleIndex(['The Terminator', 'The Matrix', 'Creed'])
+    assert index.fuzzy('Termnator')[0] == 'The Terminator'
+    assert index.fuzzy('zzzz') == []
+
+
+def test_title_index_prefix_limits_large_index():
+    index = TitleIndex([f'Title {number} Terminator' for number in range(100000)])
+    matches = index.prefix('ter')
+    assert len(matches) == 10
+    assert all(title.endswith('Terminator') for title in matches)
+    assert index.prefix('title 99999') == ['Title 99999 Terminator']
+
+
+def test_title_index_search_falls_back_to_fuzzy():
+    index = TitleIndex(['The Terminator', 'Terminal Velocity', 'The Matrix'])
+    assert index.search('matirx') == ['The Matrix']
+    assert index.search('ter', limit=1) == ['Terminal Velocity']
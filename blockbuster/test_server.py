@@ -0,0 +1,132 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, Time
+from server import RentalService, RentalClient, start_server, load_test
+import asyncio
+import json
+import pytest
+
+
+LATE_RETURN_DATE = Time.time_day_delta(15)
+
+
+@pytest.fixture
+def service():
+    store = VideoStore([Video('The Matrix', 1999, 150), Video('The Terminator', 1985, 108)])
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    return RentalService([store], {hassan.customer_id: hassan}), hassan
+
+
+def test_service_rent_and_return(service):
+    service, hassan = service
+    rented = service.handle({'id': 1, 'op': 'rent', 'title': 'The Terminator',
+                             'customer': hassan.customer_id})
+    assert rented['ok'] and rented['id'] == 1
+    available = service.handle({'op': 'available', 'title': 'The Terminator'})
+    assert available['available'] == False
+    returned = service.handle({'op': 'return', 'video': rented['video'],
+                               'date': LATE_RETURN_DATE})
+    assert returned['fine'] == 1000
+    assert returned['outstanding'] == 1000
+
+
+def test_service_reports_errors(service):
+    service, hassan = service
+    response = service.handle({'op': 'rent', 'title': 'Creed', 'customer': hassan.customer_id})
+    assert response['ok'] == False
+    assert response['error'] == 'TypeError'
+    assert service.handle({'op': 'dance'})['error'] == 'ValueError'
+    assert service.handle({'op': 'return', 'video': -1, 'date': 'x'})['ok'] == False
+
+
+def test_server_pipelines_requests(service):
+    service, hassan = service
+
+    async def run():
+        server = await start_server(service)
+        port = server.sockets[0].getsockname()[1]
+        client = await RentalClient.connect('127.0.0.1', port)
+        responses = await asyncio.gather(
+            client.request('search', query='ter'),
+            client.request('rent', title='The Matrix', customer=hassan.customer_id),
+            client.request('available', title='The Matrix'))
+        await client.close()
+        results = await load_test('127.0.0.1', port,
+                                  [{'op': 'search', 'query': 'mat'}] * 200, connections=4)
+        server.close()
+        await server.wait_closed()
+        return responses, results
+
+    responses, results = asyncio.run(run())
+    assert responses[0]['titles'] == ['The Terminator (1985)']
+    assert responses[1]['ok'] == True
+    assert responses[2]['copies'] == 0
+    assert results['requests'] == 200
+    assert results['p50_ms'] <= results['p99_ms']
+
+
+def test_server_answers_requests_which_are_not_objects(service):
+    service, hassan = service
+    assert service.handle([1, 2]) == {'id': None, 'ok': False, 'error': 'TypeError',
+                                      'message': 'Request must be a JSON object'}
+
+    async def run():
+        server = await start_server(service)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'[1,2]\n{"id": 7, "op": "available", "title": "The Matrix"}\n')
+        lines = [json.loads(await reader.readline()) for _ in range(2)]
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return lines
+
+    bad, good = asyncio.run(run())
+    assert bad['error'] == 'TypeError'
+    assert good['id'] == 7 and good['ok'] == True
+
+
+def test_client_fails_requests_when_unanswered():
+    async def run():
+        async def answer(reader, writer):
+            await reader.readline()
+            writer.write(b'{"id": null, "ok": false, "error": "JSONDecodeError"}\n')
+            await reader.readline()
+            writer.close()
+
+        server = await asyncio.start_server(answer, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        client = await RentalClient.connect('127.0.0.1', port)
+        unmatched = await client.request('search', query='ter')
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(client.request('search', query='mat'), 5)
+        with pytest.raises(ConnectionError):
+            await client.request('search', query='mat')
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        return unmatched
+
+    assert asyncio.run(run())['error'] == 'JSONDecodeError'
+
+
+def test_server_answers_fields_of_the_wrong_type(service):
+    service, hassan = service
+    assert service.handle({'op': 'search', 'query': 5})['error'] == 'AttributeError'
+
+    async def run():
+        server = await start_server(service)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'{"id": 1, "op": "search", "query": null}\n\xff\n'
+                     b'{"id": 2, "op": "search", "query": "mat"}\n')
+        lines = [json.loads(await reader.readline()) for _ in range(3)]
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return lines
+
+    bad_query, bad_bytes, good = asyncio.run(run())
+    assert bad_query['id'] == 1 and bad_query['ok'] == False
+    assert bad_bytes['error'] == 'UnicodeDecodeError'
+    assert good['id'] == 2 and good['titles'] == ['The Matrix (1999)']
@@ -0,0 +1,77 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, Time
+from sharding import ShardedRentalService
+import pickle
+import pytest
+
+
+LATE_RETURN_DATE = Time.time_day_delta(15)
+
+
+def test_videostore_pickles_without_locks():
+    store = VideoStore([Video('The Matrix', 1999, 150)])
+    copy = pickle.loads(pickle.dumps(store))
+    assert copy.store_id == store.store_id
+    copy.rent_video('The Matrix', Customer('Hassan', 'Kashif', '09/03/1999'))
+    assert copy.is_available('The Matrix') == False
+    assert store.is_available('The Matrix') == True
+
+
+def test_sharded_service_routes_and_merges_fines():
+    branches = [VideoStore([Video('The Matrix', 1999, 150)]) for _ in range(3)]
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    john = Customer('John', 'Smith', '24/01/1980')
+    customers = {hassan.customer_id: hassan, john.customer_id: john}
+    with ShardedRentalService(branches, customers, workers=2) as service:
+        replies = service.submit([('rent', store.store_id, 'The Matrix', hassan.customer_id)
+                                  for store in branches] +
+                                 [('rent', branches[0].store_id, 'The Matrix', john.customer_id),
+                                  ('rent', branches[0].store_id, 'Creed', john.customer_id)])
+        assert [reply[0] for reply in replies] == ['rented'] * 3 + ['error'] * 2
+        assert replies[3][1] == 'ValueError'
+        assert replies[4][1] == 'TypeError'
+
+        returns = service.submit([('return', store.store_id, reply[1], LATE_RETURN_DATE)
+                                  for store, reply in zip(branches, replies)])
+        assert returns == [('returned', hassan.customer_id, 1000)] * 3
+        assert hassan.outstanding_fine == 3000
+
+        stores = service.stores()
+        assert sorted(store.store_id for store in stores) == sorted(s.store_id for s in branches)
+        assert all(store.is_available('The Matrix') for store in stores)
+
+
+def test_sharded_service_blocks_customer_with_merged_fines():
+    branches = [VideoStore([Video('The Matrix', 1999, 150)]) for _ in range(2)]
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    hassan._outstanding_fine = 4500
+    with ShardedRentalService(branches, {hassan.customer_id: hassan}, workers=2) as service:
+        rented = service.submit([('rent', branches[0].store_id, 'The Matrix', hassan.customer_id)])
+        service.submit([('return', branches[0].store_id, rented[0][1], LATE_RETURN_DATE)])
+        refused = service.submit([('rent', branches[1].store_id, 'The Matrix', hassan.customer_id)])
+        assert refused[0][:2] == ('error', 'RuntimeError')
+
+
+def test_sharded_service_answers_unknown_customer():
+    branches = [VideoStore([Video('The Matrix', 1999, 150)]) for _ in range(2)]
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    with ShardedRentalService(branches, {hassan.customer_id: hassan}, workers=2) as service:
+        replies = service.submit([('rent', branches[0].store_id, 'The Matrix', -1),
+                                  ('rent', branches[1].store_id, 'The Matrix', hassan.customer_id)])
+        assert replies[0][:2] == ('error', 'KeyError')
+        assert replies[1][0] == 'rented'
+
+
+def test_sharded_service_holds_rental_limit_across_workers():
+    branches = [VideoStore([Video('The Matrix', 1999, 150)]) for _ in range(4)]
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    with ShardedRentalService(branches, {hassan.customer_id: hassan}, workers=4) as service:
+        replies = service.submit([('rent', store.store_id, 'The Matrix', hassan.customer_id)
+                                  for store in branches])
+        assert [reply[0] for reply in replies] == ['rented'] * 3 + ['error']
+        assert replies[3][1] == 'RuntimeError'
+
+        service.submit([('return', branches[0].store_id, replies[0][1], Time.time_day_delta(1))])
+        again = service.submit([('rent', branches[3].store_id, 'The Matrix', hassan.customer_id)])
+        assert again[0][0] == 'rented'
@@ -0,0 +1,71 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, DVD, Customer
+from snapshot import CatalogueSnapshot, write_snapshot
+import pickle
+import pytest
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    videos = [Video('The Matrix', 1999, 150), DVD('Amélie', 2001, 122),
+              Video('Lord of the Rings Extended', 2001, 558)]
+    path = str(tmp_path / 'catalogue.snap')
+    write_snapshot(path, videos)
+    with CatalogueSnapshot(path) as snapshot:
+        yield snapshot, videos
+
+
+def test_snapshot_round_trip(snapshot):
+    snapshot, videos = snapshot
+    assert len(snapshot) == 3
+    for original, copy in zip(videos, snapshot):
+        assert type(copy) is type(original)
+        assert (copy.title, copy.year, copy.runtime, copy.price, copy.video_id) == \
+            (original.title, original.year, original.runtime, original.price, original.video_id)
+    assert snapshot[-1].title == 'Lord of the Rings Extended'
+    with pytest.raises(IndexError):
+        snapshot[3]
+
+
+def test_snapshot_builds_videos_lazily(snapshot):
+    snapshot, videos = snapshot
+    assert snapshot.title(1) == 'Amélie'
+    assert snapshot.materialized == 0
+    assert snapshot[1] is snapshot[1]
+    assert snapshot.materialized == 1
+    assert snapshot.by_id(videos[2].video_id).title == 'Lord of the Rings Extended'
+    assert snapshot.by_id(-1) is None
+
+
+def test_snapshot_store_and_new_ids(snapshot):
+    snapshot, videos = snapshot
+    store = snapshot.store()
+    rental = store.rent_video('Amélie', Customer('Hassan', 'Kashif', '09/03/1999'))
+    assert rental.video.media_format == 'DVD'
+    assert Video('Creed', 2015, 133).video_id > max(video.video_id for video in videos)
+
+
+def test_snapshot_pickles_as_path(snapshot):
+    snapshot, videos = snapshot
+    payload = pickle.dumps(snapshot)
+    assert len(payload) < 200
+    with pickle.loads(payload) as reopened:
+        assert reopened[0].title == 'The Matrix'
+
+
+def test_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / 'not.snap'
+    path.write_bytes(b'x' * 64)
+    with pytest.raises(ValueError):
+        CatalogueSnapshot(str(path))
+    path.write_bytes(b'x')
+    with pytest.raises(ValueError):
+        CatalogueSnapshot(str(path))
+
+
+def test_snapshot_reserves_its_video_ids(tmp_path):
+    path = str(tmp_path / 'catalogue.snap')
+    write_snapshot(path, [Video('The Matrix', 1999, 150, 10 ** 12)])
+    with CatalogueSnapshot(path):
+        assert Video('Creed', 2015, 133).video_id > 10 ** 12
@@ -0,0 +1,218 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, VendingMachine, DVD, Time
+from storage import SQLiteBackend
+from overdue import overdue_sweep
+import pytest
+
+
+LATE_RETURN_DATE = Time.time_day_delta(15)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'blockbuster.db'))
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def store():
+    return VideoStore([Video('The Matrix', 1999, 150), DVD('The Matrix', 1999, 150),
+                       Video('The Terminator', 1985, 108)])
+
+
+
+def test_store_reopens_from_checkpoint(tmp_path, store):
+    path = str(tmp_path / 'blockbuster.db')
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    backend = SQLiteBackend(path)
+    backend.attach(store)
+    store.rent_video('The Matrix', hassan, 'DVD')
+    backend.checkpoint([store], [hassan])
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    customers = backend.load_customers()
+    reopened = VideoStore.open(backend, store.store_id, customers)
+    assert reopened.copies_available('The Matrix', 'DVD') == 0
+    assert reopened.copies_available('The Matrix', 'VHS') == 1
+    assert customers[hassan.customer_id].name == 'Hassan Kashif'
+    backend.close()
+
+
+def test_store_replays_journal_tail(tmp_path, store):
+    path = str(tmp_path / 'blockbuster.db')
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    backend = SQLiteBackend(path)
+    backend.attach(store)
+    backend.checkpoint([store], [hassan])
+    rental = store.rent_video('The Terminator', hassan)
+    store.rent_video('The Matrix', hassan)
+    store.return_video(rental, LATE_RETURN_DATE)
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    customers = backend.load_customers()
+    reopened = VideoStore.open(backend, store.store_id, customers)
+    assert customers[hassan.customer_id].outstanding_fine == 1000
+    assert reopened.is_available('The Terminator') == True
+    assert reopened.copies_available('The Matrix') == 1
+    open_rental = reopened.open_rentals[0]
+    assert open_rental.customer is customers[hassan.customer_id]
+    backend.close()
+
+
+def test_checkpoint_moves_journal_into_tables(backend, store):
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    backend.attach(store)
+    rental = store.rent_video('The Terminator', hassan)
+    store.return_video(rental, LATE_RETURN_DATE)
+    backend.checkpoint([store], [hassan])
+    assert backend.journal.read() == []
+    rows = backend._db.execute('SELECT video_id, returned_on, fine FROM rentals').fetchall()
+    assert rows == [(rental.video.video_id, rental.due_on + 1, 1000)]
+    fines = backend._db.execute('SELECT customer_id, amount FROM fines').fetchall()
+    assert fines == [(hassan.customer_id, 1000)]
+
+
+def test_journal_continues_after_checkpoint(tmp_path, store):
+    path = str(tmp_path / 'blockbuster.db')
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    backend = SQLiteBackend(path)
+    backend.attach(store)
+    store.rent_video('The Terminator', hassan)
+    backend.checkpoint([store], [hassan])
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    customers = backend.load_customers()
+    reopened = VideoStore.open(backend, store.store_id, customers)
+    reopened.rent_video('The Matrix', customers[hassan.customer_id])
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    reopened = VideoStore.open(backend, store.store_id, backend.load_customers())
+    assert reopened.copies_available('The Matrix') == 1
+    assert reopened.is_available('The Terminator') == False
+    backend.close()
+
+
+def test_vending_machine_opens_from_backend(backend):
+    machine = VendingMachine([Video('Creed', 2015, 133)])
+    backend.checkpoint([machine], [])
+    reopened = VendingMachine.open(backend, machine.store_id, {})
+    assert isinstance(reopened, VendingMachine)
+    assert reopened.is_available('Creed') == True
+    assert isinstance(backend.open_store(machine.store_id, {}), VendingMachine)
+
+
+def test_open_unknown_store(backend):
+    with pytest.raises(ValueError):
+        VideoStore.open(backend, 10 ** 9, {})
+
+
+def test_stock_added_after_checkpoint_is_replayed(tmp_path, store):
+    path = str(tmp_path / 'blockbuster.db')
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    backend = SQLiteBackend(path)
+    backend.attach(store)
+    backend.checkpoint([store], [hassan])
+    creed = Video('Creed', 2015, 133)
+    store.add_video(creed)
+    store.rent_video('Creed', hassan)
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    reopened = VideoStore.open(backend, store.store_id, backend.load_customers())
+    assert reopened.find_video_by_id(creed.video_id).title == 'Creed'
+    assert reopened.is_available('Creed') == False
+    backend.close()
+
+
+@pytest.mark.parametrize('checkpoint', [True, False])
+def test_sweep_fines_survive_reload(tmp_path, store, checkpoint):
+    path = str(tmp_path / 'blockbuster.db')
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    backend = SQLiteBackend(path)
+    backend.attach(store)
+    backend.checkpoint([store], [hassan])
+    rental = store.rent_video('The Terminator', hassan)
+    overdue_sweep([store], today=rental.due_on + 1)
+    assert hassan.outstanding_fine == 1000
+    if checkpoint:
+        backend.checkpoint([store], [hassan])
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    customers = backend.load_customers()
+    reopened = VideoStore.open(backend, store.store_id, customers)
+    reloaded = reopened.open_rental(rental.video.video_id)
+    assert reloaded.fine == 1000
+    assert customers[hassan.customer_id].outstanding_fine == 1000
+    reopened.return_video(reloaded, LATE_RETURN_DATE)
+    assert customers[hassan.customer_id].outstanding_fine == 1000
+    backend.close()
+
+
+@pytest.mark.parametrize('checkpoint', [True, False])
+def test_payments_survive_reload(tmp_path, store, checkpoint):
+    path = str(tmp_path / 'blockbuster.db')
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    backend = SQLiteBackend(path)
+    backend.attach(store)
+    backend.checkpoint([store], [hassan])
+    store.return_video(store.rent_video('The Terminator', hassan), LATE_RETURN_DATE)
+    assert hassan.pay_off_fine(10) == 0
+    if checkpoint:
+        # hassan has nothing out, so only the journal carries his fine and payment
+        backend.checkpoint([store], [])
+        assert backend._db.execute('SELECT amount FROM payments').fetchall() == [(1000,)]
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    customers = backend.load_customers()
+    assert customers[hassan.customer_id].outstanding_fine == 0
+    backend.close()
+
+
+def test_payments_journalled_only_where_the_customer_is_kept(tmp_path, store):
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    john = Customer('John', 'Smith', '24/01/1980')
+    hassan._outstanding_fine = john._outstanding_fine = 1000
+    first = SQLiteBackend(str(tmp_path / 'first.db'))
+    second = SQLiteBackend(str(tmp_path / 'second.db'))
+    first.checkpoint([store], [hassan])
+    second.attach(store)
+    store.rent_video('The Terminator', john)
+    hassan.pay_off_fine(5)
+    john.pay_off_fine(5)
+    assert [event['customer'] for event in first.journal.read()
+            if event['event'] == 'payment'] == [hassan.customer_id]
+    assert [event['customer'] for event in second.journal.read()
+            if event['event'] == 'payment'] == [john.customer_id]
+    first.close()
+    second.close()
+
+
+def test_journal_read_once_per_open(tmp_path, store):
+    path = str(tmp_path / 'blockbuster.db')
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    machine = VendingMachine([Video('Creed', 2015, 133)])
+    backend = SQLiteBackend(path)
+    backend.attach(store)
+    backend.attach(machine)
+    backend.checkpoint([store, machine], [hassan])
+    store.rent_video('The Terminator', hassan)
+    machine.rent_video('Creed', hassan)
+    backend.close()
+
+    backend = SQLiteBackend(path)
+    reads = []
+    read = backend.journal.read
+    backend.journal.read = lambda after=0: reads.append(after) or read(after)
+    customers = backend.load_customers()
+    assert backend.open_store(store.store_id, customers).is_available('The Terminator') == False
+    assert backend.open_store(machine.store_id, customers).is_available('Creed') == False
+    assert len(reads) == 1
+    backend.close()
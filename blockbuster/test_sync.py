@@ -0,0 +1,201 @@
+# pylint: skip-file
+
+from blockbuster_oop import Video, Customer, VideoStore, VendingMachine, Time
+from sync import HEADER, RECORD, STOCK, KioskLog, ParentSync, decode_delta, encode_delta
+from overdue import overdue_sweep
+from rental_log import RentalLog, RentalRecorder
+from storage import SQLiteBackend
+import pickle
+import pytest
+
+
+LATE_RETURN_DATE = Time.time_day_delta(15)
+
+
+@pytest.fixture
+def kiosk():
+    hassan = Customer('Hassan', 'Kashif', '09/03/1999')
+    john = Customer('John', 'Smith', '24/01/1980')
+    machine = VendingMachine([Video('The Matrix', 1999, 150), Video('Creed', 2015, 133)])
+    parent = VideoStore([Video('The Matrix', 1999, 150)])
+    # the parent runs in another process, with its own copies of the customers
+    customers = {customer.customer_id: pickle.loads(pickle.dumps(customer))
+                 for customer in (hassan, john)}
+    sync = ParentSync(parent, customers)
+    sync.register(machine)
+    return machine, parent, sync, KioskLog(machine), hassan, customers
+
+
+def test_delta_round_trip():
+    operations = [('rent', 7, 3, 738000, 0), ('return', 7, 3, 738015, 1000)]
+    delta = encode_delta(5, 11, operations)
+    assert len(delta) == HEADER.size + 2 * RECORD.size
+    assert decode_delta(delta) == (5, 11, operations)
+    with pytest.raises(ValueError):
+        decode_delta(delta[:-1])
+
+
+def test_delta_round_trip_with_stock():
+    operations = [('stock', 9, 0, 738000, 0, ('Amélie', 2001, 122, 'DVD')),
+                  ('rent', 9, 3, 738000, 0)]
+    delta = encode_delta(5, 1, operations)
+    assert len(delta) == HEADER.size + 2 * RECORD.size + STOCK.size + len('Amélie'.encode())
+    assert decode_delta(delta) == (5, 1, operations)
+    with pytest.raises(ValueError):
+        decode_delta(delta[:HEADER.size + RECORD.size + 2])
+
+
+def test_register_lists_machine_copies_at_parent(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    for video in machine.videos:
+        assert parent.find_video_by_id(video.video_id).title == video.title
+    assert parent.copies_available('The Matrix') == 1
+    assert parent.copies_available('Creed') == 0
+
+
+def test_parent_lends_its_own_copies(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    john = next(customer for customer in customers.values() if customer.name == 'John Smith')
+    at_parent = parent.rent_video('The Matrix', john)
+    assert at_parent.video.video_id not in {video.video_id for video in machine.videos}
+    machine.rent_video('The Matrix', hassan)
+    sync.merge(log.delta())
+    assert sync.conflicts == [] and sync.quarantined == []
+    with pytest.raises(ValueError):
+        parent.rent_video('Creed', john)
+
+
+def test_offline_rentals_merged_once(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    rental = machine.rent_video('Creed', hassan)
+    machine.return_video(rental, LATE_RETURN_DATE)
+    machine.rent_video('The Matrix', hassan)
+    assert len(log) == 3
+
+    delta = log.delta()
+    assert len(delta) == HEADER.size + 3 * RECORD.size
+    assert sync.merge(delta) == 3
+    assert sync.merge(delta) == 3
+    assert parent.copies_available('Creed') == 0
+    assert parent.open_rental(rental.video.video_id) is None
+    assert customers[hassan.customer_id].outstanding_fine == 0
+
+    log.acknowledge(3)
+    assert len(log) == 0
+    machine.return_video(machine.open_rentals[0], Time.time_now())
+    assert sync.merge(log.delta()) == 4
+    assert parent.copies_available('The Matrix') == 1
+    assert parent.open_rentals == []
+
+
+def test_merge_applies_sweep_fines(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    rental = machine.rent_video('Creed', hassan)
+    overdue_sweep([machine], today=rental.due_on + 1)
+    sync.merge(log.delta())
+    assert parent.open_rental(rental.video.video_id).fine == 1000
+    assert customers[hassan.customer_id].outstanding_fine == 1000
+
+
+def lend_kiosk_copy_at_parent(machine, parent, customer):
+    '''Lends the machine's copy of The Matrix at the parent, as after a restart loses holds'''
+    kiosk_copy = next(video for video in machine.videos if video.title == 'The Matrix')
+    parent.release(parent.find_video_by_id(kiosk_copy.video_id))
+    return parent.rent_video('The Matrix', customer)
+
+
+def test_conflicting_rental_moved_to_parent_copy(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    john = next(customer for customer in customers.values() if customer.name == 'John Smith')
+    at_parent = lend_kiosk_copy_at_parent(machine, parent, john)
+    kiosk_copy = machine.rent_video('The Matrix', hassan)
+    assert at_parent.video.video_id == kiosk_copy.video.video_id
+
+    sync.merge(log.delta())
+    assert parent.open_rental(kiosk_copy.video.video_id).customer.customer_id == hassan.customer_id
+    assert sync.conflicts[0]['customer'] == john.customer_id
+    moved = parent.open_rental(sync.conflicts[0]['moved_to'])
+    assert moved.customer is john
+    assert parent.copies_available('The Matrix') == 0
+
+
+def test_conflicting_rental_kept_when_no_copy_is_free(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    john = next(customer for customer in customers.values() if customer.name == 'John Smith')
+    parent.rent_video('The Matrix', john)
+    at_parent = lend_kiosk_copy_at_parent(machine, parent, john)
+    kiosk_copy = machine.rent_video('The Matrix', hassan)
+    machine.return_video(kiosk_copy, Time.time_now())
+
+    assert sync.merge(log.delta()) == 2
+    assert parent.open_rental(at_parent.video.video_id) is at_parent
+    assert [entry['seq'] for entry in sync.quarantined] == [1, 2]
+    assert sync.conflicts == []
+
+
+def test_merge_quarantines_operations_it_cannot_apply(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    stranger = Customer('Jane', 'Doe', '01/01/1990')
+    machine.rent_video('Creed', stranger)
+    rental = machine.rent_video('The Matrix', hassan)
+    assert sync.merge(log.delta()) == 2
+    assert sync.quarantined[0]['error'] == f'Unknown customer {stranger.customer_id}'
+    assert parent.open_rental(rental.video.video_id).customer.customer_id == hassan.customer_id
+
+
+def test_merge_refuses_gaps(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    machine.rent_video('Creed', hassan)
+    log.acknowledge(1)
+    machine.rent_video('The Matrix', hassan)
+    with pytest.raises(ValueError):
+        sync.merge(log.delta())
+
+
+def test_copies_stocked_after_register_are_merged(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    machine.add_video(Video('Rocky', 1976, 120))
+    rental = machine.rent_video('Rocky', hassan)
+    assert sync.merge(log.delta()) == 2
+    assert parent.open_rental(rental.video.video_id).customer.customer_id == hassan.customer_id
+    assert parent.copies_available('Rocky') == 0
+    machine.return_video(rental, Time.time_now())
+    sync.merge(log.delta())
+    assert parent.open_rental(rental.video.video_id) is None
+    assert parent.copies_available('Rocky') == 0
+
+
+def test_merged_operations_reach_parent_observers(kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    recorder = RentalRecorder(RentalLog())
+    parent.add_observer(recorder)
+    rental = machine.rent_video('Creed', hassan)
+    overdue_sweep([machine], today=rental.due_on + 1)
+    machine.return_video(rental, LATE_RETURN_DATE)
+    sync.merge(log.delta())
+    assert len(recorder.log) == 1
+    assert recorder.log[0].returned_on != 0
+    assert recorder.log[0].fine == 1000
+
+
+def test_merged_operations_survive_parent_restart(tmp_path, kiosk):
+    machine, parent, sync, log, hassan, customers = kiosk
+    backend = SQLiteBackend(str(tmp_path / 'parent.db'))
+    backend.attach(parent)
+    backend.checkpoint([parent], list(customers.values()))
+    sync = ParentSync(parent, customers, str(tmp_path / 'vector.json'))
+    sync.register(machine)
+    rental = machine.rent_video('Creed', hassan)
+    delta = log.delta()
+    assert sync.merge(delta) == 1
+    backend.close()
+
+    backend = SQLiteBackend(str(tmp_path / 'parent.db'))
+    customers = backend.load_customers()
+    parent = VideoStore.open(backend, parent.store_id, customers)
+    sync = ParentSync(parent, customers, str(tmp_path / 'vector.json'))
+    assert sync.vector == {machine.store_id: 1}
+    assert sync.merge(delta) == 1
+    assert parent.open_rental(rental.video.video_id).customer.customer_id == hassan.customer_id
+    assert parent.copies_available('The Matrix') == 1
+    backend.close()